@@ -1,10 +1,20 @@
 import json
 import os
 import math
+import re
 import datetime
+import hashlib
+import pickle
+from concurrent.futures import ProcessPoolExecutor
 from fpdf import FPDF
 from fpdf.enums import XPos, YPos
 
+# Optional fast JSON backend
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # ==============================================================================
 # 1. CFO-LEVEL CONFIGURATION (The "Brain" Settings)
 # ==============================================================================
@@ -50,86 +60,261 @@ FILES = {
     "TESTS": "test_master.json"
 }
 
+READ_BUFFER_BYTES = 1 << 20  # 1 MiB - masters can be multi-MB
+
+def read_file_bytes(path):
+    """Reads a whole file in one shot through a large buffer, hinting sequential access to the OS."""
+    with open(path, 'rb', buffering=READ_BUFFER_BYTES) as f:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        return f.read()
+
+def load_json_bytes(raw):
+    """Parses a whole JSON document from bytes (orjson if installed, else stdlib json)."""
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+def dump_json_bytes(obj, pretty=False):
+    """Serializes to newline-terminated JSON bytes, compact unless pretty (orjson if installed, else stdlib json)."""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE | (orjson.OPT_INDENT_2 if pretty else 0))
+    if pretty:
+        return (json.dumps(obj, indent=2) + "\n").encode('utf-8')
+    return (json.dumps(obj, separators=(",", ":")) + "\n").encode('utf-8')
+
+# Production line categories matched against production_line_id in the factory schedule
+FACTORY_CATEGORIES = ("HV", "LT")
+
+# Keywords mapping to Zone Types in logistic_master.json (earlier entries take priority)
+ZONE_KEYWORDS = {
+    "hilly": "Hilly", "mountain": "Hilly", "remote": "Hilly",
+    "coastal": "Coastal", "port": "Coastal", "sea": "Coastal",
+    "desert": "Desert", "rajasthan": "Desert", "kutch": "Desert",
+    "island": "Island", "andaman": "Island",
+    "urban": "Urban", "city": "Urban", "metro": "Urban"
+}
+ZONE_TYPES_BY_PRIORITY = list(dict.fromkeys(ZONE_KEYWORDS.values()))
+# One named group per zone type, e.g. (?P<Hilly>hilly|mountain|remote)|(?P<Coastal>...)
+ZONE_KEYWORD_RE = re.compile("|".join(
+    f"(?P<{zt}>{'|'.join(re.escape(k) for k, v in ZONE_KEYWORDS.items() if v == zt)})"
+    for zt in ZONE_TYPES_BY_PRIORITY
+), re.IGNORECASE)
+
+LOYALTY_DISCOUNTS = {"Gold": -0.03, "Silver": -0.015}
+
+def client_credit_terms(client):
+    """(credit_days, loyalty_discount) from a client master record."""
+    terms = client.get('payment_terms', '30 Days')
+    if "90" in terms: credit_days = 90
+    elif "60" in terms: credit_days = 60
+    elif "Advance" in terms: credit_days = 0
+    else: credit_days = 30
+    return credit_days, LOYALTY_DISCOUNTS.get(client.get('loyalty_status'), 0.0)
+
+def audit_content_hash(payload):
+    """Short, stable digest of everything rendered into an audit PDF."""
+    blob = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.blake2b(blob, digest_size=8).hexdigest()
+
+def remove_stale_audit_reports(audit_dir, rfp_id, keep_name):
+    """Delete older audit PDFs for rfp_id (earlier content hashes and the pre-hash name), keeping keep_name."""
+    stale_re = re.compile(re.escape(rfp_id) + r"(_[0-9a-f]{16})?_AUDIT\.pdf")
+    for name in os.listdir(audit_dir):
+        if name != keep_name and stale_re.fullmatch(name):
+            try:
+                os.remove(os.path.join(audit_dir, name))
+            except FileNotFoundError:
+                pass
+
 class Database:
-    def __init__(self):
-        self.data = {}
+    def __init__(self, data=None):
+        # Worker processes receive already-loaded masters instead of re-reading the files
+        self.data = data if data is not None else self.load_masters()
+        self.index = self.build_index()
+        self.factory_avg_util = self.build_factory_load()
+        self.applicable_tests = self.build_applicable_tests()
+
+    def load_masters(self):
+        data = {}
         print(">>> [INIT] Connecting to Enterprise Data Warehouse...")
         for key, fname in FILES.items():
             loaded = False
             for path in DB_PATHS:
                 full_path = os.path.join(path, fname)
-                if os.path.exists(full_path):
-                    try:
-                        if os.path.getsize(full_path) == 0:
-                            print(f"   [!] WARNING: {fname} is empty. Skipping.")
-                            loaded = False
-                            continue
-                            
-                        with open(full_path, 'r') as f:
-                            self.data[key] = json.load(f)
-                        print(f"   [+] Loaded {key} ({len(self.data[key])} records)")
-                        loaded = True
-                        break
-                    except json.JSONDecodeError:
-                        print(f"   [!] ERROR: Could not decode {fname}. File might be corrupted.")
-                        loaded = False
-                    except Exception as e:
-                         print(f"   [!] ERROR: Failed to load {fname}: {e}")
-                         loaded = False
+                try:
+                    raw = read_file_bytes(full_path)
+                    if not raw:
+                        print(f"   [!] WARNING: {fname} is empty. Skipping.")
+                        continue
+
+                    data[key] = load_json_bytes(raw)
+                    print(f"   [+] Loaded {key} ({len(data[key])} records)")
+                    loaded = True
+                    break
+                except FileNotFoundError:
+                    continue
+                except json.JSONDecodeError:
+                    print(f"   [!] ERROR: Could not decode {fname}. File might be corrupted.")
+                    loaded = False
+                except Exception as e:
+                     print(f"   [!] ERROR: Failed to load {fname}: {e}")
+                     loaded = False
             if not loaded:
                 print(f"   [!] WARNING: Could not find {fname}. Using Empty List.")
-                self.data[key] = []
+                data[key] = []
+        return data
+
+    def build_index(self):
+        """Builds O(1) lookup tables over the masters (replaces linear scans in the engine)."""
+        index = {
+            "PRODUCTS": {p['product_id']: p for p in self.data["PRODUCTS"]},
+            "MATERIALS": {m['material_id']: m for m in self.data["MATERIALS"]},
+            "MATERIAL_RATES": {},
+            "COMPETITORS": {},
+            "CLIENTS": {},
+            "LOGISTICS": {}
+        }
+        # setdefault keeps the first record on key collisions, same as the old next(...) scans
+        # (name, market-adjusted rate, high volatility) per material, so BOM costing skips the raw records
+        for mat_id, m in index["MATERIALS"].items():
+            index["MATERIAL_RATES"][mat_id] = (
+                m.get('material_name', mat_id),
+                m.get('base_cost_per_unit', 0) * m.get('current_market_factor', 1.0),
+                m.get('volatility_risk_level') == 'High'
+            )
+        for c in self.data["COMPETITORS"]:
+            index["COMPETITORS"].setdefault(c['competitor_id'], c)
+            index["COMPETITORS"].setdefault(c['name'].lower(), c)
+        for c in self.data["CLIENTS"]:
+            index["CLIENTS"].setdefault(c['client_name'].lower(), c)
+        # Credit days + loyalty discount parsed once per client instead of on every analyze_financials call
+        index["CLIENT_TERMS"] = {name: client_credit_terms(c) for name, c in index["CLIENTS"].items()}
+        for z in self.data["LOGISTICS"]:
+            zone_type = z['zone_type'].lower()
+            index["LOGISTICS"].setdefault(zone_type, z)
+            index["LOGISTICS"].setdefault(zone_type.split('_')[0], z)  # "desert_highheat" -> "desert"
+            index["LOGISTICS"].setdefault(z['zone_code'], z)
+
+        # Substring matching still needs a scan; longest names first so the most specific name wins
+        index["CLIENTS_BY_LEN"] = sorted(index["CLIENTS"].items(), key=lambda x: -len(x[0]))
+        # Competitor names are matched anywhere in the input with one alternation regex, longest name first
+        comp_names = sorted({c['name'] for c in self.data["COMPETITORS"]}, key=lambda n: -len(n))
+        index["COMPETITOR_NAME_RE"] = re.compile("|".join(re.escape(n) for n in comp_names), re.IGNORECASE) if comp_names else None
+        return index
+
+    def build_applicable_tests(self):
+        """Mandatory tests for LT (False) and HT (True) cables as (name, base_cost, is_routine) tuples."""
+        applicable = {}
+        for is_hv in (False, True):
+            applicable[is_hv] = [
+                (t['test_name'], t['base_test_cost'], "Routine" in t['test_category'])
+                for t in self.data["TESTS"]
+                if "All Cables" in t['mandatory_for'] or (is_hv and "HT Cables" in t['mandatory_for'])
+            ]
+        return applicable
+
+    def build_factory_load(self):
+        """Average line utilization per factory category ("HV"/"LT"), None if no line matches."""
+        avg_util = {}
+        for category in FACTORY_CATEGORIES:
+            utils = [b['utilization_percent'] for b in self.data["FACTORY"] if category in b.get('production_line_id', '')]
+            avg_util[category] = sum(utils) / len(utils) if utils else None
+        return avg_util
 
 # ==============================================================================
 # 3. THE PRICING ENGINE (Logic Core)
 # ==============================================================================
 class PricingEngine:
     def __init__(self, db):
-        self.db = db
-
-    def calculate_micro_bom_cost(self, product_id, total_qty_mtr):
-        """Explodes BOM to calculate exact material cost + risk buffer."""
-        prod = next((p for p in self.db["PRODUCTS"] if p['product_id'] == product_id), None)
-        
-        # Fallback if product not in master
+        self.db = db.data
+        self.idx = db.index
+        self.factory_avg_util = db.factory_avg_util
+        self.applicable_tests = db.applicable_tests
+        self._bom_cache = {}
+        self._class_cache = {}
+
+    def classify_product(self, product_id):
+        """Voltage-class flags for a product id, computed once: (steel_drum, ht_tests, factory_category)."""
+        flags = self._class_cache.get(product_id)
+        if flags is None:
+            pid_upper = str(product_id).upper()
+            flags = (
+                "33KV" in str(product_id),                   # Packaging: steel drums for 33kV
+                "33KV" in pid_upper or "11KV" in pid_upper,  # Testing: HT cable tests apply
+                "HV" if "33KV" in pid_upper else "LT"        # Factory line category
+            )
+            self._class_cache[product_id] = flags
+        return flags
+
+    def _bom_rates_per_meter(self, product_id):
+        """Per-meter BOM rates for a product. Cached: they only depend on the loaded masters."""
+        if product_id in self._bom_cache:
+            return self._bom_cache[product_id]
+
+        prod = self.idx["PRODUCTS"].get(product_id)
         if not prod:
-            return total_qty_mtr * 1500, total_qty_mtr * 2.5, ["Product Master Missing - Using Estimate"], 0, 0
+            self._bom_cache[product_id] = None
+            return None
 
-        mat_cost_total = 0
-        risk_buffer_total = 0
-        breakdown = []
+        lines = []  # (text, cost_per_m, is_volatile) - volatile lines get their risk value appended per call
 
         if 'bill_of_materials' in prod:
             for item in prod['bill_of_materials']:
                 mat_id = item['material_id']
                 qty_per_meter = item['quantity']
                 
-                # Lookup Material
-                mat = next((m for m in self.db["MATERIALS"] if m['material_id'] == mat_id), None)
-                if mat:
-                    base_rate = mat.get('base_cost_per_unit', 0)
-                    mkt_factor = mat.get('current_market_factor', 1.0)
-                    final_rate = base_rate * mkt_factor
-                    
-                    line_cost = qty_per_meter * final_rate * total_qty_mtr
-                    mat_cost_total += line_cost
+                # Lookup Material (market-adjusted rate precomputed at load)
+                mat_rate = self.idx["MATERIAL_RATES"].get(mat_id)
+                if mat_rate:
+                    mat_name, final_rate, is_volatile = mat_rate
                     
                     # Volatility Check
-                    if mat.get('volatility_risk_level') == 'High':
-                        risk_val = line_cost * CONFIG["FINANCIAL"]["HEDGING_BUFFER_PCT"]
-                        risk_buffer_total += risk_val
-                        breakdown.append(f"   - {mat['material_name']}: {qty_per_meter} units/m (High Volatility Risk +{int(risk_val)})")
+                    if is_volatile:
+                        lines.append((f"   - {mat_name}: {qty_per_meter} units/m", qty_per_meter * final_rate, True))
                     else:
-                        breakdown.append(f"   - {mat['material_name']}: {qty_per_meter} units/m @ {final_rate:.2f}")
+                        lines.append((f"   - {mat_name}: {qty_per_meter} units/m @ {final_rate:.2f}", qty_per_meter * final_rate, False))
                 else:
-                    breakdown.append(f"   - {mat_id}: Price Not Found")
+                    lines.append((f"   - {mat_id}: Price Not Found", 0, False))
+
+        # Weight Calculation (Critical for Logistics)
+        weight_per_km = prod.get('performance_data', {}).get('approx_weight_kg_km', 1000)
+
+        rates = (weight_per_km / 1000, lines)
+        self._bom_cache[product_id] = rates
+        return rates
+
+    def calculate_micro_bom_cost(self, product_id, total_qty_mtr, max_breakdown=None):
+        """Explodes BOM to calculate exact material cost + risk buffer.
+
+        Only the first `max_breakdown` BOM lines are formatted into the breakdown (all if None).
+        """
+        rates = self._bom_rates_per_meter(product_id)
+        
+        # Fallback if product not in master
+        if not rates:
+            return total_qty_mtr * 1500, total_qty_mtr * 2.5, ["Product Master Missing - Using Estimate"], 0, 0
+
+        weight_per_m, lines = rates
+        mat_cost_total = 0
+        risk_buffer_total = 0
+        breakdown = []
+
+        max_lines = len(lines) if max_breakdown is None else max_breakdown
+
+        for text, cost_per_m, is_volatile in lines:
+            line_cost = cost_per_m * total_qty_mtr
+            mat_cost_total += line_cost
+            if is_volatile:
+                risk_val = line_cost * CONFIG["FINANCIAL"]["HEDGING_BUFFER_PCT"]
+                risk_buffer_total += risk_val
+                if len(breakdown) < max_lines:
+                    breakdown.append(f"{text} (High Volatility Risk +{int(risk_val)})")
+            elif len(breakdown) < max_lines:
+                breakdown.append(text)
 
         # Factory Overhead
         mfg_overhead = mat_cost_total * CONFIG["OPERATIONAL"]["FACTORY_OVERHEAD_RATE"]
         
-        # Weight Calculation (Critical for Logistics)
-        weight_per_km = prod.get('performance_data', {}).get('approx_weight_kg_km', 1000)
-        total_weight_kg = (weight_per_km / 1000) * total_qty_mtr
+        total_weight_kg = weight_per_m * total_qty_mtr
 
         total_mfg_cost = mat_cost_total + mfg_overhead + risk_buffer_total
         
@@ -137,14 +322,12 @@ class PricingEngine:
 
     def analyze_factory_load(self, product_id):
         """Determines Scarcity Premium or Idle Discount based on production schedule."""
-        category = "HV" if "33KV" in str(product_id).upper() else "LT"
+        category = self.classify_product(product_id)[2]
         
-        # Filter relevant lines from factory schedule
-        relevant_batches = [b for b in self.db["FACTORY"] if category in b.get('production_line_id', '')]
-        if not relevant_batches: 
+        # Averaged once per category from the factory schedule at load time
+        avg_util = self.factory_avg_util.get(category)
+        if avg_util is None: 
             return 0.0, "Standard Capacity Load"
-
-        avg_util = sum(b['utilization_percent'] for b in relevant_batches) / len(relevant_batches)
         
         if avg_util > 90:
             return CONFIG["OPERATIONAL"]["OVERLOAD_PREMIUM"], f"Factory Overload ({avg_util:.1f}%) - Scarcity Premium Added"
@@ -155,36 +338,16 @@ class PricingEngine:
 
     def determine_logistics_zone(self, location_name):
         """Maps a location string to a specific Logistics Zone from the Master."""
-        # 1. Fuzzy Logic Matching
-        loc_lower = location_name.lower()
-        
-        best_zone = None
-        
-        # Keywords mapping to Zone Types in logistic_master.json
-        keywords = {
-            "hilly": "Hilly", "mountain": "Hilly", "remote": "Hilly",
-            "coastal": "Coastal", "port": "Coastal", "sea": "Coastal",
-            "desert": "Desert", "rajasthan": "Desert", "kutch": "Desert",
-            "island": "Island", "andaman": "Island",
-            "urban": "Urban", "city": "Urban", "metro": "Urban"
-        }
-        
-        detected_type = "Plains_Highway" # Default
-        
-        for k, v in keywords.items():
-            if k in loc_lower:
-                detected_type = v
-                break
+        # 1. Fuzzy Logic Matching (single regex pass, earlier zone types win)
+        hits = {m.lastgroup for m in ZONE_KEYWORD_RE.finditer(location_name)}
+        detected_type = next((zt for zt in ZONE_TYPES_BY_PRIORITY if zt in hits), "Plains_Highway")
         
         # 2. Find Zone in Master
-        for zone in self.db["LOGISTICS"]:
-            if detected_type.lower() in zone['zone_type'].lower():
-                best_zone = zone
-                break
+        best_zone = self.idx["LOGISTICS"].get(detected_type.lower())
         
         # Fallback to Z-01 if not found
         if not best_zone:
-            best_zone = next((z for z in self.db["LOGISTICS"] if z['zone_code'] == "Z-01"), None)
+            best_zone = self.idx["LOGISTICS"].get("Z-01")
             
         return best_zone
 
@@ -205,19 +368,12 @@ class PricingEngine:
 
     def analyze_financials(self, client_name, total_value):
         """Calculates Cost of Capital based on Credit Days and Loyalty Status."""
-        client = next((c for c in self.db["CLIENTS"] if c['client_name'].lower() in client_name.lower()), None)
+        client_key = client_name.lower()
+        if client_key not in self.idx["CLIENT_TERMS"]:
+            client_key = next((name for name, _ in self.idx["CLIENTS_BY_LEN"] if name in client_key), None)
         
-        credit_days = 30
-        loyalty_disc = 0.0
-        
-        if client:
-            terms = client.get('payment_terms', '30 Days')
-            if "90" in terms: credit_days = 90
-            elif "60" in terms: credit_days = 60
-            elif "Advance" in terms: credit_days = 0
-            
-            if client.get('loyalty_status') == 'Gold': loyalty_disc = -0.03
-            if client.get('loyalty_status') == 'Silver': loyalty_disc = -0.015
+        # Unknown clients get standard 30-day credit and no loyalty discount
+        credit_days, loyalty_disc = self.idx["CLIENT_TERMS"].get(client_key, (30, 0.0))
 
         # Interest Calculation: Principal * Rate * (Days/365)
         interest_cost = total_value * (CONFIG["FINANCIAL"]["ANNUAL_COST_OF_CAPITAL"] * credit_days / 365)
@@ -230,7 +386,10 @@ class PricingEngine:
         reasons = []
         
         for comp_input in competitor_names:
-            rival = next((c for c in self.db["COMPETITORS"] if c['name'].lower() in comp_input.lower() or c['competitor_id'] == comp_input), None)
+            rival = self.idx["COMPETITORS"].get(comp_input) or self.idx["COMPETITORS"].get(comp_input.lower())
+            if not rival and self.idx["COMPETITOR_NAME_RE"]:
+                m = self.idx["COMPETITOR_NAME_RE"].search(comp_input)
+                rival = self.idx["COMPETITORS"].get(m.group(0).lower()) if m else None
             
             if rival:
                 aggression = rival['pricing_intelligence']['aggression_score']
@@ -298,199 +457,229 @@ class AdvancedAuditPDF(FPDF):
 # ==============================================================================
 # 5. EXECUTION ORCHESTRATOR
 # ==============================================================================
-def run_brain():
-    # 1. Init
-    db = Database()
-    brain = PricingEngine(db.data)
+def price_rfp(rfp, brain, audit_dir):
+    """Prices a single RFP, writes its audit PDF and returns the updated RFP record."""
+    rfp_id = rfp.get('rfp_unique_id')
+    sales_out = rfp['sales_agent_output']
+    tech_out = rfp.get('tech_agent_output', {})
+    logistics = sales_out['logistics_constraints']
+    client_name = sales_out['summary']['client_name']
+    delivery_loc = logistics['delivery_location']
+    dist = logistics.get('distance_from_factory_km', 500)
+    print(f"\nAnalyzing {rfp_id}...")
+
+    # --- A. DETAILED COSTING ---
+    audit_lines = []
+    product_breakdowns = []
+    total_mfg = 0
+    total_pkg = 0
+    total_test = 0
+    total_weight = 0
     
-    # 2. Load Input
-    rfp_path = os.path.join(BASE_DIR, FILES["INPUT"])
-    if not os.path.exists(rfp_path): return print("No Input File.")
-    
-    with open(rfp_path, 'r') as f: rfps = json.load(f)
-    processed_output = []
-
-    for rfp in rfps:
-        rfp_id = rfp.get('rfp_unique_id')
-        client_name = rfp['sales_agent_output']['summary']['client_name']
-        delivery_loc = rfp['sales_agent_output']['logistics_constraints']['delivery_location']
-        print(f"\nAnalyzing {rfp_id}...")
-
-        # --- A. DETAILED COSTING ---
-        audit_lines = []
-        product_breakdowns = []
-        total_mfg = 0
-        total_pkg = 0
-        total_test = 0
-        total_weight = 0
+    # Get Items (Prioritize Tech Matches, Fallback to Sales)
+    items = tech_out.get('line_item_matches') or sales_out['line_items_extracted']
+
+    for item in items:
+        pid = item.get('matched_product_id') or item.get('lot_id')
+        qty = float(item.get('confirmed_quantity') or item.get('quantity') or 1000)
+        
+        # 1. Material (Micro-BOM)
+        mfg, wt, breakdown, risk, oh = brain.calculate_micro_bom_cost(pid, qty, max_breakdown=2)
+        total_mfg += mfg
+        total_weight += wt
         
-        # Get Items (Prioritize Tech Matches, Fallback to Sales)
-        items = rfp.get('tech_agent_output', {}).get('line_item_matches', [])
-        if not items: items = rfp['sales_agent_output']['line_items_extracted']
+        # 2. Packaging
+        # Integer ceil-divide for whole-meter quantities (the usual case), float ceil otherwise
+        drums = (int(qty) + 499) // 500 if qty.is_integer() else math.ceil(qty / 500)
+        steel_drum, is_hv, _ = brain.classify_product(pid)
+        p_cost = drums * (CONFIG["PACKAGING"]["STEEL_DRUM_COST"] if steel_drum else CONFIG["PACKAGING"]["WOODEN_DRUM_COST"])
+        total_pkg += p_cost
+
+        # 3. Testing (NEW ENGINE)
+        # Use calculate_compliance_cost if available, else simple fallback logic for demo
+        # Since calculate_compliance_cost was not in previous file content provided in prompt, 
+        # I will use the robust logic similar to main PricingEngine block but ensuring variable names align.
+        # However, looking at my previous generated code in thoughts, I added calculate_compliance_cost. 
+        # I will implement a robust test calc here directly based on Test Master.
+        
+        t_cost = 0
+        t_breakdown = []
+        
+        # Relevant tests were resolved per cable class when the DB was loaded
+        for test_name, base_cost, is_routine in brain.applicable_tests[is_hv]:
+            c = base_cost * drums if is_routine else base_cost
+            t_cost += c
+            t_breakdown.append(f"- {test_name}: {c:,.0f}")
+        
+        if t_cost == 0: # Fallback
+            t_cost = CONFIG["TESTING"]["HV_BASE_COST"] if is_hv else CONFIG["TESTING"]["LV_BASE_COST"]
+            t_breakdown.append(f"- Standard Routine Tests: {t_cost}")
 
-        for item in items:
-            pid = item.get('matched_product_id') or item.get('lot_id')
-            qty = float(item.get('confirmed_quantity') or item.get('quantity') or 1000)
-            
-            # 1. Material (Micro-BOM)
-            mfg, wt, breakdown, risk, oh = brain.calculate_micro_bom_cost(pid, qty)
-            total_mfg += mfg
-            total_weight += wt
-            
-            # 2. Packaging
-            drums = math.ceil(qty / 500)
-            p_cost = drums * (CONFIG["PACKAGING"]["STEEL_DRUM_COST"] if "33KV" in str(pid) else CONFIG["PACKAGING"]["WOODEN_DRUM_COST"])
-            total_pkg += p_cost
-
-            # 3. Testing (NEW ENGINE)
-            # Use calculate_compliance_cost if available, else simple fallback logic for demo
-            # Since calculate_compliance_cost was not in previous file content provided in prompt, 
-            # I will use the robust logic similar to main PricingEngine block but ensuring variable names align.
-            # However, looking at my previous generated code in thoughts, I added calculate_compliance_cost. 
-            # I will implement a robust test calc here directly based on Test Master.
-            
-            t_cost = 0
-            t_breakdown = []
-            
-            # Simple Category Check
-            is_hv = "33KV" in str(pid).upper() or "11KV" in str(pid).upper()
-            
-            # Find relevant tests in DB
-            for test in db.data["TESTS"]:
-                applies = False
-                if "All Cables" in test['mandatory_for']: applies = True
-                if is_hv and "HT Cables" in test['mandatory_for']: applies = True
-                
-                if applies:
-                    c = test['base_test_cost']
-                    if "Routine" in test['test_category']:
-                        c = c * drums
-                    t_cost += c
-                    t_breakdown.append(f"- {test['test_name']}: {c:,.0f}")
-            
-            if t_cost == 0: # Fallback
-                t_cost = CONFIG["TESTING"]["HV_BASE_COST"] if is_hv else CONFIG["TESTING"]["LV_BASE_COST"]
-                t_breakdown.append(f"- Standard Routine Tests: {t_cost}")
+        total_test += t_cost
 
-            total_test += t_cost
+        product_breakdowns.append({
+            "name": pid, "qty": qty, "cost": mfg, "pkg": p_cost, "test": t_cost,
+            "test_breakdown": t_breakdown
+        })
+        audit_lines.extend(breakdown) # Top 2 lines only, for summary
 
-            product_breakdowns.append({
-                "name": pid, "qty": qty, "cost": mfg, "pkg": p_cost, "test": t_cost,
-                "test_breakdown": t_breakdown
-            })
-            audit_lines.extend(breakdown[:2]) # Keep top 2 lines for summary
+    # 4. Logistics (Zone Based)
+    log_cost, log_formula, log_risk_pct, zone_name = brain.calculate_logistics(total_weight, dist, delivery_loc)
 
-        # 4. Logistics (Zone Based)
-        dist = rfp['sales_agent_output']['logistics_constraints'].get('distance_from_factory_km', 500)
-        log_cost, log_formula, log_risk_pct, zone_name = brain.calculate_logistics(total_weight, dist, delivery_loc)
+    # --- B. STRATEGIC ADJUSTMENTS ---
+    strategy_notes = []
+    
+    # 1. Factory Load
+    fact_adj_pct, fact_reason = brain.analyze_factory_load(pid) 
+    if fact_adj_pct != 0: strategy_notes.append(fact_reason)
+    
+    # 2. Financials
+    base_cost = total_mfg + total_pkg + total_test + log_cost
+    fin_cost, credit_days, loy_disc = brain.analyze_financials(client_name, base_cost)
+    if fin_cost > 0: strategy_notes.append(f"Credit Cost ({credit_days} days): +INR {int(fin_cost)}")
+    if loy_disc != 0: strategy_notes.append(f"Loyalty Discount: {loy_disc*100}%")
+
+    # 3. Game Theory
+    rivals = tech_out.get('competitor_codes', [])
+    comp_adj, comp_notes = brain.solve_game_theory(rivals)
+    strategy_notes.extend(comp_notes)
+    
+    # 4. Logistics Risk
+    if log_risk_pct > 0:
+        strategy_notes.append(f"Zone Risk ({zone_name}): +{log_risk_pct*100}%")
 
-        # --- B. STRATEGIC ADJUSTMENTS ---
-        strategy_notes = []
-        
-        # 1. Factory Load
-        fact_adj_pct, fact_reason = brain.analyze_factory_load(pid) 
-        if fact_adj_pct != 0: strategy_notes.append(fact_reason)
-        
-        # 2. Financials
-        base_cost = total_mfg + total_pkg + total_test + log_cost
-        fin_cost, credit_days, loy_disc = brain.analyze_financials(client_name, base_cost)
-        if fin_cost > 0: strategy_notes.append(f"Credit Cost ({credit_days} days): +INR {int(fin_cost)}")
-        if loy_disc != 0: strategy_notes.append(f"Loyalty Discount: {loy_disc*100}%")
-
-        # 3. Game Theory
-        rivals = rfp.get('tech_agent_output', {}).get('competitor_codes', [])
-        comp_adj, comp_notes = brain.solve_game_theory(rivals)
-        strategy_notes.extend(comp_notes)
-        
-        # 4. Logistics Risk
-        if log_risk_pct > 0:
-            strategy_notes.append(f"Zone Risk ({zone_name}): +{log_risk_pct*100}%")
+    # --- C. FINAL PRICE CALCULATION ---
+    target_margin = CONFIG["FINANCIAL"]["TARGET_NET_MARGIN"]
+    
+    # Apply Adjustments
+    final_margin = target_margin + fact_adj_pct + loy_disc + comp_adj + log_risk_pct
+    if final_margin < CONFIG["FINANCIAL"]["MIN_SURVIVAL_MARGIN"]:
+        final_margin = CONFIG["FINANCIAL"]["MIN_SURVIVAL_MARGIN"]
+        strategy_notes.append("EMERGENCY: Margin Floor Hit (Survival Mode)")
 
-        # --- C. FINAL PRICE CALCULATION ---
-        target_margin = CONFIG["FINANCIAL"]["TARGET_NET_MARGIN"]
-        
-        # Apply Adjustments
-        final_margin = target_margin + fact_adj_pct + loy_disc + comp_adj + log_risk_pct
-        if final_margin < CONFIG["FINANCIAL"]["MIN_SURVIVAL_MARGIN"]:
-            final_margin = CONFIG["FINANCIAL"]["MIN_SURVIVAL_MARGIN"]
-            strategy_notes.append("EMERGENCY: Margin Floor Hit (Survival Mode)")
+    full_cost_base = base_cost + fin_cost
+    bid_value = full_cost_base * (1 + final_margin)
 
-        full_cost_base = base_cost + fin_cost
-        bid_value = full_cost_base * (1 + final_margin)
+    # --- D. OUTPUT GENERATION ---
+    
+    # 1. JSON Update
+    rfp['pricing_agent_output'] = {
+        "status": "Success",
+        "financial_summary": {
+            "final_bid_value": int(bid_value),
+            "margin_percentage": f"{final_margin*100:.1f}%",
+            "total_cost_base": int(full_cost_base),
+            "total_material_cost": int(total_mfg),
+            "total_logistics_cost": int(log_cost),
+            "total_packaging_cost": int(total_pkg),
+            "total_testing_cost": int(total_test),
+            "finance_cost": int(fin_cost)
+        },
+        "audit_details": {
+            "manufacturing": {"total": total_mfg, "breakdown": audit_lines, "formula": "Micro-BOM"},
+            "strategy": {"rationale": strategy_notes, "competitor_impact": f"{comp_adj*100:+.1f}%", "zone_risk": f"{log_risk_pct*100}%"}
+        },
+        "breakdowns": {"strategy_rationale": strategy_notes}
+    }
 
-        # --- D. OUTPUT GENERATION ---
-        
-        # 1. JSON Update
-        rfp['pricing_agent_output'] = {
-            "status": "Success",
-            "financial_summary": {
-                "final_bid_value": int(bid_value),
-                "margin_percentage": f"{final_margin*100:.1f}%",
-                "total_cost_base": int(full_cost_base),
-                "total_material_cost": int(total_mfg),
-                "total_logistics_cost": int(log_cost),
-                "total_packaging_cost": int(total_pkg),
-                "total_testing_cost": int(total_test),
-                "finance_cost": int(fin_cost)
-            },
-            "audit_details": {
-                "manufacturing": {"total": total_mfg, "breakdown": audit_lines, "formula": "Micro-BOM"},
-                "strategy": {"rationale": strategy_notes, "competitor_impact": f"{comp_adj*100:+.1f}%", "zone_risk": f"{log_risk_pct*100}%"}
-            },
-            "breakdowns": {"strategy_rationale": strategy_notes}
-        }
-        processed_output.append(rfp)
+    # 2. PDF Generation (skipped if a report for identical content already exists)
+    report_hash = audit_content_hash([
+        rfp_id, client_name, delivery_loc, zone_name, dist, log_formula,
+        product_breakdowns, rfp['pricing_agent_output']
+    ])
+    report_name = f"{rfp_id}_{report_hash}_AUDIT.pdf"
+    fname = os.path.join(audit_dir, report_name)
+    rfp['audit_report_url'] = f"/audit_reports/{report_name}"
+    if os.path.exists(fname):
+        return rfp
+
+    pdf = AdvancedAuditPDF()
+    pdf.add_page()
+    
+    # Project Info
+    pdf.section_header("1. PROJECT & CLIENT IDENTITY")
+    pdf.add_row("RFP Reference", rfp_id)
+    pdf.add_row("Client Name", client_name)
+    pdf.add_row("Destination", f"{delivery_loc} ({zone_name})")
+    pdf.ln(5)
+
+    # Costing Detail
+    pdf.section_header("2. PRODUCT-WISE COST BREAKDOWN")
+    for p_item in product_breakdowns:
+        pdf.add_product_block(p_item)
+    
+    pdf.ln(5)
+    pdf.section_header("3. LOGISTICS & FINANCIALS")
+    pdf.add_row(f"Logistics ({dist}km, {total_weight/1000:.1f}T)", f"INR {log_cost:,.0f}")
+    pdf.set_font('Helvetica', 'I', 8); pdf.cell(0, 5, f"Formula: {log_formula}", 0, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.add_row(f"Cost of Capital ({credit_days} Days)", f"INR {fin_cost:,.0f}")
+    pdf.ln(2)
+    pdf.add_row("FULL COST BASE", f"INR {full_cost_base:,.0f}", is_bold=True)
+    pdf.ln(5)
+
+    # Strategy
+    pdf.section_header("4. STRATEGIC MARGIN BUILD-UP")
+    pdf.add_row("Base Target Margin", f"{CONFIG['FINANCIAL']['TARGET_NET_MARGIN']*100}%")
+    pdf.set_font('Helvetica', 'I', 9)
+    for note in strategy_notes:
+        pdf.cell(0, 5, f"  > {note}", 0, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(2)
+    pdf.add_row("FINAL NET MARGIN", f"{final_margin*100:.1f}%", is_bold=True)
+    
+    # Final
+    pdf.ln(10)
+    pdf.set_fill_color(0, 0, 0)
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font('Helvetica', 'B', 14)
+    pdf.cell(140, 12, " FINAL BID SUBMISSION VALUE", 1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C', fill=True)
+    pdf.cell(50, 12, f" INR {bid_value:,.0f} ", 1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R', fill=True)
+
+    # Render in memory, write to a temp file and rename it into place, so the
+    # skip-if-exists check above never trusts a half-written report
+    tmp_name = f"{fname}.{os.getpid()}.tmp"
+    with open(tmp_name, 'wb') as f:
+        f.write(pdf.output())
+    os.replace(tmp_name, fname)
+    remove_stale_audit_reports(audit_dir, rfp_id, report_name)
+    return rfp
+
+_WORKER = {}  # Per-process pricing engine + audit dir, set up by _init_worker
+
+def _init_worker(db_blob, audit_dir):
+    _WORKER["brain"] = PricingEngine(Database(data=pickle.loads(db_blob)))
+    _WORKER["audit_dir"] = audit_dir
+
+def _price_rfp_in_worker(rfp):
+    return price_rfp(rfp, _WORKER["brain"], _WORKER["audit_dir"])
 
-        # 2. PDF Generation
-        pdf = AdvancedAuditPDF()
-        pdf.add_page()
-        
-        # Project Info
-        pdf.section_header("1. PROJECT & CLIENT IDENTITY")
-        pdf.add_row("RFP Reference", rfp_id)
-        pdf.add_row("Client Name", client_name)
-        pdf.add_row("Destination", f"{delivery_loc} ({zone_name})")
-        pdf.ln(5)
-
-        # Costing Detail
-        pdf.section_header("2. PRODUCT-WISE COST BREAKDOWN")
-        for p_item in product_breakdowns:
-            pdf.add_product_block(p_item)
-        
-        pdf.ln(5)
-        pdf.section_header("3. LOGISTICS & FINANCIALS")
-        pdf.add_row(f"Logistics ({dist}km, {total_weight/1000:.1f}T)", f"INR {log_cost:,.0f}")
-        pdf.set_font('Helvetica', 'I', 8); pdf.cell(0, 5, f"Formula: {log_formula}", 0, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.add_row(f"Cost of Capital ({credit_days} Days)", f"INR {fin_cost:,.0f}")
-        pdf.ln(2)
-        pdf.add_row("FULL COST BASE", f"INR {full_cost_base:,.0f}", is_bold=True)
-        pdf.ln(5)
-
-        # Strategy
-        pdf.section_header("4. STRATEGIC MARGIN BUILD-UP")
-        pdf.add_row("Base Target Margin", f"{CONFIG['FINANCIAL']['TARGET_NET_MARGIN']*100}%")
-        for note in strategy_notes:
-            pdf.set_font('Helvetica', 'I', 9)
-            pdf.cell(0, 5, f"  > {note}", 0, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-        pdf.ln(2)
-        pdf.add_row("FINAL NET MARGIN", f"{final_margin*100:.1f}%", is_bold=True)
-        
-        # Final
-        pdf.ln(10)
-        pdf.set_fill_color(0, 0, 0)
-        pdf.set_text_color(255, 255, 255)
-        pdf.set_font('Helvetica', 'B', 14)
-        pdf.cell(140, 12, " FINAL BID SUBMISSION VALUE", 1, new_x=XPos.RIGHT, new_y=YPos.TOP, align='C', fill=True)
-        pdf.cell(50, 12, f" INR {bid_value:,.0f} ", 1, new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='R', fill=True)
-
-        fname = os.path.join(BASE_DIR, "audit_reports", f"{rfp_id}_AUDIT.pdf")
-        if not os.path.exists(os.path.dirname(fname)): os.makedirs(os.path.dirname(fname))
-        pdf.output(fname)
-        rfp['audit_report_url'] = f"/audit_reports/{rfp_id}_AUDIT.pdf"
+def run_brain():
+    # 1. Init
+    db = Database()
+    brain = PricingEngine(db)
+    
+    # 2. Load Input
+    rfp_path = os.path.join(BASE_DIR, FILES["INPUT"])
+    try:
+        rfps = load_json_bytes(read_file_bytes(rfp_path))
+    except FileNotFoundError:
+        return print("No Input File.")
+    audit_dir = os.path.join(BASE_DIR, "audit_reports")
+    os.makedirs(audit_dir, exist_ok=True)
+
+    if len(rfps) <= 1 or (os.cpu_count() or 1) == 1:
+        processed_output = [price_rfp(rfp, brain, audit_dir) for rfp in rfps]
+    else:
+        # RFPs are independent: fan out across processes, each worker builds its engine once
+        workers = min(len(rfps), os.cpu_count())
+        # Masters are serialized once here rather than once per worker under spawn-based pools
+        db_blob = pickle.dumps(db.data, protocol=pickle.HIGHEST_PROTOCOL)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(db_blob, audit_dir)) as ex:
+            processed_output = list(ex.map(_price_rfp_in_worker, rfps, chunksize=max(1, len(rfps) // (workers * 4))))
 
     # Save
-    with open(os.path.join(BASE_DIR, FILES["OUTPUT"]), 'w') as f:
-        json.dump(processed_output, f, indent=2)
+    with open(os.path.join(BASE_DIR, FILES["OUTPUT"]), 'wb') as f:
+        # Compact by default; set PRICING_PRETTY_JSON=1 for human-readable output while debugging
+        f.write(dump_json_bytes(processed_output, pretty=os.environ.get("PRICING_PRETTY_JSON", "").lower() in ("1", "true", "yes")))
     print(">>> SUCCESS: Diamond-Tier Pricing Complete.")
 
 if __name__ == "__main__":
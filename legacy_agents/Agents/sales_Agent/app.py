@@ -2,7 +2,7 @@
 app_genie_json_download_only.py
 
 Streamlit app:
-- Upload a PDF
+- Upload one or more PDFs (processed concurrently)
 - Use Gemini to extract structured JSON following example schema
 - Return only a downloadable JSON file when successful (no previews)
 """
@@ -11,16 +11,27 @@ import streamlit as st
 from dotenv import load_dotenv
 import os
 import uuid
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import json
-import re
-from PyPDF2 import PdfReader
+import hashlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import fitz  # PyMuPDF
 
 # optional SDK import (may be None if not installed)
 try:
     import google.generativeai as genai
+    from google.api_core import exceptions as google_exceptions
 except Exception:
     genai = None
+    google_exceptions = None
+
+# optional fast JSON backend (falls back to stdlib json)
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 load_dotenv()
 
@@ -28,26 +39,42 @@ load_dotenv()
 def now_iso_utc():
     return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
-def extract_pdf_text(uploaded_file):
-    """Extract textual content from an uploaded PDF file using PyPDF2."""
+# Hard cap on PDF text sent to Gemini (bounds prompt tokens/cost on very large tenders)
+MAX_PDF_TEXT_CHARS = 100_000
+
+@st.cache_data(show_spinner=False)
+def extract_pdf_text(pdf_bytes: bytes, max_chars: int = MAX_PDF_TEXT_CHARS):
+    """
+    Extract textual content from uploaded PDF bytes using PyMuPDF (MuPDF C engine). Cached per file content.
+    Pages are streamed into one buffer and reading stops once max_chars is reached.
+    """
     try:
-        reader = PdfReader(uploaded_file)
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     except Exception as e:
         raise RuntimeError(f"Unable to read PDF: {e}")
-    texts = []
-    for page in reader.pages:
-        try:
-            t = page.extract_text() or ""
-        except Exception:
-            t = ""
-        if t:
-            texts.append(t)
-    if not texts:
+    buf = io.StringIO()
+    size = 0
+    try:
+        for page in doc:
+            try:
+                t = page.get_text("text") or ""
+            except Exception:
+                t = ""
+            if t:
+                if size:
+                    size += buf.write("\n\n")
+                size += buf.write(t)
+                if size >= max_chars:
+                    break
+    finally:
+        doc.close()
+    if not size:
         raise RuntimeError("No selectable text found in PDF. If PDF is scanned, use OCR or provide a searchable PDF.")
-    return "\n\n".join(texts)
+    return buf.getvalue()[:max_chars]
 
+@st.cache_resource(show_spinner=False)
 def build_example_json():
-    """Return the example JSON structure (as Python dict)."""
+    """Return the example JSON structure (as Python dict). Shared instance; callers must not mutate it."""
     return {
         "rfp_unique_id": "RFP-2025-DMRC-003",
         "status": "New",
@@ -98,14 +125,10 @@ def build_example_json():
         }
     }
 
-def prepare_prompt(pdf_text: str):
-    """Prepare a safe prompt embedding example JSON and the PDF text."""
-    if not pdf_text:
-        raise ValueError("pdf_text cannot be empty")
-
-    example = build_example_json()
-    example_str = json.dumps(example, indent=2)
-    prompt = f"""
+def build_prompt_prefix():
+    """Static part of the extraction prompt: instructions, example JSON and rules (identical for every PDF)."""
+    example_str = json.dumps(build_example_json(), indent=2)
+    return f"""
 You are an accurate information extractor. Produce ONLY a JSON (no commentary) that follows EXACTLY the schema, structure, and keys used in this example. Replace the example values with values extracted from the provided PDF.
 
 Example JSON to follow (keys & structure):
@@ -117,101 +140,175 @@ Rules:
 3. Keep the exact keys inside "processing_stage_tracker" unchanged: sales_agent, tech_agent, pricing_agent, final_review.
 4. For "line_items_extracted" include one object per product found. If the PDF has N products, include N objects in that list. If some attribute is missing for a product, use the string "NOT SPECIFIED".
 5. Output JSON only — nothing else.
+"""
+
+PROMPT_PREFIX = build_prompt_prefix()
+# Changes whenever the example schema or rules change, so a stale Gemini cache is never reused
+PROMPT_PREFIX_HASH = hashlib.sha256(PROMPT_PREFIX.encode("utf-8")).hexdigest()
 
+def build_prompt_suffix(pdf_text: str):
+    """Per-PDF part of the extraction prompt."""
+    return f"""
 PDF Text:
 {pdf_text}
 """
-    return prompt
+
+def prepare_prompt(pdf_text: str):
+    """Prepare a safe prompt embedding example JSON and the PDF text."""
+    if not pdf_text:
+        raise ValueError("pdf_text cannot be empty")
+
+    return PROMPT_PREFIX + build_prompt_suffix(pdf_text)
+
+def json_loads(text):
+    """Parse JSON text with orjson when installed, else stdlib json."""
+    return orjson.loads(text) if orjson else json.loads(text)
+
+def json_dump_bytes(obj) -> bytes:
+    """Serialize to indented UTF-8 JSON bytes with orjson when installed, else stdlib json."""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+
+def _extract_json_span(text: str):
+    """Return the first balanced {...} object in text (string/escape aware), or None."""
+    start = text.find("{")
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
 
 def safe_parse_json(text: str):
     """Try to parse text to JSON. If text contains extra characters, attempt to extract first JSON object."""
     if not text:
         raise ValueError("Empty text for JSON parsing.")
     try:
-        return json.loads(text)
+        return json_loads(text)
     except Exception:
-        m = re.search(r"\{.*\}", text, flags=re.S)
-        if m:
-            candidate = m.group(0)
+        candidate = _extract_json_span(text)
+        if candidate:
             try:
-                return json.loads(candidate)
+                return json_loads(candidate)
             except Exception as e:
                 raise ValueError(f"Could not parse JSON from model output: {e}")
         raise ValueError("Model output is not valid JSON and no JSON object could be extracted.")
 
+# Schema keys, read once from the example template
+_TEMPLATE = build_example_json()
+_PROCESSING_KEYS = tuple(_TEMPLATE["processing_stage_tracker"])
+_SUMMARY_KEYS = tuple(_TEMPLATE["sales_agent_output"]["summary"])
+_LOGISTICS_KEYS = tuple(_TEMPLATE["sales_agent_output"]["logistics_constraints"])
+_COMMERCIAL_KEYS = tuple(_TEMPLATE["sales_agent_output"]["commercial_terms"])
+_TECH_ATTR_KEYS = tuple(_TEMPLATE["sales_agent_output"]["line_items_extracted"][0]["technical_attributes"])
+_MISSING = (None, "", [])
+
+def _fill_section(parsed_section, keys):
+    """Take keys from parsed_section, using 'NOT SPECIFIED' for missing/empty values."""
+    if not isinstance(parsed_section, dict):
+        parsed_section = {}
+    filled = {}
+    for k in keys:
+        v = parsed_section.get(k)
+        filled[k] = v if v not in _MISSING else "NOT SPECIFIED"
+    return filled
+
 def sanitize_and_fill(parsed: dict):
     """Ensure schema exists, fill missing entries with 'NOT SPECIFIED', set rfp id and timestamp."""
-    template = build_example_json()
-
     # processing tracker: preserve keys from template, accept values from parsed if provided
-    processing = template["processing_stage_tracker"].copy()
+    processing = dict(_TEMPLATE["processing_stage_tracker"])
     parsed_proc = parsed.get("processing_stage_tracker") or {}
     if isinstance(parsed_proc, dict):
-        for k in processing.keys():
+        for k in _PROCESSING_KEYS:
             v = parsed_proc.get(k)
-            if v not in (None, "", []):
+            if v not in _MISSING:
                 processing[k] = v
 
-    result = {
-        "rfp_unique_id": parsed.get("rfp_unique_id") or f"RFP-{uuid.uuid4().hex[:8].upper()}",
-        "status": parsed.get("status") or template["status"],
-        "last_updated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
-        "processing_stage_tracker": processing,
-        "sales_agent_output": {}
-    }
-
-    # summary
-    parsed_summary = (parsed.get("sales_agent_output") or {}).get("summary") or {}
-    summary = {}
-    for k in template["sales_agent_output"]["summary"].keys():
-        v = parsed_summary.get(k)
-        summary[k] = v if v not in (None, "", []) else "NOT SPECIFIED"
-
-    # logistics
-    parsed_log = (parsed.get("sales_agent_output") or {}).get("logistics_constraints") or {}
-    logistics = {}
-    for k in template["sales_agent_output"]["logistics_constraints"].keys():
-        v = parsed_log.get(k)
-        logistics[k] = v if v not in (None, "", []) else "NOT SPECIFIED"
-
-    # commercial
-    parsed_comm = (parsed.get("sales_agent_output") or {}).get("commercial_terms") or {}
-    commercial = {}
-    for k in template["sales_agent_output"]["commercial_terms"].keys():
-        v = parsed_comm.get(k)
-        commercial[k] = v if v not in (None, "", []) else "NOT SPECIFIED"
+    sao = parsed.get("sales_agent_output") or {}
 
     # line items
-    parsed_items = (parsed.get("sales_agent_output") or {}).get("line_items_extracted") or parsed.get("line_items_extracted") or []
+    parsed_items = sao.get("line_items_extracted") or parsed.get("line_items_extracted") or []
     final_items = []
     if isinstance(parsed_items, list):
         for i, item in enumerate(parsed_items, start=1):
             if not isinstance(item, dict):
                 continue
-            ta = item.get("technical_attributes") or {}
-            filled_ta = {}
-            template_ta = template["sales_agent_output"]["line_items_extracted"][0]["technical_attributes"]
-            for tk in template_ta.keys():
-                tv = ta.get(tk)
-                filled_ta[tk] = tv if tv not in (None, "", []) else "NOT SPECIFIED"
-
-            lot = {
+            quantity = item.get("quantity")
+            final_items.append({
                 "lot_id": item.get("lot_id") or f"L{i:03d}",
                 "raw_description": item.get("raw_description") or "NOT SPECIFIED",
-                "quantity": item.get("quantity") if item.get("quantity") not in (None, "") else "NOT SPECIFIED",
+                "quantity": quantity if quantity not in (None, "") else "NOT SPECIFIED",
                 "unit": item.get("unit") or "NOT SPECIFIED",
-                "technical_attributes": filled_ta
-            }
-            final_items.append(lot)
-
-    result["sales_agent_output"] = {
-        "summary": summary,
-        "logistics_constraints": logistics,
-        "commercial_terms": commercial,
-        "line_items_extracted": final_items
+                "technical_attributes": _fill_section(item.get("technical_attributes") or {}, _TECH_ATTR_KEYS)
+            })
+
+    return {
+        "rfp_unique_id": parsed.get("rfp_unique_id") or f"RFP-{uuid.uuid4().hex[:8].upper()}",
+        "status": parsed.get("status") or _TEMPLATE["status"],
+        "last_updated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "processing_stage_tracker": processing,
+        "sales_agent_output": {
+            "summary": _fill_section(sao.get("summary") or {}, _SUMMARY_KEYS),
+            "logistics_constraints": _fill_section(sao.get("logistics_constraints") or {}, _LOGISTICS_KEYS),
+            "commercial_terms": _fill_section(sao.get("commercial_terms") or {}, _COMMERCIAL_KEYS),
+            "line_items_extracted": final_items
+        }
     }
 
-    return result
+# ----------------- Response cache (on disk) -----------------
+RESPONSE_CACHE_DIR = ".rfp_cache"
+RESPONSE_CACHE_TTL_SECONDS = 30 * 24 * 3600
+
+# Bumped when the cached payload changes shape (v2: parsed model output, before sanitize_and_fill)
+RESPONSE_CACHE_FORMAT = "v2"
+
+def response_cache_key(pdf_bytes: bytes):
+    """SHA-256 of the PDF bytes and the prompt prefix, so a prompt change never serves an old extraction."""
+    h = hashlib.sha256(pdf_bytes)
+    h.update(PROMPT_PREFIX_HASH.encode("utf-8"))
+    h.update(RESPONSE_CACHE_FORMAT.encode("utf-8"))
+    return h.hexdigest()
+
+def load_cached_response(key):
+    """Return the cached JSON bytes for key, or None if missing/expired."""
+    path = os.path.join(RESPONSE_CACHE_DIR, f"{key}.json")
+    try:
+        if time.time() - os.path.getmtime(path) > RESPONSE_CACHE_TTL_SECONDS:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def store_cached_response(key, json_bytes: bytes):
+    """Write the parsed model output under key (atomic replace). A failed write only costs the cache."""
+    path = os.path.join(RESPONSE_CACHE_DIR, f"{key}.json")
+    try:
+        os.makedirs(RESPONSE_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json_bytes)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
 
 # ----------------- Gemini calling (adaptive) -----------------
 def configure_genai(api_key):
@@ -219,9 +316,71 @@ def configure_genai(api_key):
         raise RuntimeError("google.generativeai SDK is not available in this environment.")
     genai.configure(api_key=api_key)
 
-def try_generate_with_models(prompt, model_candidates=None, methods=None):
+# Deterministic decoding so cached responses match what a fresh call would return
+GENERATION_CONFIG = {"temperature": 0}
+
+# Streamlit TTL is kept below the Gemini TTL so an expired server-side cache is never handed out
+PROMPT_CACHE_TTL_SECONDS = 3600
+
+# Gemini rejects context caches under this many tokens; at ~4 characters per token a
+# shorter prefix would only add a failing create call per model, so none is attempted
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_ENABLED = len(PROMPT_PREFIX) // 4 >= PROMPT_CACHE_MIN_TOKENS
+
+@st.cache_resource(show_spinner=False, ttl=PROMPT_CACHE_TTL_SECONDS - 300)
+def _create_prompt_cache(model_name, prefix_hash):
+    """Create a Gemini context cache holding PROMPT_PREFIX for a model. Raises on failure so nothing is cached."""
+    return genai.caching.CachedContent.create(
+        model=f"models/{model_name}",
+        contents=[PROMPT_PREFIX],
+        ttl=timedelta(seconds=PROMPT_CACHE_TTL_SECONDS),
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_prompt_cache_rejections():
+    """(model name, prefix hash) pairs Gemini refused to cache (unsupported model, prefix too small)."""
+    return set()
+
+def get_prompt_cache(model_name):
+    """
+    Cached prompt prefix for a model, or None when caching is unavailable
+    (old SDK, unsupported model, prefix below the minimum cacheable size).
+    Rejections are remembered per model; transient errors are retried on the next call.
+    """
+    if not PROMPT_CACHE_ENABLED or genai is None or not hasattr(genai, "caching"):
+        return None
+    key = (model_name, PROMPT_PREFIX_HASH)
+    rejected = get_prompt_cache_rejections()
+    if key in rejected:
+        return None
+    try:
+        return _create_prompt_cache(model_name, PROMPT_PREFIX_HASH)
+    except Exception as e:
+        if google_exceptions is not None and isinstance(e, (google_exceptions.BadRequest, google_exceptions.NotFound)):
+            rejected.add(key)
+        return None
+
+@st.cache_resource(show_spinner=False)
+def get_generative_model(model_name):
+    """Build one GenerativeModel per model name and reuse it across reruns."""
+    return genai.GenerativeModel(model_name, generation_config=GENERATION_CONFIG)
+
+@st.cache_resource(show_spinner=False)
+def get_resolved_call():
+    """(model name, method) that last returned text; survives Streamlit reruns."""
+    return {"model": None, "method": None}
+
+def _resolved_first(candidates, resolved):
+    """Move the previously working candidate to the front so it is tried first."""
+    if resolved in candidates:
+        return [resolved] + [c for c in candidates if c != resolved]
+    return candidates
+
+def try_generate_with_models(prompt, model_candidates=None, methods=None, pdf_text=None):
     """
     Try several model names & methods until one returns text.
+    The last working (model, method) pair is tried first; the rest are the fallback probe.
+    If pdf_text is given and the model has a cached prompt prefix, only the PDF part is sent.
     Returns the raw text.
     """
     if genai is None:
@@ -237,120 +396,212 @@ def try_generate_with_models(prompt, model_candidates=None, methods=None):
     if methods is None:
         methods = ["generate_content", "generate_text", "generate_message", "generate"]
 
+    resolved = get_resolved_call()
+    model_candidates = _resolved_first(model_candidates, resolved["model"])
+    methods = _resolved_first(methods, resolved["method"])
+
     last_err = None
     for m in model_candidates:
-        try:
-            model = genai.GenerativeModel(m)
-        except Exception as e:
-            last_err = e
-            continue
-        for method in methods:
-            if not hasattr(model, method):
-                continue
+        # Cached prefix first (cheaper input tokens), full prompt as the fallback
+        variants = []
+        cache = get_prompt_cache(m) if pdf_text is not None else None
+        if cache is not None:
+            variants.append((cache, build_prompt_suffix(pdf_text)))
+        variants.append((None, prompt))
+
+        for cached, model_prompt in variants:
             try:
-                fn = getattr(model, method)
-                try:
-                    resp = fn(prompt)
-                except TypeError:
-                    resp = fn({"prompt": prompt})
-                # extract text
-                text = None
-                if hasattr(resp, "text") and isinstance(resp.text, str):
-                    text = resp.text
-                else:
-                    # attempt to find a textual candidate in repr / dict
-                    try:
-                        if hasattr(resp, "to_dict"):
-                            d = resp.to_dict()
-                        else:
-                            d = resp.__dict__
-                    except Exception:
-                        d = None
-                    # deep search for first string
-                    def deep_search(o):
-                        if isinstance(o, str):
-                            return o
-                        if isinstance(o, dict):
-                            for v in o.values():
-                                r = deep_search(v)
-                                if r:
-                                    return r
-                        if isinstance(o, list):
-                            for el in o:
-                                r = deep_search(el)
-                                if r:
-                                    return r
-                        return None
-                    cand = deep_search(d)
-                    if cand:
-                        text = cand
-                if not text:
-                    text = str(resp)
-                return text
+                model = genai.GenerativeModel.from_cached_content(cached_content=cached, generation_config=GENERATION_CONFIG) if cached else get_generative_model(m)
             except Exception as e:
                 last_err = e
                 continue
+            for method in methods:
+                if not hasattr(model, method):
+                    continue
+                try:
+                    fn = getattr(model, method)
+                    try:
+                        resp = fn(model_prompt)
+                    except TypeError:
+                        resp = fn({"prompt": model_prompt})
+                    # extract text
+                    text = None
+                    if hasattr(resp, "text") and isinstance(resp.text, str):
+                        text = resp.text
+                    else:
+                        # attempt to find a textual candidate in repr / dict
+                        try:
+                            if hasattr(resp, "to_dict"):
+                                d = resp.to_dict()
+                            else:
+                                d = resp.__dict__
+                        except Exception:
+                            d = None
+                        # deep search for first string
+                        def deep_search(o):
+                            if isinstance(o, str):
+                                return o
+                            if isinstance(o, dict):
+                                for v in o.values():
+                                    r = deep_search(v)
+                                    if r:
+                                        return r
+                            if isinstance(o, list):
+                                for el in o:
+                                    r = deep_search(el)
+                                    if r:
+                                        return r
+                            return None
+                        cand = deep_search(d)
+                        if cand:
+                            text = cand
+                    if not text:
+                        text = str(resp)
+                    resolved["model"], resolved["method"] = m, method
+                    return text
+                except Exception as e:
+                    last_err = e
+                    continue
     raise RuntimeError(f"All model attempts failed. Last error: {last_err}")
 
-# ----------------- Streamlit UI (minimal / download-only) -----------------
-st.set_page_config(page_title="PDF → RFP JSON (Download Only)", layout="centered")
-st.title("PDF → RFP JSON Filler (Download Only)")
-st.write("Upload an RFP/Tender PDF and get a downloadable JSON following the required schema. No previews will be shown for professionalism.")
+# ----------------- Per-PDF pipeline -----------------
+# Concurrent Gemini requests when several PDFs are processed (keep within the key's RPM quota)
+MAX_CONCURRENT_REQUESTS = 4
+RATE_LIMIT_RETRIES = 4
+RATE_LIMIT_BACKOFF_SECONDS = 2.0
 
-uploaded_file = st.file_uploader("Upload PDF (RFP/Tender)", type=["pdf"])
-if not uploaded_file:
-    st.info("Upload a PDF to extract data.")
-    st.stop()
+def _is_rate_limited(err):
+    msg = str(err)
+    return "429" in msg or "ResourceExhausted" in type(err).__name__ or "quota" in msg.lower()
 
-# Check API key and configure genai
-API_KEY = os.getenv("GOOGLE_API_KEY")
-if not API_KEY:
-    st.error("Please set GOOGLE_API_KEY in your environment or .env file.")
-    st.stop()
-
-try:
-    configure_genai(API_KEY)
-except Exception as e:
-    st.error(f"Failed to configure Gemini SDK: {e}")
-    st.stop()
+def generate_with_backoff(prompt, pdf_text):
+    """try_generate_with_models with exponential backoff on 429 / quota errors."""
+    delay = RATE_LIMIT_BACKOFF_SECONDS
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            return try_generate_with_models(prompt, pdf_text=pdf_text)
+        except Exception as e:
+            if attempt == RATE_LIMIT_RETRIES or not _is_rate_limited(e):
+                raise
+            time.sleep(delay)
+            delay *= 2
+
+def process_pdf(pdf_bytes: bytes):
+    """PDF bytes → final JSON bytes. Raises RuntimeError naming the failed stage."""
+    # same tender (and same prompt) → reuse the earlier model output, no Gemini call.
+    # sanitize_and_fill still runs per request, so each submission gets its own ID and timestamp.
+    cache_key = response_cache_key(pdf_bytes)
+    cached = load_cached_response(cache_key)
+    if cached is not None:
+        try:
+            return json_dump_bytes(sanitize_and_fill(json_loads(cached)))
+        except Exception:
+            pass  # unreadable entry: extract again and overwrite it
 
-# PROCESS button
-if st.button("PROCESS"):
     # extract text
     try:
-        pdf_text = extract_pdf_text(uploaded_file)
+        pdf_text = extract_pdf_text(pdf_bytes)
     except Exception as e:
-        st.error(f"PDF extraction failed: {e}")
-        st.stop()
+        raise RuntimeError(f"PDF extraction failed: {e}")
 
     # build prompt
     prompt = prepare_prompt(pdf_text)
 
     # call model
     try:
-        raw_output_text = try_generate_with_models(prompt)
+        raw_output_text = generate_with_backoff(prompt, pdf_text)
     except Exception as e:
-        st.error(f"Model generation failed: {e}")
-        st.stop()
+        raise RuntimeError(f"Model generation failed: {e}")
 
     # parse JSON
     try:
         parsed = safe_parse_json(raw_output_text)
     except Exception as e:
-        st.error(f"Failed to parse JSON from model output: {e}")
-        st.stop()
+        raise RuntimeError(f"Failed to parse JSON from model output: {e}")
+
+    store_cached_response(cache_key, json_dump_bytes(parsed))
 
     # sanitize & fill
     final_response = sanitize_and_fill(parsed)
 
     # Prepare download bytes
-    json_bytes = json.dumps(final_response, indent=2, ensure_ascii=False).encode("utf-8")
-
-    # Show minimal success and download button only
-    st.success("JSON extraction complete. Click the button below to download the file.")
-    st.download_button(
-        "Download extracted JSON",
-        data=json_bytes,
-        file_name="extracted_rfp.json",
-        mime="application/json"
-    )
+    return json_dump_bytes(final_response)
+
+# ----------------- Streamlit UI (minimal / download-only) -----------------
+st.set_page_config(page_title="PDF → RFP JSON (Download Only)", layout="centered")
+st.title("PDF → RFP JSON Filler (Download Only)")
+st.write("Upload one or more RFP/Tender PDFs and get a downloadable JSON per PDF following the required schema. No previews will be shown for professionalism.")
+
+uploaded_files = st.file_uploader("Upload PDF (RFP/Tender)", type=["pdf"], accept_multiple_files=True)
+if not uploaded_files:
+    st.info("Upload a PDF to extract data.")
+    st.stop()
+
+# Check API key and configure genai
+API_KEY = os.getenv("GOOGLE_API_KEY")
+if not API_KEY:
+    st.error("Please set GOOGLE_API_KEY in your environment or .env file.")
+    st.stop()
+
+try:
+    configure_genai(API_KEY)
+except Exception as e:
+    st.error(f"Failed to configure Gemini SDK: {e}")
+    st.stop()
+
+# PROCESS button
+# Results live in session_state: a download click reruns the script, and the buttons must survive it
+upload_sig = tuple((f.name, f.size) for f in uploaded_files)
+if st.button("PROCESS"):
+    pdf_blobs = [f.getvalue() for f in uploaded_files]
+    results = [None] * len(pdf_blobs)
+    if len(pdf_blobs) == 1:
+        try:
+            results[0] = process_pdf(pdf_blobs[0])
+        except RuntimeError as e:
+            results[0] = e
+    else:
+        # Gemini calls are network-bound: run the PDFs concurrently, bounded by MAX_CONCURRENT_REQUESTS
+        with ThreadPoolExecutor(max_workers=min(MAX_CONCURRENT_REQUESTS, len(pdf_blobs))) as pool:
+            futures = {pool.submit(process_pdf, blob): i for i, blob in enumerate(pdf_blobs)}
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    results[i] = fut.result()
+                except Exception as e:
+                    results[i] = e
+    st.session_state["rfp_results"] = (upload_sig, [(f.name, r) for f, r in zip(uploaded_files, results)])
+
+saved = st.session_state.get("rfp_results")
+if saved and saved[0] == upload_sig:
+    results = saved[1]
+    if len(results) == 1:
+        _, result = results[0]
+        if not isinstance(result, bytes):
+            st.error(str(result))
+            st.stop()
+
+        # Show minimal success and download button only
+        st.success("JSON extraction complete. Click the button below to download the file.")
+        st.download_button(
+            "Download extracted JSON",
+            data=result,
+            file_name="extracted_rfp.json",
+            mime="application/json",
+            key="download_0"
+        )
+    else:
+        done = sum(1 for _, r in results if isinstance(r, bytes))
+        st.success(f"JSON extraction complete for {done}/{len(results)} PDFs. Click below to download.")
+        for i, (name, result) in enumerate(results):
+            if not isinstance(result, bytes):
+                st.error(f"{name}: {result}")
+                continue
+            stem = os.path.splitext(name)[0]
+            st.download_button(
+                f"Download {stem}.json",
+                data=result,
+                file_name=f"{stem}_extracted_rfp.json",
+                mime="application/json",
+                key=f"download_{i}_{stem}"
+            )
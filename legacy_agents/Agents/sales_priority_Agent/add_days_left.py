@@ -1,22 +1,24 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
-CSV_FILE = "rfp_summary.csv"
+from rfp_state import read_rfp_state, write_rfp_state, parse_deadlines
 
-df = pd.read_csv(CSV_FILE)
 
-# Parse submission deadline
-df["Submission_Deadline"] = pd.to_datetime(df["Submission_Deadline"], errors="coerce")
+def add_days_left(df, today=None):
+    # Parse submission deadline (no-op when the state already holds datetimes)
+    df["Submission_Deadline"] = parse_deadlines(df["Submission_Deadline"])
 
-# Today (date only)
-today = pd.Timestamp(datetime.now().date())
+    # Today (date only)
+    if today is None:
+        today = pd.Timestamp(datetime.now().date())
 
-# Compute days_left
-df["days_left"] = (df["Submission_Deadline"] - today).dt.days
+    # Compute days_left (missing deadlines → 0, negatives clamped to 0)
+    df["days_left"] = (df["Submission_Deadline"] - today).dt.days.fillna(0).clip(lower=0).astype(np.int64)
+    return df
 
-# Clamp negatives to 0
-df["days_left"] = df["days_left"].apply(lambda x: max(0, int(x)) if pd.notna(x) else 0)
 
-df.to_csv(CSV_FILE, index=False)
+if __name__ == "__main__":
+    write_rfp_state(add_days_left(read_rfp_state()))
 
-print("✔ days_left column added successfully")
+    print("✔ days_left column added successfully")
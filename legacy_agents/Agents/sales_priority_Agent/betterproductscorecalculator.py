@@ -1,12 +1,24 @@
+import numpy as np
 import pandas as pd
 import re
 import os
+from functools import lru_cache
+from sklearn.feature_extraction.text import CountVectorizer
+
+from rfp_state import RFP_STATE, read_rfp_state, write_rfp_state
 
 # ---------- similarity utils ----------
+_TOKEN_RE = re.compile(r"\w+")
+
+@lru_cache(maxsize=4096)
+def _tokens(text: str) -> frozenset:
+    # RFP product strings repeat heavily across rows; each distinct string is tokenized once
+    return frozenset(_TOKEN_RE.findall(text.lower()))
+
 def tokenize(text: str):
     if pd.isna(text):
-        return set()
-    return set(re.findall(r"\w+", str(text).lower()))
+        return frozenset()
+    return _tokens(str(text))
 
 def similarity(a: str, b: str) -> float:
     ta, tb = tokenize(a), tokenize(b)
@@ -24,6 +36,57 @@ def similarity_to_score(sim: float) -> float:
     else:
         return 0.0
 
+def similarity_to_scores(sims: np.ndarray) -> np.ndarray:
+    """Vectorized similarity_to_score."""
+    return np.select([sims >= 0.65, sims >= 0.40, sims >= 0.20], [1.0, 0.7, 0.4], default=0.0)
+
+# Below this many product×inventory pairs the plain set loop beats building the sparse matrices
+SPARSE_MIN_PAIRS = 20_000
+
+def _best_similarities_sets(products, inventory_names) -> np.ndarray:
+    """Set-intersection version of best_similarities for small inputs (token sets built once per inventory row)."""
+    inv_sets = [_tokens(x) for x in inventory_names]
+    inv_sizes = [len(s) for s in inv_sets]
+    best = np.zeros(len(products))
+    for k, p in enumerate(products):
+        pt = tokenize(p)
+        p_sz = len(pt)
+        if not p_sz:
+            continue
+        b = 0.0
+        for s, sz in zip(inv_sets, inv_sizes):
+            if not sz:
+                continue
+            inter = len(pt & s)
+            j = inter / (p_sz + sz - inter)
+            if j > b:
+                b = j
+        best[k] = b
+    return best
+
+def best_similarities(products, inventory_names) -> np.ndarray:
+    """Best token-Jaccard similarity of each product against the whole inventory, via sparse matrix ops."""
+    if not products or not inventory_names:
+        return np.zeros(len(products))
+    if len(products) * len(inventory_names) < SPARSE_MIN_PAIRS:
+        return _best_similarities_sets(products, inventory_names)
+
+    # Binary bag-of-words over tokenize()'s token sets; vocab covers both sides so set sizes are exact
+    vectorizer = CountVectorizer(analyzer=_tokens, binary=True)
+    try:
+        vectorizer.fit(inventory_names + products)
+    except ValueError:  # empty vocabulary: no text has a single token
+        return np.zeros(len(products))
+    P = vectorizer.transform(products)
+    I = vectorizer.transform(inventory_names)
+
+    inter = (P @ I.T).toarray()
+    p_sz = np.asarray(P.sum(axis=1))    # (n_products, 1)
+    i_sz = np.asarray(I.sum(axis=1)).T  # (1, n_inventory)
+    # Empty token sets score 0, as in similarity()
+    jaccard = np.divide(inter, p_sz + i_sz - inter, out=np.zeros(inter.shape), where=(p_sz > 0) & (i_sz > 0))
+    return jaccard.max(axis=1)
+
 # ---------- helpers ----------
 def split_products(cell: str):
     if pd.isna(cell):
@@ -37,43 +100,47 @@ def find_inventory_name_column(inv_df):
     return inv_df.columns[0]
 
 # ---------- main logic ----------
-def update_product_score(
-    rfp_csv="rfp_summary.csv",
-    inventory_csv="factory_inventory_master.csv",
-    output_csv=None,
-    products_col="Product_Names"
-):
-    rfp_df = pd.read_csv(rfp_csv, dtype=str)
-    inv_df = pd.read_csv(inventory_csv, dtype=str)
-
+def add_product_score(rfp_df, inv_df, products_col="Product_Names"):
+    """Add product_score (mean best-match score of each RFP's products against the inventory)."""
     inv_name_col = find_inventory_name_column(inv_df)
     inventory_names = inv_df[inv_name_col].fillna("").tolist()
 
-    product_scores = []
+    # Flatten all RFP products into one batch, remembering which RFP row each came from
+    cells = rfp_df[products_col] if products_col in rfp_df.columns else [""] * len(rfp_df)
+    product_lists = [split_products(cell) for cell in cells]
+    products = [p for plist in product_lists for p in plist]
+    row_idx = np.repeat(np.arange(len(product_lists)), [len(plist) for plist in product_lists])
+
+    scores = similarity_to_scores(best_similarities(products, inventory_names))
 
-    for _, row in rfp_df.iterrows():
-        products = split_products(row.get(products_col, ""))
+    # Mean score per RFP row (0.0 for rows without products)
+    counts = np.bincount(row_idx, minlength=len(rfp_df))
+    sums = np.bincount(row_idx, weights=scores, minlength=len(rfp_df))
+    final_scores = np.divide(sums, counts, out=np.zeros(len(rfp_df)), where=counts > 0)
 
-        scores = []
-        for p in products:
-            sims = [similarity(p, inv) for inv in inventory_names]
-            best_sim = max(sims) if sims else 0.0
-            scores.append(similarity_to_score(best_sim))
+    rfp_df["product_score"] = np.round(final_scores, 3)
+    return rfp_df
 
-        final_score = sum(scores) / len(scores) if scores else 0.0
-        product_scores.append(round(final_score, 3))
+def update_product_score(
+    rfp_state=RFP_STATE,
+    inventory_csv="factory_inventory_master.csv",
+    output_state=None,
+    products_col="Product_Names"
+):
+    rfp_df = read_rfp_state(rfp_state)
+    inv_df = pd.read_csv(inventory_csv, dtype=str)
 
-    rfp_df["product_score"] = product_scores
+    rfp_df = add_product_score(rfp_df, inv_df, products_col)
 
-    out_path = output_csv if output_csv else rfp_csv
-    rfp_df.to_csv(out_path, index=False)
+    out_path = output_state if output_state else rfp_state
+    write_rfp_state(rfp_df, out_path)
 
     # ✅ Clear confirmation message
-    print(f"✔ RFP CSV updated successfully: {out_path}")
+    print(f"✔ RFP state updated successfully: {out_path}")
 
 # ---------- usage ----------
 if __name__ == "__main__":
     update_product_score(
-        rfp_csv="rfp_summary.csv",
+        rfp_state=RFP_STATE,
         inventory_csv="factory_inventory_master (2).csv"
     )
@@ -1,63 +1,78 @@
 import json
-import csv
-import os
+import pandas as pd
+
+from rfp_state import RFP_STATE, read_rfp_state, write_rfp_state, parse_deadlines
 
 # -------- FILE PATHS --------
 input_json = "extracted_rfp.json"
-output_csv = "rfp_summary.csv"   # existing OR new CSV
 
-# -------- LOAD JSON --------
-with open(input_json, "r", encoding="utf-8") as f:
-    data = json.load(f)
+CSV_COLUMNS = [
+    "RFP_ID",
+    "Company_Name",
+    "Submission_Deadline",
+    "Product_Names"
+]
+
 
 # -------- EXTRACT FIELDS --------
-rfp_id = data.get("rfp_unique_id", "Not specified")
-
-company_name = (
-    data.get("sales_agent_output", {})
-        .get("summary", {})
-        .get("client_name", "Not specified")
-)
-
-submission_deadline = (
-    data.get("sales_agent_output", {})
-        .get("summary", {})
-        .get("submission_deadline", "Not specified")
-)
-
-line_items = (
-    data.get("sales_agent_output", {})
-        .get("line_items_extracted", [])
-)
-
-product_names = [
-    item.get("raw_description", "")
-    for item in line_items
-    if item.get("raw_description")
-]
+def append_rfp_row(data, rows_buffer):
+    """Extract one RFP's summary fields and buffer them as a CSV row."""
+    rfp_id = data.get("rfp_unique_id", "Not specified")
+
+    summary = data.get("sales_agent_output", {}).get("summary", {})
+    company_name = summary.get("client_name", "Not specified")
+    submission_deadline = summary.get("submission_deadline", "Not specified")
+
+    line_items = (
+        data.get("sales_agent_output", {})
+            .get("line_items_extracted", [])
+    )
+
+    product_names = [
+        item.get("raw_description", "")
+        for item in line_items
+        if item.get("raw_description")
+    ]
+
+    rows_buffer.append({
+        "RFP_ID": rfp_id,
+        "Company_Name": company_name,
+        "Submission_Deadline": submission_deadline,
+        "Product_Names": ", ".join(product_names)
+    })
+
+
+# -------- LOAD JSON (ONE RFP OR A LIST OF RFPS) --------
+def load_rfp_rows(input_json):
+    with open(input_json, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    rows_buffer = []
+    for record in (data if isinstance(data, list) else [data]):
+        append_rfp_row(record, rows_buffer)
+    return rows_buffer
+
+
+def json_to_df(input_json, existing=None):
+    """
+    RFP rows as a DataFrame (CSV_COLUMNS): rows already in the existing state
+    (raw or normalized column names) followed by the rows from input_json.
+    """
+    frames = []
+    if existing is not None:
+        existing = existing.copy()
+        existing.columns = [c.strip() for c in existing.columns]
+        restore = {c.lower(): c for c in CSV_COLUMNS}
+        existing = existing.rename(columns=lambda c: restore.get(c.lower(), c))
+        frames.append(existing.reindex(columns=CSV_COLUMNS))
+    frames.append(pd.DataFrame(load_rfp_rows(input_json), columns=CSV_COLUMNS))
+    df = pd.concat(frames, ignore_index=True)
+
+    # Typed from here on: later steps (and the Parquet state) keep the datetime
+    df["Submission_Deadline"] = parse_deadlines(df["Submission_Deadline"])
+    return df
+
 
-product_names_str = ", ".join(product_names)
-
-# -------- CHECK IF CSV EXISTS --------
-file_exists = os.path.isfile(output_csv)
-
-# -------- WRITE / APPEND CSV --------
-with open(output_csv, "a", newline="", encoding="utf-8") as f:
-    writer = csv.writer(f)
-
-    # Write header ONLY if file does not exist
-    if not file_exists:
-        writer.writerow([
-            "RFP_ID",
-            "Company_Name",
-            "Submission_Deadline",
-            "Product_Names"
-        ])
-
-    # Append current RFP row
-    writer.writerow([
-        rfp_id,
-        company_name,
-        submission_deadline,
-        product_names_str
-    ])
+if __name__ == "__main__":
+    write_rfp_state(json_to_df(input_json, existing=read_rfp_state()))
+    print(f"✔ RFP state updated successfully: {RFP_STATE}")
@@ -1,12 +1,16 @@
-import pandas as pd
+from rfp_state import read_rfp_state, write_rfp_state, export_rfp_csv
 
-CSV_FILE = "rfp_summary.csv"
 
-df = pd.read_csv(CSV_FILE)
+def normalize_columns(df):
+    # Normalize column names
+    df.columns = [c.strip().lower() for c in df.columns]
+    return df
 
-# Normalize column names
-df.columns = [c.strip().lower() for c in df.columns]
 
-df.to_csv(CSV_FILE, index=False)
+if __name__ == "__main__":
+    df = normalize_columns(read_rfp_state())
 
-print("✔ Column names normalized successfully")
+    write_rfp_state(df)
+    export_rfp_csv(df)
+
+    print("✔ Column names normalized successfully")
@@ -1,86 +1,77 @@
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
-import heapq
+import joblib
+
+from rfp_state import read_rfp_state
 
 # ============================================================
-# 1. TRAINING PHASE – MODEL TO PREDICT P(WIN)
+# 1. MODEL TO PREDICT P(WIN) (TRAINED BY train_win_model.py)
 # ============================================================
 
-# Historical training data
-# Must contain: rfp_id, product_score, relationship_score, won_flag
-train_df = pd.read_csv("rfp_win_history.csv")
+MODEL_PATH = "win_model.joblib"
 
 feature_cols = ["product_score", "relationship_score"]
 
-X = train_df[feature_cols]
-y = train_df["won_flag"]
-
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
-
-win_model = RandomForestClassifier(
-    n_estimators=200,
-    random_state=42
-)
-
-win_model.fit(X_train, y_train)
-
-# ============================================================
-# 2. INFERENCE PHASE – CURRENT RFPS (YOUR CSV)
-# ============================================================
 
-# Must contain:
-# rfp_id, product_score, relationship_score, days_left
-rfps = pd.read_csv("rfp_summary.csv")
+def load_win_model(model_path=MODEL_PATH, history_csv="rfp_win_history.csv"):
+    try:
+        return joblib.load(model_path)
+    except Exception as e:
+        # No usable saved model: train once on the full history (same recipe as train_win_model.py) and save it
+        print(f"⚠ Could not load {model_path} ({e}). Training a new model...")
+        # Must contain: rfp_id, product_score, relationship_score, won_flag
+        train_df = pd.read_csv(history_csv)
+        win_model = RandomForestClassifier(n_estimators=200, random_state=42, n_jobs=-1)
+        win_model.fit(train_df[feature_cols], train_df["won_flag"])
+        joblib.dump(win_model, model_path)
+        return win_model
 
-X_new = rfps[feature_cols]
-rfps["p_win"] = win_model.predict_proba(X_new)[:, 1]
 
 # ============================================================
-# 3. URGENCY FUNCTION
+# 2. PRIORITY SCORE = P(WIN) × (1 + GAMMA × URGENCY)
 # ============================================================
 
 D_MAX = 90
+GAMMA = 0.5
 
-def urgency_score(days_left, d_max=D_MAX):
-    d = max(0, min(days_left, d_max))
-    return 1.0 - (d / d_max)
 
-# ============================================================
-# 4. FINAL PRIORITY SCORE
-# ============================================================
-
-def compute_priority(row, gamma=0.5):
-    urg = urgency_score(row["days_left"])
-    return row["p_win"] * (1.0 + gamma * urg)
+def build_priority_queue(rfps, win_model):
+    """
+    rfps must contain: rfp_id, product_score, relationship_score, days_left
+    Returns rfp_ids ordered by PriorityScore, highest first.
+    """
+    # Inference – P(win) per RFP
+    X_new = rfps[feature_cols]
+    rfps["p_win"] = win_model.predict_proba(X_new)[:, 1]
 
-rfps["PriorityScore"] = rfps.apply(compute_priority, axis=1)
+    # urgency = 1 - clip(days_left, 0, D_MAX) / D_MAX  (missing days_left counts as due today)
+    days = np.clip(rfps["days_left"].fillna(0).to_numpy(dtype=float), 0, D_MAX)
+    urgency = 1.0 - days / D_MAX
 
-# ============================================================
-# 5. BUILD PRIORITY QUEUE (MAX-HEAP)
-# ============================================================
+    # Final priority score
+    rfps["PriorityScore"] = rfps["p_win"].to_numpy() * (1.0 + GAMMA * urgency)
 
-pq = []
+    # Priority queue (sorted, highest score first).
+    # Ties are broken by rfp_id, as the previous (-score, rfp_id) max-heap did
+    return rfps.sort_values(
+        ["PriorityScore", "rfp_id"], ascending=[False, True], kind="stable"
+    )["rfp_id"].to_numpy()
 
-for _, row in rfps.iterrows():
-    heapq.heappush(
-        pq,
-        (-row["PriorityScore"], row["rfp_id"])
-    )
 
 # ============================================================
-# 6. WRITE QUEUE TO TXT FILE
+# 3. WRITE QUEUE TO TXT FILE
 # ============================================================
 
-output_txt = "rfp_priority_queue.txt"
+def write_priority_queue(ranked, output_txt="rfp_priority_queue.txt"):
+    with open(output_txt, "w", encoding="utf-8") as f:
+        f.write("".join(f"{rank}. {rfp_id}\n" for rank, rfp_id in enumerate(ranked, start=1)))
+
+    print(f"✔ Priority queue written successfully to: {output_txt}")
 
-with open(output_txt, "w", encoding="utf-8") as f:
-    rank = 1
-    while pq:
-        neg_score, rfp_id = heapq.heappop(pq)
-        f.write(f"{rank}. {rfp_id}\n")
-        rank += 1
 
-print(f"✔ Priority queue written successfully to: {output_txt}")
+if __name__ == "__main__":
+    # Must contain:
+    # rfp_id, product_score, relationship_score, days_left
+    rfps = read_rfp_state()
+    write_priority_queue(build_priority_queue(rfps, load_win_model()))
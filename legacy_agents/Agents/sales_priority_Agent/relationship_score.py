@@ -1,4 +1,4 @@
-import pandas as pd
+from rfp_state import RFP_STATE, read_rfp_state, write_rfp_state
 
 # ============================================================
 # COMPANY → RELATIONSHIP SCORE MAP
@@ -19,10 +19,9 @@ company_relationship_scores = {
 # FUNCTION
 # ============================================================
 
-def update_relationship_score(
-    rfp_csv="rfp_summary.csv",
+def add_relationship_score(
+    df,
     company_score_map=None,
-    output_csv=None,
     company_col="Company_Name",
     default_score=0.7
 ):
@@ -34,22 +33,33 @@ def update_relationship_score(
         k.strip().lower(): v for k, v in company_score_map.items()
     }
 
-    # Load CSV
-    df = pd.read_csv(rfp_csv, dtype=str)
-
-    relationship_scores = []
+    # Add / update column (unknown or missing companies get default_score)
+    if company_col in df.columns:
+        df["relationship_score"] = (
+            df[company_col].astype(str).str.strip().str.lower()
+            .map(company_score_map)
+            .fillna(default_score)
+            .astype(float)
+        )
+    else:
+        df["relationship_score"] = float(default_score)
+    return df
 
-    for _, row in df.iterrows():
-        company = str(row.get(company_col, "")).strip().lower()
-        score = company_score_map.get(company, default_score)
-        relationship_scores.append(float(score))
+def update_relationship_score(
+    rfp_state=RFP_STATE,
+    company_score_map=None,
+    output_state=None,
+    company_col="Company_Name",
+    default_score=0.7
+):
+    # Load state
+    df = read_rfp_state(rfp_state)
 
-    # Add / update column
-    df["relationship_score"] = relationship_scores
+    df = add_relationship_score(df, company_score_map, company_col, default_score)
 
     # Save
-    out_path = output_csv if output_csv else rfp_csv
-    df.to_csv(out_path, index=False)
+    out_path = output_state if output_state else rfp_state
+    write_rfp_state(df, out_path)
 
     print(f"✔ Relationship scores updated successfully: {out_path}")
 
@@ -57,9 +67,8 @@ def update_relationship_score(
 # AUTO-RUN
 # ============================================================
 
-update_relationship_score(
-    rfp_csv="rfp_summary.csv",
-    company_score_map=company_relationship_scores
-)
-
-
+if __name__ == "__main__":
+    update_relationship_score(
+        rfp_state=RFP_STATE,
+        company_score_map=company_relationship_scores
+    )
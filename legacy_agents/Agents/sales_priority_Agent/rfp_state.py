@@ -0,0 +1,48 @@
+import os
+import importlib.util
+import pandas as pd
+
+# ============================================================
+# RFP SUMMARY STATE (SHARED BY ALL PIPELINE STEPS)
+# ============================================================
+
+# Typed inter-stage state (Parquet keeps dtypes, e.g. Submission_Deadline as datetime64)
+RFP_STATE = "rfp_summary.parquet"
+
+# Human-readable export, written once at the end of the pipeline
+RFP_CSV = "rfp_summary.csv"
+
+# Parquet needs pyarrow (or fastparquet); without it the state falls back to the CSV
+PARQUET_AVAILABLE = any(
+    importlib.util.find_spec(engine) is not None for engine in ("pyarrow", "fastparquet")
+)
+
+
+def read_rfp_state(state_path=RFP_STATE, csv_path=RFP_CSV):
+    """Load the RFP summary state, or None if there is none yet."""
+    if PARQUET_AVAILABLE and os.path.exists(state_path):
+        return pd.read_parquet(state_path)
+    if os.path.exists(csv_path):
+        return pd.read_csv(csv_path)
+    return None
+
+
+def write_rfp_state(df, state_path=RFP_STATE, csv_path=RFP_CSV):
+    if PARQUET_AVAILABLE:
+        df.to_parquet(state_path, compression="zstd", index=False)
+    else:
+        df.to_csv(csv_path, index=False)
+
+
+def export_rfp_csv(df, csv_path=RFP_CSV):
+    df.to_csv(csv_path, index=False)
+
+
+def parse_deadlines(raw):
+    """Submission deadlines → datetime64 (unparseable → NaT). Already-parsed columns pass through."""
+    parsed = pd.to_datetime(raw, errors="coerce")
+    # Rows kept from earlier runs can use another format than new ones; parse those individually
+    retry = parsed.isna() & raw.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(raw[retry].astype(str), errors="coerce", format="mixed")
+    return parsed
@@ -11,66 +11,83 @@
 # 6) predict_and_queue.py   (ML inference only)
 
 # Model training is done separately (manual)
+#
+# Each step is a function over one in-memory DataFrame; the typed state
+# (rfp_summary.parquet) is read once at the start and written once at the end,
+# together with rfp_summary.csv for human inspection.
 # ============================================================
 
+import pandas as pd
+
+from rfp_state import read_rfp_state, write_rfp_state, export_rfp_csv
+from json_in_csv import json_to_df
+from betterproductscorecalculator import add_product_score
+from relationship_score import add_relationship_score, company_relationship_scores
+from add_days_left import add_days_left
+from normalize_columns import normalize_columns
+from predict_and_queue import load_win_model, build_priority_queue, write_priority_queue
+
+RFP_JSON = "extracted_rfp.json"
+INVENTORY_CSV = "factory_inventory_master (2).csv"
+
+
 print("\n[PIPELINE STARTED] Sales → Pricing Agent (Prediction Only)\n")
 
 # ============================================================
-# STEP 1: JSON → CSV
+# STEP 1: JSON → DATAFRAME
 # ============================================================
 
-print("[1/6] Converting RFP JSON to CSV...")
-exec(open("json_in_csv.py", encoding="utf-8").read())
-
-# Output:
-# → rfp_summary.csv
+print("[1/6] Loading RFP JSON (plus RFPs already in the summary)...")
+df = json_to_df(RFP_JSON, existing=read_rfp_state())
 
 # ============================================================
 # STEP 2: PRODUCT SCORE CALCULATION
 # ============================================================
 
 print("\n[2/6] Calculating product scores...")
-exec(open("betterproductscorecalculator.py", encoding="utf-8").read())
+df = add_product_score(df, pd.read_csv(INVENTORY_CSV, dtype=str))
 
 # Output:
-# → rfp_summary.csv (product_score added)
+# → product_score added
 
 # ============================================================
 # STEP 3: RELATIONSHIP SCORE
 # ============================================================
 
 print("\n[3/6] Adding relationship scores...")
-exec(open("relationship_score.py", encoding="utf-8").read())
+df = add_relationship_score(df, company_relationship_scores)
 
 # Output:
-# → rfp_summary.csv (relationship_score added)
+# → relationship_score added
 
 # ============================================================
 # STEP 4: DAYS LEFT (URGENCY)
 # ============================================================
 
 print("\n[4/6] Computing days_left from submission deadlines...")
-exec(open("add_days_left.py", encoding="utf-8").read())
+df = add_days_left(df)
 
 # Output:
-# → rfp_summary.csv (days_left added)
+# → days_left added
 
 # ============================================================
 # STEP 5: NORMALIZE COLUMN NAMES
 # ============================================================
 
 print("\n[5/6] Normalizing column names...")
-exec(open("normalize_columns.py", encoding="utf-8").read())
+df = normalize_columns(df)
+write_rfp_state(df)
+export_rfp_csv(df)
 
 # Output:
-# → rfp_summary.csv (lowercase, safe schema)
+# → rfp_summary.parquet + rfp_summary.csv (lowercase, safe schema)
 
 # ============================================================
 # STEP 6: ML PREDICTION + PRIORITY QUEUE
 # ============================================================
 
 print("\n[6/6] Running ML prediction and building priority queue...")
-exec(open("predict_and_queue.py", encoding="utf-8").read())
+write_priority_queue(build_priority_queue(df, load_win_model()))
 
 # Output:
 # → rfp_priority_queue.txt
@@ -10,7 +10,7 @@ X = df[["product_score", "relationship_score"]]
 y = df["won_flag"]
 
 # Train model
-model = RandomForestClassifier(n_estimators=200, random_state=42)
+model = RandomForestClassifier(n_estimators=200, random_state=42, n_jobs=-1)
 model.fit(X, y)
 
 # Save model
@@ -0,0 +1,48 @@
+import json
+
+# ============================================================
+# SHARED INPUT LOADERS (RFP + PRODUCT MASTER)
+# ============================================================
+
+RFP_FILE = "rfp.json"
+PRODUCT_MASTER_FILE = "product_master_enriched.json"
+
+def load_rfp_items(path=RFP_FILE):
+    """RFP line items, in RFP order."""
+    with open(path, "r", encoding="utf-8") as f:
+        rfp_data = json.load(f)
+    return rfp_data["sales_agent_output"]["line_items_extracted"]
+
+def rfp_specs_by_lot(rfp_items):
+    """lot_id -> technical_attributes."""
+    return {item["lot_id"]: item["technical_attributes"] for item in rfp_items}
+
+def load_inventory(path=PRODUCT_MASTER_FILE):
+    """Product master as a list of SKUs (accepts a bare list or a {products|items|data: [...]} wrapper)."""
+    with open(path, "r", encoding="utf-8") as f:
+        inventory_data = json.load(f)
+
+    if isinstance(inventory_data, list):
+        return inventory_data
+    if isinstance(inventory_data, dict):
+        return (
+            inventory_data.get("products")
+            or inventory_data.get("items")
+            or inventory_data.get("data")
+            or list(inventory_data.values())
+        )
+    return []
+
+def load_inventory_tables(path=PRODUCT_MASTER_FILE):
+    """
+    Flat product_id lookups, built in one pass:
+    - "specs": product_id -> technical_specs
+    - "name":  product_id -> product_name
+    """
+    specs, names = {}, {}
+    for sku in load_inventory(path):
+        if isinstance(sku, dict) and "product_id" in sku:
+            pid = sku["product_id"]
+            specs[pid] = sku.get("technical_specs", {})
+            names[pid] = sku.get("product_name")
+    return {"specs": specs, "name": names}
@@ -0,0 +1,92 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+
+# ============================================================
+# SHARED NORMALIZATION HELPERS (CACHED PER PROCESS)
+# ============================================================
+
+# The same spec / standard strings repeat across every RFP × SKU pair,
+# so each distinct value is normalized once. typed=True keeps 3 and 3.0 apart.
+
+MATERIAL_MAP = {
+    "aluminum": "aluminium",
+    "aluminium": "aluminium",
+    "al": "aluminium",
+    "copper": "copper",
+    "cu": "copper"
+}
+
+@lru_cache(maxsize=4096, typed=True)
+def _normalize(v):
+    return str(v).strip().lower()
+
+def normalize(v):
+    if v is None:
+        return None
+    try:
+        return _normalize(v)
+    except TypeError:  # unhashable value (e.g. a list)
+        return str(v).strip().lower()
+
+@lru_cache(maxsize=4096, typed=True)
+def _normalize_material(v):
+    n = normalize(v)
+    return MATERIAL_MAP.get(n, n)
+
+def normalize_material(v):
+    try:
+        return _normalize_material(v)
+    except TypeError:
+        n = normalize(v)
+        return MATERIAL_MAP.get(n, n)
+
+def is_not_specified(v):
+    return v is None or v == "NOT SPECIFIED"
+
+_RE_PAREN = re.compile(r"\(.*?\)")
+_RE_YEAR = re.compile(r":\d{4}")
+_RE_WS = re.compile(r"\s+")
+
+@lru_cache(maxsize=4096)
+def normalize_standard(s):
+    if not s:
+        return None
+
+    s = normalize(s)
+
+    # remove year info and brackets
+    s = _RE_PAREN.sub("", s)
+    s = _RE_YEAR.sub("", s)
+
+    # normalize part notation
+    s = s.replace("part-", "part ")
+    s = s.replace("part i", "part 1")
+
+    s = _RE_WS.sub(" ", s).strip()
+    return s
+
+# Column versions for the vectorized scorers (pandas Series in)
+
+def normalize_series(values):
+    # normalize() over a column: str → strip → lower, None stays None
+    return values.astype(str).str.strip().str.lower().where(values.notna(), None)
+
+def not_specified_mask(values):
+    # is_not_specified() over a column, as a NumPy bool array
+    return (values.isna() | (values == "NOT SPECIFIED")).to_numpy()
+
+# Python round() per element: np.round scales by 10**k first and flips
+# half-way values (400 vs 185 mm² must give 0.463, not 0.462)
+_round = np.frompyfunc(round, 2, 1)
+
+def round_scores(values, ndigits):
+    return _round(values, ndigits).astype(float)
+
+def cross_section_closeness(rfp_val, sku_val):
+    # max(0, round(1 - |sku - rfp| / rfp, 3)) over arrays; unparseable values / zero RFP size → 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        closeness = 1.0 - np.abs(sku_val - rfp_val) / rfp_val
+    closeness = round_scores(np.where(np.isfinite(closeness), closeness, 0.0), 3)
+    return np.where(closeness > 0, closeness, 0.0)
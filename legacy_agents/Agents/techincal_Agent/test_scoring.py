@@ -0,0 +1,36 @@
+import itertools
+
+import numpy as np
+
+from _norm import round_scores, cross_section_closeness
+
+# Standard conductor sizes (mm²)
+SIZES = [1.5, 2.5, 4, 6, 10, 16, 25, 35, 50, 70, 95, 120, 150, 185, 240, 300, 400, 500, 630, 800, 1000]
+
+def scalar_cross_section(rfp_val, inv_val):
+    # Original per-pair scorer (top3_sku_matcher / top1_technical_breakdown_csv)
+    score = 1.0 - abs(float(inv_val) - float(rfp_val)) / float(rfp_val)
+    return max(0.0, round(score, 3))
+
+def test_cross_section_closeness_matches_scalar_scorer():
+    rfp = np.array(SIZES, dtype=float)[:, None]
+    inv = np.array(SIZES, dtype=float)[None, :]
+    grid = cross_section_closeness(rfp, inv)
+    for (i, r), (j, s) in itertools.product(enumerate(SIZES), repeat=2):
+        assert grid[i, j] == scalar_cross_section(r, s), (r, s)
+
+def test_cross_section_closeness_half_way_values():
+    assert cross_section_closeness(np.array([400.0]), np.array([185.0]))[0] == 0.463
+    assert cross_section_closeness(np.array([800.0]), np.array([630.0]))[0] == 0.787
+
+def test_cross_section_closeness_invalid_values():
+    rfp = np.array([0.0, np.nan, 185.0])
+    inv = np.array([185.0, 185.0, np.nan])
+    assert cross_section_closeness(rfp, inv).tolist() == [0.0, 0.0, 0.0]
+
+def test_round_scores_matches_python_round():
+    # Half-way values around both score scales (percentages at 2 dp, closeness at 3 dp)
+    percentages = [i / 1000 for i in range(0, 100001, 5)]
+    closeness = [i / 10000 for i in range(0, 10001, 5)]
+    assert round_scores(np.array(percentages), 2).tolist() == [round(v, 2) for v in percentages]
+    assert round_scores(np.array(closeness), 3).tolist() == [round(v, 3) for v in closeness]
@@ -1,6 +1,14 @@
 import pandas as pd
 import json
 
+# optional fast JSON backend (falls back to stdlib json)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from _loaders import load_inventory_tables
+
 # ============================================================
 # LOAD INPUT FILES
 # ============================================================
@@ -11,28 +19,25 @@ COMPETITORS_FILE = "competitors.json"
 
 df = pd.read_csv(CSV_FILE)
 
-with open(PRODUCT_MASTER_FILE, "r", encoding="utf-8") as f:
-    product_master = json.load(f)
+# Sorted once; groupby below keeps this order instead of re-sorting
+df = df.sort_values(["lot_id", "sku_id"], kind="stable")
 
 with open(COMPETITORS_FILE, "r", encoding="utf-8") as f:
     competitors_data = json.load(f)
 
-# Normalize product master
-inventory_map = {
-    p["product_id"]: p
-    for p in product_master
-    if isinstance(p, dict) and "product_id" in p
-}
+# product_id -> product_name
+sku_names = load_inventory_tables(PRODUCT_MASTER_FILE)["name"]
 
 # ============================================================
 # LIGHTWEIGHT COMPETITOR LOOKUP
 # ============================================================
 
-def find_competitors_for_sku(sku_id):
-    result = []
+def find_competitors_for_skus(sku_ids):
+    """sku_id -> colliding competitors, in competitors.json order (one pass)."""
+    result = {sku_id: [] for sku_id in sku_ids}
     for comp in competitors_data:
-        if sku_id in comp.get("colliding_internal_skus", []):
-            result.append({
+        for sku_id in result.keys() & set(comp.get("colliding_internal_skus", [])):
+            result[sku_id].append({
                 "competitor_id": comp.get("competitor_id"),
                 "name": comp.get("name")
             })
@@ -42,29 +47,35 @@ def find_competitors_for_sku(sku_id):
 # BUILD FINAL JSON STRUCTURE
 # ============================================================
 
+SPEC_COLS = ["spec_name", "rfp_value", "sku_value", "spec_score"]
+
 final_output = []
 
-for (lot_id, sku_id), group in df.groupby(["lot_id", "sku_id"]):
+# One row per (lot, SKU), each spec column collected into a list
+grouped = df.groupby(["lot_id", "sku_id"], sort=False, observed=True)[SPEC_COLS].agg(list)
+
+competitors_map = find_competitors_for_skus(df["sku_id"].unique().tolist())
 
-    product = inventory_map.get(sku_id, {})
+for (lot_id, sku_id), names, rfp_values, sku_values, scores in grouped.itertuples(name=None):
 
-    specs = []
-    for _, row in group.iterrows():
-        specs.append({
-            "spec_name": row["spec_name"],
-            "rfp_value": row["rfp_value"],
-            "sku_value": row["sku_value"],
-            "spec_score": float(row["spec_score"])
-        })
+    specs = [
+        {
+            "spec_name": spec_name,
+            "rfp_value": rfp_value,
+            "sku_value": sku_value,
+            "spec_score": float(spec_score)
+        }
+        for spec_name, rfp_value, sku_value, spec_score in zip(names, rfp_values, sku_values, scores)
+    ]
 
     final_output.append({
         "lot_id": lot_id,
         "selected_sku": {
             "sku_id": sku_id,
-            "sku_name": product.get("product_name"),
+            "sku_name": sku_names.get(sku_id),
             "technical_breakdown": specs
         },
-        "competitors": find_competitors_for_sku(sku_id)
+        "competitors": competitors_map.get(sku_id, [])
     })
 
 # ============================================================
@@ -73,7 +84,12 @@ for (lot_id, sku_id), group in df.groupby(["lot_id", "sku_id"]):
 
 OUTPUT_FILE = "rfp_top1_with_competitors.json"
 
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    json.dump(final_output, f, indent=2)
+if orjson:
+    # One bytes payload, written as-is (no str -> UTF-8 encode pass)
+    with open(OUTPUT_FILE, "wb") as f:
+        f.write(orjson.dumps(final_output, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+else:
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        json.dump(final_output, f, indent=2)
 
 print(f"✔ Lightweight JSON generated successfully: {OUTPUT_FILE}")
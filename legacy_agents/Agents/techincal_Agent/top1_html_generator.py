@@ -1,21 +1,39 @@
 import pandas as pd
 
+# Optional Arrow CSV reader (multithreaded, no per-cell type guessing)
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
 # ============================================================
 # LOAD CSV
 # ============================================================
 
-df = pd.read_csv("rfp_top1_sku_technical_breakdown.csv")
+BREAKDOWN_DTYPES = {
+    "lot_id": str,
+    "sku_id": str,
+    "spec_name": str,
+    "rfp_value": str,
+    "sku_value": str,
+    "spec_score": "float64",
+}
+
+df = pd.read_csv("rfp_top1_sku_technical_breakdown.csv", engine=CSV_ENGINE, dtype=BREAKDOWN_DTYPES)
+
+# Low-cardinality keys: group/sort on category codes instead of hashing strings
+for c in ("lot_id", "sku_id", "spec_name"):
+    df[c] = df[c].astype("category")
 
 # Sort properly
-df = df.sort_values(by=["lot_id", "sku_id"])
+df = df.sort_values(by=["lot_id", "sku_id"], kind="stable")
 
 # ============================================================
 # BUILD CUSTOM HTML (GROUPED BY LOT)
 # ============================================================
 
-html_parts = []
-
-html_parts.append("""
+HTML_HEAD = """
 <html>
 <head>
 <style>
@@ -66,12 +84,9 @@ td {
 <h2 style="text-align:center;">
 Technical Compliance Breakdown (Top SKU per RFP Product)
 </h2>
-""")
+"""
 
-# Group by lot
-for (lot_id, sku_id), group in df.groupby(["lot_id", "sku_id"]):
-
-    html_parts.append(f"""
+GROUP_HEADER_HTML = """
     <div class="lot-header">
         RFP Lot: {lot_id} &nbsp; | &nbsp; Selected SKU: {sku_id}
     </div>
@@ -83,32 +98,42 @@ for (lot_id, sku_id), group in df.groupby(["lot_id", "sku_id"]):
             <th>SKU Specification</th>
             <th>Score</th>
         </tr>
-    """)
+    """
 
-    for _, row in group.iterrows():
-        html_parts.append(f"""
+SPEC_ROW_HTML = """
         <tr class="spec-row">
-            <td>{row['spec_name']}</td>
-            <td>{row['rfp_value']}</td>
-            <td>{row['sku_value']}</td>
-            <td class="score">{row['spec_score']:.2f}</td>
+            <td>{}</td>
+            <td>{}</td>
+            <td>{}</td>
+            <td class="score">{:.2f}</td>
         </tr>
-        """)
-
-    html_parts.append("</table>")
+        """
 
-html_parts.append("""
+HTML_TAIL = """
 </body>
 </html>
-""")
+"""
+
+SPEC_COLS = ["spec_name", "rfp_value", "sku_value", "spec_score"]
+
+def render_group(lot_id, sku_id, spec_rows):
+    return (
+        GROUP_HEADER_HTML.format(lot_id=lot_id, sku_id=sku_id)
+        + "".join([SPEC_ROW_HTML.format(*row) for row in spec_rows])
+        + "</table>"
+    )
 
 # ============================================================
-# SAVE HTML
+# SAVE HTML (STREAMED: ONE BUFFERED WRITE PER LOT)
 # ============================================================
 
 output_file = "rfp_technical_breakdown_grouped.html"
-with open(output_file, "w", encoding="utf-8") as f:
-    f.write("".join(html_parts))
+with open(output_file, "w", encoding="utf-8", buffering=1 << 20) as f:
+    f.write(HTML_HEAD)
+    # Group by lot (df is already sorted, so first-seen order == sorted order)
+    for (lot_id, sku_id), group in df.groupby(["lot_id", "sku_id"], observed=True, sort=False):
+        f.write(render_group(lot_id, sku_id, group[SPEC_COLS].to_numpy()))
+    f.write(HTML_TAIL)
 
 print(f"✔ Improved readable HTML generated: {output_file}")
 
@@ -1,6 +1,9 @@
-import json
+import csv
+import numpy as np
 import pandas as pd
-import re
+
+from _loaders import load_rfp_items, rfp_specs_by_lot, load_inventory_tables
+from _norm import MATERIAL_MAP, normalize_standard, normalize_series, not_specified_mask, cross_section_closeness
 
 # ============================================================
 # LOAD INPUTS
@@ -11,110 +14,16 @@ rfp_df = pd.read_csv("rfp_top3_oem_matches.csv")
 # 🔒 KEEP ONLY TOP-1 SKU PER RFP PRODUCT
 rfp_df = rfp_df[rfp_df["rank"] == 1]
 
-with open("rfp.json", "r", encoding="utf-8") as f:
-    rfp_data = json.load(f)
-
-with open("product_master_enriched.json", "r", encoding="utf-8") as f:
-    inventory_data = json.load(f)
-
-# inventory normalization
-if isinstance(inventory_data, list):
-    inventory = inventory_data
-else:
-    inventory = (
-        inventory_data.get("products")
-        or inventory_data.get("items")
-        or inventory_data.get("data")
-        or list(inventory_data.values())
-    )
-
-inventory_map = {
-    sku["product_id"]: sku
-    for sku in inventory
-    if isinstance(sku, dict) and "product_id" in sku
-}
-
-rfp_items = {
-    item["lot_id"]: item["technical_attributes"]
-    for item in rfp_data["sales_agent_output"]["line_items_extracted"]
-}
-
-# ============================================================
-# NORMALIZATION HELPERS
-# ============================================================
+sku_specs_map = load_inventory_tables()["specs"]
 
-MATERIAL_MAP = {
-    "aluminum": "aluminium",
-    "aluminium": "aluminium",
-    "al": "aluminium",
-    "copper": "copper",
-    "cu": "copper"
-}
-
-def normalize(v):
-    if v is None:
-        return None
-    return str(v).strip().lower()
-
-def normalize_material(v):
-    return MATERIAL_MAP.get(normalize(v), normalize(v))
-
-def is_not_specified(v):
-    return v is None or v == "NOT SPECIFIED"
-
-def normalize_standard(s):
-    if not s:
-        return None
-    s = normalize(s)
-    s = re.sub(r"\(.*?\)", "", s)
-    s = re.sub(r":\d{4}", "", s)
-    s = s.replace("part-", "part ")
-    s = s.replace("part i", "part 1")
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+rfp_items = rfp_specs_by_lot(load_rfp_items())
 
 # ============================================================
 # PER-SPEC SCORING (FINAL LOGIC)
 # ============================================================
 
-def score_value(rfp, sku):
-    if is_not_specified(rfp):
-        return 1.0
-    return 1.0 if normalize(rfp) == normalize(sku) else 0.0
-
-def score_material(rfp, sku):
-    if is_not_specified(rfp):
-        return 1.0
-    return 1.0 if normalize_material(rfp) == normalize_material(sku) else 0.0
-
-def score_cross_section(rfp, sku):
-    if is_not_specified(rfp):
-        return 1.0
-    try:
-        return max(
-            0.0,
-            round(1 - abs(float(sku) - float(rfp)) / float(rfp), 3)
-        )
-    except:
-        return 0.0
-
-def score_armoured(rfp_sheath, sku_specs):
-    # 🔥 HARD FIX
-    if is_not_specified(rfp_sheath):
-        return 1.0
-
-    if normalize(rfp_sheath) == "armoured":
-        return 1.0 if sku_specs.get("armour_type") else 0.0
-
-    return 0.0
-
-def score_standards(rfp_list, sku_list):
-    if not rfp_list:
-        return 1.0
-
-    rfp_norm = [normalize_standard(s) for s in rfp_list]
-    sku_norm = set(normalize_standard(s) for s in (sku_list or []))
-
+def score_standards(rfp_norm, sku_norm):
+    # rfp_norm: tuple of normalized RFP standards, sku_norm: frozenset of the SKU's
     total = len(rfp_norm)
     if total == 0:
         return 1.0
@@ -130,105 +39,110 @@ def score_standards(rfp_list, sku_list):
 
     return round(score, 3)
 
+# ============================================================
+# VECTORIZED SCORING (ONE SPEC COLUMN AT A TIME)
+# ============================================================
+
+def score_value_column(rfp_values, sku_values):
+    equal = (normalize_series(rfp_values) == normalize_series(sku_values)).to_numpy()
+    return np.where(not_specified_mask(rfp_values), 1.0, equal.astype(float))
+
+def score_material_column(rfp_values, sku_values):
+    rfp_mat = normalize_series(rfp_values)
+    sku_mat = normalize_series(sku_values)
+    rfp_mat = rfp_mat.map(MATERIAL_MAP).fillna(rfp_mat)
+    sku_mat = sku_mat.map(MATERIAL_MAP).fillna(sku_mat)
+    equal = (rfp_mat == sku_mat).to_numpy()
+    return np.where(not_specified_mask(rfp_values), 1.0, equal.astype(float))
+
+def score_cross_section_column(rfp_values, sku_values):
+    r = pd.to_numeric(rfp_values, errors="coerce").to_numpy(dtype=float)
+    s = pd.to_numeric(sku_values, errors="coerce").to_numpy(dtype=float)
+    return np.where(not_specified_mask(rfp_values), 1.0, cross_section_closeness(r, s))
+
+def score_armoured_column(rfp_sheath, sku_armoured):
+    armoured_rfp = (normalize_series(rfp_sheath) == "armoured").to_numpy()
+    return np.where(
+        not_specified_mask(rfp_sheath),
+        1.0,
+        np.where(armoured_rfp & sku_armoured, 1.0, 0.0)
+    )
+
 # ============================================================
 # BUILD TECHNICAL BREAKDOWN (TOP-1 ONLY)
 # ============================================================
 
-rows = []
-
-for _, row in rfp_df.iterrows():
-    lot_id = row["lot_id"]
-    sku_id = row["sku_id"]
-
-    rfp_specs = rfp_items[lot_id]
-    sku = inventory_map.get(sku_id, {})
-    sku_specs = sku.get("technical_specs", {})
-
-    rows.extend([
-        {
-            "lot_id": lot_id,
-            "sku_id": sku_id,
-            "spec_name": "voltage_grade",
-            "rfp_value": rfp_specs.get("voltage_grade"),
-            "sku_value": sku_specs.get("voltage_grade"),
-            "spec_score": score_value(
-                rfp_specs.get("voltage_grade"),
-                sku_specs.get("voltage_grade")
-            )
-        },
-        {
-            "lot_id": lot_id,
-            "sku_id": sku_id,
-            "spec_name": "core_count",
-            "rfp_value": rfp_specs.get("core_count"),
-            "sku_value": sku_specs.get("core_count"),
-            "spec_score": score_value(
-                rfp_specs.get("core_count"),
-                sku_specs.get("core_count")
-            )
-        },
-        {
-            "lot_id": lot_id,
-            "sku_id": sku_id,
-            "spec_name": "cross_section_sqmm",
-            "rfp_value": rfp_specs.get("cross_section_sqmm"),
-            "sku_value": sku_specs.get("cross_section_sqmm"),
-            "spec_score": score_cross_section(
-                rfp_specs.get("cross_section_sqmm"),
-                sku_specs.get("cross_section_sqmm")
-            )
-        },
-        {
-            "lot_id": lot_id,
-            "sku_id": sku_id,
-            "spec_name": "conductor_material",
-            "rfp_value": rfp_specs.get("conductor_material"),
-            "sku_value": sku_specs.get("conductor_material"),
-            "spec_score": score_material(
-                rfp_specs.get("conductor_material"),
-                sku_specs.get("conductor_material")
-            )
-        },
-        {
-            "lot_id": lot_id,
-            "sku_id": sku_id,
-            "spec_name": "insulation_type",
-            "rfp_value": rfp_specs.get("insulation_type"),
-            "sku_value": sku_specs.get("insulation"),
-            "spec_score": score_value(
-                rfp_specs.get("insulation_type"),
-                sku_specs.get("insulation")
-            )
-        },
-        {
-            "lot_id": lot_id,
-            "sku_id": sku_id,
-            "spec_name": "sheath_type",
-            "rfp_value": rfp_specs.get("sheath_type"),
-            "sku_value": "armour_type present" if sku_specs.get("armour_type") else "not armoured",
-            "spec_score": score_armoured(
-                rfp_specs.get("sheath_type"),
-                sku_specs
-            )
-        },
-        {
-            "lot_id": lot_id,
-            "sku_id": sku_id,
-            "spec_name": "standards",
-            "rfp_value": ", ".join(rfp_specs.get("standards", [])),
-            "sku_value": ", ".join(sku_specs.get("standards", [])),
-            "spec_score": score_standards(
-                rfp_specs.get("standards"),
-                sku_specs.get("standards")
-            )
-        }
-    ])
+lot_ids = rfp_df["lot_id"].tolist()
+sku_ids = rfp_df["sku_id"].tolist()
+
+rfp_spec_dicts = [rfp_items[lot_id] for lot_id in lot_ids]
+sku_spec_dicts = [sku_specs_map.get(sku_id, {}) for sku_id in sku_ids]
+
+def rfp_column(key):
+    return pd.Series([specs.get(key) for specs in rfp_spec_dicts], dtype=object)
+
+def standards_tuple(specs):
+    return tuple(normalize_standard(s) for s in (specs.get("standards") or []))
+
+# Normalized once per RFP lot / SKU, not once per scored row
+rfp_std_norm = {lot_id: standards_tuple(specs) for lot_id, specs in rfp_items.items()}
+sku_std_sets = {sku_id: frozenset(standards_tuple(specs)) for sku_id, specs in zip(sku_ids, sku_spec_dicts)}
+
+def sku_column(key):
+    return pd.Series([specs.get(key) for specs in sku_spec_dicts], dtype=object)
+
+sku_armoured = np.array([bool(specs.get("armour_type")) for specs in sku_spec_dicts], dtype=bool)
+
+# (spec_name, rfp values, sku values, scores) — in output order
+spec_columns = []
+
+for spec_name, rfp_key, sku_key, scorer in [
+    ("voltage_grade", "voltage_grade", "voltage_grade", score_value_column),
+    ("core_count", "core_count", "core_count", score_value_column),
+    ("cross_section_sqmm", "cross_section_sqmm", "cross_section_sqmm", score_cross_section_column),
+    ("conductor_material", "conductor_material", "conductor_material", score_material_column),
+    ("insulation_type", "insulation_type", "insulation", score_value_column),
+]:
+    rfp_values = rfp_column(rfp_key)
+    sku_values = sku_column(sku_key)
+    spec_columns.append((spec_name, rfp_values, sku_values, scorer(rfp_values, sku_values)))
+
+rfp_sheath = rfp_column("sheath_type")
+spec_columns.append((
+    "sheath_type",
+    rfp_sheath,
+    pd.Series(np.where(sku_armoured, "armour_type present", "not armoured"), dtype=object),
+    score_armoured_column(rfp_sheath, sku_armoured)
+))
+
+# Standards are lists: scored per row with the scalar rule
+spec_columns.append((
+    "standards",
+    pd.Series([", ".join(specs.get("standards", [])) for specs in rfp_spec_dicts], dtype=object),
+    pd.Series([", ".join(specs.get("standards", [])) for specs in sku_spec_dicts], dtype=object),
+    np.array([
+        score_standards(rfp_std_norm[lot_id], sku_std_sets[sku_id])
+        for lot_id, sku_id in zip(lot_ids, sku_ids)
+    ], dtype=float)
+))
 
 # ============================================================
-# SAVE OUTPUT
+# SAVE OUTPUT (STREAMED: SEVEN ROWS PER RFP PRODUCT, INPUT ORDER)
 # ============================================================
 
+spec_lists = [
+    (spec_name, rfp_values.tolist(), sku_values.tolist(), scores.tolist())
+    for spec_name, rfp_values, sku_values, scores in spec_columns
+]
+
 out_file = "rfp_top1_sku_technical_breakdown.csv"
-pd.DataFrame(rows).to_csv(out_file, index=False)
+with open(out_file, "w", newline="", encoding="utf-8") as f:
+    writer = csv.writer(f, lineterminator="\n")
+    writer.writerow(["lot_id", "sku_id", "spec_name", "rfp_value", "sku_value", "spec_score"])
+    writer.writerows(
+        (lot_id, sku_id, spec_name, rfp_values[i], sku_values[i], scores[i])
+        for i, (lot_id, sku_id) in enumerate(zip(lot_ids, sku_ids))
+        for spec_name, rfp_values, sku_values, scores in spec_lists
+    )
 
 print(f"✔ Technical breakdown (TOP-1 only) generated successfully: {out_file}")
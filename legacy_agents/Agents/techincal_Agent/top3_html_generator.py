@@ -1,6 +1,10 @@
-import json
+from functools import lru_cache
+from html import escape
+
 import pandas as pd
-import re
+
+from _loaders import load_rfp_items, rfp_specs_by_lot, load_inventory_tables
+from _norm import normalize, normalize_material, is_not_specified, normalize_standard
 
 # ============================================================
 # LOAD INPUTS
@@ -8,67 +12,12 @@ import re
 
 top3_df = pd.read_csv("rfp_top3_oem_matches.csv")
 
-with open("rfp.json", "r", encoding="utf-8") as f:
-    rfp_data = json.load(f)
-
-with open("product_master_enriched.json", "r", encoding="utf-8") as f:
-    inventory_data = json.load(f)
-
-# inventory normalization
-if isinstance(inventory_data, list):
-    inventory = inventory_data
-else:
-    inventory = (
-        inventory_data.get("products")
-        or inventory_data.get("items")
-        or inventory_data.get("data")
-        or list(inventory_data.values())
-    )
-
-inventory_map = {
-    sku["product_id"]: sku
-    for sku in inventory
-    if isinstance(sku, dict) and "product_id" in sku
-}
-
-rfp_items = {
-    item["lot_id"]: item["technical_attributes"]
-    for item in rfp_data["sales_agent_output"]["line_items_extracted"]
-}
-
-# ============================================================
-# NORMALIZATION HELPERS
-# ============================================================
-
-MATERIAL_MAP = {
-    "aluminum": "aluminium",
-    "aluminium": "aluminium",
-    "al": "aluminium",
-    "copper": "copper",
-    "cu": "copper"
-}
-
-def normalize(v):
-    if v is None:
-        return None
-    return str(v).strip().lower()
-
-def normalize_material(v):
-    return MATERIAL_MAP.get(normalize(v), normalize(v))
+# Sorted once: groups come out in lot order with SKUs already ranked
+top3_df = top3_df.sort_values(["lot_id", "rank"], kind="stable")
 
-def is_not_specified(v):
-    return v is None or v == "NOT SPECIFIED"
+sku_specs_map = load_inventory_tables()["specs"]
 
-def normalize_standard(s):
-    if not s:
-        return None
-    s = normalize(s)
-    s = re.sub(r"\(.*?\)", "", s)
-    s = re.sub(r":\d{4}", "", s)
-    s = s.replace("part-", "part ")
-    s = s.replace("part i", "part 1")
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+rfp_items = rfp_specs_by_lot(load_rfp_items())
 
 # ============================================================
 # SCORING (EXPLANATION MODE)
@@ -92,18 +41,23 @@ def score_cross_section(rfp, sku):
     except:
         return 0.0
 
-def score_standards(rfp_list, sku_list):
-    if not rfp_list:
+def standards_set(specs):
+    return frozenset(normalize_standard(x) for x in (specs.get("standards") or []))
+
+# Normalized once per RFP lot / SKU, not once per rendered row
+rfp_std_sets = {lot_id: standards_set(specs) for lot_id, specs in rfp_items.items()}
+sku_std_sets = {sku_id: standards_set(specs) for sku_id, specs in sku_specs_map.items()}
+
+def score_standards(rfp_norm, sku_norm):
+    if not rfp_norm:
         return 1.0
-    rfp_norm = set(normalize_standard(x) for x in rfp_list)
-    sku_norm = set(normalize_standard(x) for x in (sku_list or []))
     return 1.0 if rfp_norm & sku_norm else 0.0
 
 # ============================================================
 # BUILD HTML
 # ============================================================
 
-html = ["""
+HTML_HEAD = """
 <html>
 <head>
 <style>
@@ -150,30 +104,15 @@ tr:nth-child(even) {
 <h2 style="text-align:center;">
 Top 3 Technical Match – Detailed Comparison
 </h2>
-"""]
-
-# ============================================================
-# GENERATE CONTENT
-# ============================================================
-
-for lot_id, lot_group in top3_df.groupby("lot_id"):
+"""
 
-    html.append(f"""
+LOT_HEADER_HTML = """
     <div class="lot-header">
         RFP Lot: {lot_id}
     </div>
-    """)
-
-    for _, row in lot_group.sort_values("rank").iterrows():
-        sku_id = row["sku_id"]
-        rank = int(row["rank"])
-        match_pct = row["match_percentage"]
-
-        sku = inventory_map.get(sku_id, {})
-        sku_specs = sku.get("technical_specs", {})
-        rfp_specs = rfp_items[lot_id]
+    """
 
-        html.append(f"""
+SKU_HEADER_HTML = """
         <div class="sku-header">
             Rank {rank} | SKU: {sku_id} | Match: {match_pct:.2f}%
         </div>
@@ -185,54 +124,86 @@ for lot_id, lot_group in top3_df.groupby("lot_id"):
                 <th>SKU Specification</th>
                 <th>Score</th>
             </tr>
-        """)
+        """
+
+SPEC_ROW_HTML = """
+            <tr>
+                <td>{}</td>
+                <td>{}</td>
+                <td>{}</td>
+                <td class="score">{:.2f}</td>
+            </tr>
+            """
+
+HTML_TAIL = "</body></html>"
 
-        rows = [
-            ("voltage_grade", rfp_specs.get("voltage_grade"), sku_specs.get("voltage_grade"),
-             score_value(rfp_specs.get("voltage_grade"), sku_specs.get("voltage_grade"))),
+@lru_cache(maxsize=8192, typed=True)
+def _spec_row_html(spec, rfp_v, sku_v, sc):
+    return SPEC_ROW_HTML.format(escape(str(spec)), escape(str(rfp_v)), escape(str(sku_v)), sc)
 
-            ("core_count", rfp_specs.get("core_count"), sku_specs.get("core_count"),
-             score_value(rfp_specs.get("core_count"), sku_specs.get("core_count"))),
+def spec_row_html(spec, rfp_v, sku_v, sc):
+    # The same (spec, RFP value, SKU value, score) rows repeat across SKUs and lots
+    try:
+        return _spec_row_html(spec, rfp_v, sku_v, sc)
+    except TypeError:  # unhashable value (e.g. a list)
+        return _spec_row_html.__wrapped__(spec, rfp_v, sku_v, sc)
 
-            ("cross_section_sqmm", rfp_specs.get("cross_section_sqmm"), sku_specs.get("cross_section_sqmm"),
-             score_cross_section(rfp_specs.get("cross_section_sqmm"), sku_specs.get("cross_section_sqmm"))),
+# ============================================================
+# GENERATE CONTENT
+# ============================================================
 
-            ("conductor_material", rfp_specs.get("conductor_material"), sku_specs.get("conductor_material"),
-             score_material(rfp_specs.get("conductor_material"), sku_specs.get("conductor_material"))),
+def spec_rows(lot_id, sku_id):
+    rfp_specs = rfp_items[lot_id]
+    sku_specs = sku_specs_map.get(sku_id, {})
+    return [
+        ("voltage_grade", rfp_specs.get("voltage_grade"), sku_specs.get("voltage_grade"),
+         score_value(rfp_specs.get("voltage_grade"), sku_specs.get("voltage_grade"))),
 
-            ("insulation_type", rfp_specs.get("insulation_type"), sku_specs.get("insulation"),
-             score_value(rfp_specs.get("insulation_type"), sku_specs.get("insulation"))),
+        ("core_count", rfp_specs.get("core_count"), sku_specs.get("core_count"),
+         score_value(rfp_specs.get("core_count"), sku_specs.get("core_count"))),
 
-            ("sheath_type", rfp_specs.get("sheath_type"),
-             "armour_type present" if sku_specs.get("armour_type") else "not armoured",
-             1.0 if sku_specs.get("armour_type") else 0.0),
+        ("cross_section_sqmm", rfp_specs.get("cross_section_sqmm"), sku_specs.get("cross_section_sqmm"),
+         score_cross_section(rfp_specs.get("cross_section_sqmm"), sku_specs.get("cross_section_sqmm"))),
 
-            ("standards",
-             ", ".join(rfp_specs.get("standards", [])),
-             ", ".join(sku_specs.get("standards", [])),
-             score_standards(rfp_specs.get("standards"), sku_specs.get("standards")))
-        ]
+        ("conductor_material", rfp_specs.get("conductor_material"), sku_specs.get("conductor_material"),
+         score_material(rfp_specs.get("conductor_material"), sku_specs.get("conductor_material"))),
 
-        for spec, rfp_v, sku_v, sc in rows:
-            html.append(f"""
-            <tr>
-                <td>{spec}</td>
-                <td>{rfp_v}</td>
-                <td>{sku_v}</td>
-                <td class="score">{sc:.2f}</td>
-            </tr>
-            """)
+        ("insulation_type", rfp_specs.get("insulation_type"), sku_specs.get("insulation"),
+         score_value(rfp_specs.get("insulation_type"), sku_specs.get("insulation"))),
+
+        ("sheath_type", rfp_specs.get("sheath_type"),
+         "armour_type present" if sku_specs.get("armour_type") else "not armoured",
+         1.0 if sku_specs.get("armour_type") else 0.0),
 
-        html.append("</table>")
+        ("standards",
+         ", ".join(rfp_specs.get("standards", [])),
+         ", ".join(sku_specs.get("standards", [])),
+         score_standards(rfp_std_sets[lot_id], sku_std_sets.get(sku_id, frozenset())))
+    ]
+
+def render_sku(lot_id, sku_id, rank, match_pct):
+    return (
+        SKU_HEADER_HTML.format(rank=int(rank), sku_id=sku_id, match_pct=match_pct)
+        + "".join([spec_row_html(*row) for row in spec_rows(lot_id, sku_id)])
+        + "</table>"
+    )
 
-html.append("</body></html>")
+def render_lot(lot_id, lot_group):
+    ranked = lot_group[["sku_id", "rank", "match_percentage"]].itertuples(index=False, name=None)
+    return LOT_HEADER_HTML.format(lot_id=lot_id) + "".join([
+        render_sku(lot_id, sku_id, rank, match_pct)
+        for sku_id, rank, match_pct in ranked
+    ])
 
 # ============================================================
-# SAVE FILE
+# SAVE FILE (STREAMED: ONE BUFFERED WRITE PER LOT)
 # ============================================================
 
 out_file = "rfp_top3_technical_breakdown.html"
-with open(out_file, "w", encoding="utf-8") as f:
-    f.write("".join(html))
+with open(out_file, "w", encoding="utf-8", buffering=1 << 20) as f:
+    f.write(HTML_HEAD)
+    for lot_id, lot_group in top3_df.groupby("lot_id", sort=False, observed=True):
+        f.write(render_lot(lot_id, lot_group))
+    f.write(HTML_TAIL)
 
 print(f"✔ Top-3 technical comparison HTML generated: {out_file}")
@@ -1,133 +1,54 @@
-import json
+from collections import Counter
+
+import numpy as np
 import pandas as pd
-import re
+
+from _loaders import load_rfp_items, load_inventory
+from _norm import MATERIAL_MAP, normalize_standard, normalize_series, not_specified_mask, round_scores, cross_section_closeness
 
 # ============================================================
 # 1. LOAD RFP
 # ============================================================
 
-with open("rfp.json", "r", encoding="utf-8") as f:
-    rfp_data = json.load(f)
-
-rfp_items = rfp_data["sales_agent_output"]["line_items_extracted"]
+rfp_items = load_rfp_items()
 
 # ============================================================
 # 2. LOAD PRODUCT MASTER (ROBUST)
 # ============================================================
 
-with open("product_master_enriched.json", "r", encoding="utf-8") as f:
-    inventory_data = json.load(f)
-
-if isinstance(inventory_data, list):
-    inventory = inventory_data
-elif isinstance(inventory_data, dict):
-    inventory = (
-        inventory_data.get("products")
-        or inventory_data.get("items")
-        or inventory_data.get("data")
-        or list(inventory_data.values())
-    )
-else:
-    inventory = []
+inventory = load_inventory()
 
 # ============================================================
-# 3. NORMALIZATION HELPERS
+# 3. MATCHING FUNCTIONS (ONE COLUMN OF RFP × SKU PAIRS AT A TIME)
 # ============================================================
 
-MATERIAL_MAP = {
-    "aluminum": "aluminium",
-    "aluminium": "aluminium",
-    "al": "aluminium",
-    "copper": "copper",
-    "cu": "copper"
-}
-
-def normalize(val):
-    if val is None:
-        return None
-    return str(val).strip().lower()
-
-def normalize_material(val):
-    return MATERIAL_MAP.get(normalize(val), normalize(val))
-
-def is_not_specified(val):
-    return val is None or val == "NOT SPECIFIED"
+def match_value(rfp_ns, rfp_norm, inv_norm):
+    # NOT SPECIFIED → FULL POINTS, else exact (normalized) match
+    return np.where(rfp_ns, 1.0, (rfp_norm == inv_norm).astype(float))
 
-def normalize_standard(s):
-    if not s:
-        return None
+def match_cross_section(rfp_ns, rfp_val, inv_val):
+    return np.where(rfp_ns, 1.0, cross_section_closeness(rfp_val, inv_val))
 
-    s = normalize(s)
-
-    # remove year info and brackets
-    s = re.sub(r"\(.*?\)", "", s)
-    s = re.sub(r":\d{4}", "", s)
-
-    # normalize part notation
-    s = s.replace("part-", "part ")
-    s = s.replace("part i", "part 1")
-
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+def match_armoured(rfp_ns, rfp_is_armoured, inv_armoured):
+    return np.where(rfp_ns, 1.0, (rfp_is_armoured & inv_armoured).astype(float))
 
 # ============================================================
-# 4. MATCHING FUNCTIONS
+# 4. STANDARDS — FINAL CORRECT LOGIC
 # ============================================================
 
-def match_value(rfp_val, inv_val):
-    if is_not_specified(rfp_val):
-        return 1.0
-    return 1.0 if normalize(rfp_val) == normalize(inv_val) else 0.0
-
-def match_material(rfp_val, inv_val):
-    if is_not_specified(rfp_val):
-        return 1.0
-    return 1.0 if normalize_material(rfp_val) == normalize_material(inv_val) else 0.0
-
-def match_cross_section(rfp_val, inv_val):
-    if is_not_specified(rfp_val):
-        return 1.0
-    try:
-        r = float(rfp_val)
-        i = float(inv_val)
-    except (TypeError, ValueError):
-        return 0.0
-
-    score = 1.0 - abs(i - r) / r
-    return max(0.0, round(score, 3))
-
-def match_armoured(rfp_val, inv_specs):
-    # NOT SPECIFIED → FULL POINTS
-    if is_not_specified(rfp_val):
-        return 1.0
-
-    if normalize(rfp_val) == "armoured":
-        return 1.0 if inv_specs.get("armour_type") else 0.0
-
-    return 0.0
-
-# ============================================================
-# 5. STANDARDS — FINAL CORRECT LOGIC
-# ============================================================
-
-def match_standards(rfp_list, inv_list):
+def match_standards(rfp_norm, inv_norm):
     """
     - Total standards weight = 1.0
     - Divided equally among all RFP standards
     - Each standard checked independently
     - 'ISI marked' always scores its own share only
+    (rfp_norm / inv_norm are already normalized; rfp_norm is None when the RFP lists none)
     """
 
-    if not rfp_list:
+    if not rfp_norm:
         return 1.0
 
-    rfp_norm = [normalize_standard(s) for s in rfp_list]
-    inv_norm = set(normalize_standard(s) for s in (inv_list or []))
-
     total = len(rfp_norm)
-    if total == 0:
-        return 1.0
-
     per_std_weight = 1.0 / total
     score = 0.0
 
@@ -140,69 +61,185 @@ def match_standards(rfp_list, inv_list):
 
     return round(score, 3)
 
-# ============================================================
-# 6. FINAL MATCH PERCENTAGE (7 LOGICAL SPECS)
-# ============================================================
-
-def compute_match_percentage(rfp_attrs, inv_specs):
-    scores = [
-        match_value(rfp_attrs.get("voltage_grade"), inv_specs.get("voltage_grade")),
-        match_value(rfp_attrs.get("core_count"), inv_specs.get("core_count")),
-        match_cross_section(rfp_attrs.get("cross_section_sqmm"), inv_specs.get("cross_section_sqmm")),
-        match_material(rfp_attrs.get("conductor_material"), inv_specs.get("conductor_material")),
-        match_value(rfp_attrs.get("insulation_type"), inv_specs.get("insulation")),
-        match_armoured(rfp_attrs.get("sheath_type"), inv_specs),
-        match_standards(rfp_attrs.get("standards"), inv_specs.get("standards"))
-    ]
-
-    return round((sum(scores) / len(scores)) * 100, 2)
-
-# ============================================================
-# 7. MATCH EACH RFP PRODUCT → TOP 3 SKUS
-# ============================================================
-
-rows = []
-
-for item in rfp_items:
-    lot_id = item["lot_id"]
-    raw_desc = item["raw_description"]
-    rfp_attrs = item["technical_attributes"]
-
-    matches = []
-
-    for sku in inventory:
-        if not isinstance(sku, dict):
-            continue
+def standards_share(matched, total):
+    # Same float accumulation as match_standards(), so rounding is identical
+    per_std_weight = 1.0 / total
+    score = 0.0
+    for _ in range(matched):
+        score += per_std_weight
+    return round(score, 3)
 
-        inv_specs = sku.get("technical_specs")
-        if not inv_specs:
+def popcount(bits):
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(bits)
+    return np.unpackbits(bits.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+# ============================================================
+# 5. RFP AND INVENTORY TABLES (NORMALIZED ONCE PER ROW)
+# ============================================================
+
+rfp_df = pd.DataFrame({
+    "rfp_pos": range(len(rfp_items)),
+    "lot_id": [item["lot_id"] for item in rfp_items],
+    "rfp_description": [item["raw_description"] for item in rfp_items],
+})
+rfp_attrs = [item["technical_attributes"] for item in rfp_items]
+
+for key in ["voltage_grade", "core_count", "cross_section_sqmm", "conductor_material", "insulation_type", "sheath_type"]:
+    raw = pd.Series([attrs.get(key) for attrs in rfp_attrs], dtype=object)
+    rfp_df[f"rfp_{key}_ns"] = not_specified_mask(raw)
+    rfp_df[f"rfp_{key}"] = normalize_series(raw)
+
+rfp_df["rfp_conductor_material"] = rfp_df["rfp_conductor_material"].map(MATERIAL_MAP).fillna(rfp_df["rfp_conductor_material"])
+rfp_df["rfp_cross_section_sqmm"] = pd.to_numeric(
+    pd.Series([attrs.get("cross_section_sqmm") for attrs in rfp_attrs], dtype=object), errors="coerce"
+)
+rfp_df["rfp_sheath_type"] = (rfp_df["rfp_sheath_type"] == "armoured").to_numpy()
+rfp_df["rfp_standards"] = [
+    tuple(normalize_standard(x) for x in attrs.get("standards")) if attrs.get("standards") else None
+    for attrs in rfp_attrs
+]
+
+inv_skus = [
+    sku for sku in inventory
+    if isinstance(sku, dict) and sku.get("technical_specs")
+]
+inv_specs = [sku["technical_specs"] for sku in inv_skus]
+
+inv_df = pd.DataFrame({
+    "inv_pos": range(len(inv_skus)),
+    "sku_id": [sku.get("product_id", "UNKNOWN") for sku in inv_skus],
+    "sku_name": [sku.get("product_name", "UNKNOWN") for sku in inv_skus],
+})
+
+for key, spec_key in [
+    ("voltage_grade", "voltage_grade"),
+    ("core_count", "core_count"),
+    ("conductor_material", "conductor_material"),
+    ("insulation_type", "insulation"),
+]:
+    inv_df[f"inv_{key}"] = normalize_series(pd.Series([specs.get(spec_key) for specs in inv_specs], dtype=object))
+
+inv_df["inv_conductor_material"] = inv_df["inv_conductor_material"].map(MATERIAL_MAP).fillna(inv_df["inv_conductor_material"])
+inv_df["inv_cross_section_sqmm"] = pd.to_numeric(
+    pd.Series([specs.get("cross_section_sqmm") for specs in inv_specs], dtype=object), errors="coerce"
+)
+inv_df["inv_armoured"] = [bool(specs.get("armour_type")) for specs in inv_specs]
+inv_df["inv_standards"] = [
+    frozenset(normalize_standard(x) for x in (specs.get("standards") or []))
+    for specs in inv_specs
+]
+
+# ============================================================
+# 6. MATCH EACH RFP PRODUCT → TOP 3 SKUS (N × M SCORE GRID)
+# ============================================================
+
+# Columns are broadcast as (N, 1) RFP × (1, M) SKU arrays, so every score
+# is a whole-grid NumPy op and no N·M frame of repeated strings is built.
+
+def rfp_col(name, dtype=object):
+    return rfp_df[name].to_numpy(dtype=dtype)[:, None]
+
+def inv_col(name, dtype=object):
+    return inv_df[name].to_numpy(dtype=dtype)[None, :]
+
+def code_cols(key):
+    # One shared category table per spec, so string equality becomes int32 equality
+    codes, _ = pd.factorize(pd.concat([rfp_df[f"rfp_{key}"], inv_df[f"inv_{key}"]], ignore_index=True))
+    codes = codes.astype(np.int32)
+    return codes[:len(rfp_df), None], codes[None, len(rfp_df):]
+
+# Standards are sets: scored per distinct (RFP list, SKU set) combination
+standards_cache = {}
+def cached_match_standards(rfp_norm, inv_norm):
+    key = (rfp_norm, inv_norm)
+    if key not in standards_cache:
+        standards_cache[key] = match_standards(rfp_norm, inv_norm)
+    return standards_cache[key]
+
+def standards_grid():
+    """
+    match_standards() over the whole grid via uint64 bitmaps:
+    one bit per standard listed by any SKU, matched count = popcount(RFP bits & SKU bits).
+    Falls back to the cached set rule when SKUs list more than 64 distinct standards.
+    """
+    std_bit = {}
+    for inv_norm in inv_df["inv_standards"]:
+        for std in inv_norm:
+            if std != "isi marked":
+                std_bit.setdefault(std, len(std_bit))
+
+    if len(std_bit) > 64:
+        return np.array([
+            [cached_match_standards(r, i) for i in inv_df["inv_standards"]]
+            for r in rfp_df["rfp_standards"]
+        ], dtype=float).reshape(len(rfp_df), len(inv_df))
+
+    inv_bits = np.array([
+        sum(1 << std_bit[std] for std in inv_norm if std in std_bit)
+        for inv_norm in inv_df["inv_standards"]
+    ], dtype=np.uint64)
+
+    rows = []
+    for rfp_norm in rfp_df["rfp_standards"]:
+        if not rfp_norm:
+            rows.append(np.ones(len(inv_df)))
             continue
 
-        score = compute_match_percentage(rfp_attrs, inv_specs)
-
-        matches.append({
-            "sku_id": sku.get("product_id", "UNKNOWN"),
-            "sku_name": sku.get("product_name", "UNKNOWN"),
-            "match_percentage": score
-        })
-
-    top_3 = sorted(matches, key=lambda x: x["match_percentage"], reverse=True)[:3]
-
-    for rank, m in enumerate(top_3, start=1):
-        rows.append({
-            "lot_id": lot_id,
-            "rfp_description": raw_desc,
-            "rank": rank,
-            "sku_id": m["sku_id"],
-            "sku_name": m["sku_name"],
-            "match_percentage": m["match_percentage"]
-        })
-
-# ============================================================
-# 8. SAVE OUTPUT
+        # 'ISI marked' always scores; a standard listed k times sits in k bitmap layers
+        counts = Counter(std for std in rfp_norm if std != "isi marked")
+        matched = np.full(len(inv_df), len(rfp_norm) - sum(counts.values()), dtype=np.int64)
+        for level in range(max(counts.values(), default=0)):
+            rfp_bits = sum(1 << std_bit[std] for std, c in counts.items() if c > level and std in std_bit)
+            matched += popcount(inv_bits & np.uint64(rfp_bits))
+
+        shares = np.array([standards_share(k, len(rfp_norm)) for k in range(len(rfp_norm) + 1)])
+        rows.append(shares[matched])
+
+    return np.array(rows, dtype=float).reshape(len(rfp_df), len(inv_df))
+
+# 7 logical specs, summed in this order
+score_cols = [
+    match_value(rfp_col("rfp_voltage_grade_ns", bool), *code_cols("voltage_grade")),
+    match_value(rfp_col("rfp_core_count_ns", bool), *code_cols("core_count")),
+    match_cross_section(
+        rfp_col("rfp_cross_section_sqmm_ns", bool),
+        rfp_col("rfp_cross_section_sqmm", float),
+        inv_col("inv_cross_section_sqmm", float)
+    ),
+    match_value(rfp_col("rfp_conductor_material_ns", bool), *code_cols("conductor_material")),
+    match_value(rfp_col("rfp_insulation_type_ns", bool), *code_cols("insulation_type")),
+    match_armoured(
+        rfp_col("rfp_sheath_type_ns", bool),
+        rfp_col("rfp_sheath_type", bool),
+        inv_col("inv_armoured", bool)
+    ),
+    standards_grid(),
+]
+
+total = score_cols[0]
+for col in score_cols[1:]:
+    total = total + col
+match_percentage = round_scores((total / len(score_cols)) * 100, 2)
+
+# Best first per RFP product; ties keep inventory order (stable sort on -score)
+top_k = min(3, len(inv_df))
+top_inv = np.argsort(-match_percentage, axis=1, kind="stable")[:, :top_k]
+top_rfp = np.repeat(np.arange(len(rfp_df)), top_k)
+top_inv = top_inv.ravel()
+
+top_3 = pd.concat([
+    rfp_df.iloc[top_rfp][["lot_id", "rfp_description"]].reset_index(drop=True),
+    pd.DataFrame({"rank": np.tile(np.arange(1, top_k + 1), len(rfp_df))}),
+    inv_df.iloc[top_inv][["sku_id", "sku_name"]].reset_index(drop=True),
+    pd.DataFrame({"match_percentage": match_percentage[top_rfp, top_inv]}),
+], axis=1)
+
+# ============================================================
+# 7. SAVE OUTPUT
 # ============================================================
 
 output_file = "rfp_top3_oem_matches.csv"
-pd.DataFrame(rows).to_csv(output_file, index=False)
+top_3[["lot_id", "rfp_description", "rank", "sku_id", "sku_name", "match_percentage"]].to_csv(output_file, index=False)
 
 print(f"✔ Technical matching completed successfully: {output_file}")
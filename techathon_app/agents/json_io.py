@@ -0,0 +1,20 @@
+import json
+import mmap
+
+# Optional fast JSON backend
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def read_json_file(path):
+    """Parses a JSON file in one pass: orjson straight off an mmap of the file when installed, else stdlib json."""
+    if orjson is None:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as raw:
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                return json.loads(bytes(raw)) # stdlib accepts extensions orjson rejects (NaN, Infinity)
@@ -1,11 +1,27 @@
 import json
 import os
-import math
+import re
 import datetime
-import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
+import numpy as np
 from fpdf import FPDF
 
+# Optional multi-pattern matcher for location keywords (falls back to one compiled regex)
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Optional JIT for the per-item BOM arithmetic (falls back to NumPy reductions)
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 # ==============================================================================
 # 1. CFO-LEVEL CONFIGURATION (The "Brain" Settings)
 # ==============================================================================
@@ -42,9 +58,12 @@ CONFIG = {
         "LV_BASE_COST": 5000
     }
 }
+# Read-only at module level; each PricingEngine overlays settings on its own shallow copy
+CONFIG = MappingProxyType({section: MappingProxyType(values) for section, values in CONFIG.items()})
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 DB_DIR = BASE_DIR / "database"
+SETTINGS_FILE = BASE_DIR / "settings.json"
 
 FILES = {
     "PRODUCTS": "product_master_enriched.json",
@@ -56,6 +75,49 @@ FILES = {
     "TESTS": "test_master.json"
 }
 
+# Background threads rendering audit PDFs
+PDF_WORKERS = 2
+
+# Leading number of a free-text quantity ("5000 Meters" -> "5000")
+QTY_RE = re.compile(r"[\d\.]+")
+
+# Location keyword -> zone type (first keyword found in the location wins)
+ZONE_KEYWORDS = {
+    "hilly": "Hilly", "mountain": "Hilly", "remote": "Hilly",
+    "coastal": "Coastal", "port": "Coastal", "sea": "Coastal",
+    "desert": "Desert", "rajasthan": "Desert", "kutch": "Desert",
+    "island": "Island", "andaman": "Island",
+    "urban": "Urban", "city": "Urban", "metro": "Urban"
+}
+
+@lru_cache(maxsize=1)
+def _load_settings_config(mtime_ns):
+    """pricing_config section of settings.json, parsed once per file version (keyed by mtime)."""
+    with open(SETTINGS_FILE, 'r') as f:
+        return json.load(f).get('pricing_config', {})
+
+def load_pricing_settings():
+    """Cached pricing overlay; re-read only after settings.json changes on disk."""
+    try:
+        mtime_ns = SETTINGS_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    return _load_settings_config(mtime_ns)
+
+def _bom_cost_kernel(cost_per_m, high_vol, qty, hedging_pct):
+    """(material cost, hedging buffer) for one BOM, accumulated line by line like ndarray.sum on short BOMs."""
+    mat_cost = 0.0
+    risk = 0.0
+    for i in range(cost_per_m.shape[0]):
+        line_cost = cost_per_m[i] * qty
+        mat_cost += line_cost
+        if high_vol[i]:
+            risk += line_cost * hedging_pct
+    return mat_cost, risk
+
+if njit is not None:
+    _bom_cost_kernel = njit(cache=True)(_bom_cost_kernel)
+
 # ==============================================================================
 # 2. INTELLIGENT DATA LOADER
 # ==============================================================================
@@ -81,73 +143,219 @@ class Database:
 # 3. THE PRICING ENGINE (Logic Core)
 # ==============================================================================
 class PricingEngine:
+    # Case-insensitive keyword scan, compiled once; lookahead so overlapping keywords are all reported
+    _ZONE_RE = re.compile("(?=(" + "|".join(map(re.escape, ZONE_KEYWORDS)) + "))", re.IGNORECASE | re.ASCII)
+
     def __init__(self, db):
         self.db = db
         # Load Settings Integration
-        self.config = copy.deepcopy(CONFIG)
+        self.config = {section: dict(values) for section, values in CONFIG.items()}
         try:
-            full_path = BASE_DIR / "settings.json"
-            if full_path.exists():
-                with open(full_path, 'r') as f:
-                    s = json.load(f).get('pricing_config', {})
-                    if 'base_margin_percent' in s:
-                        self.config['FINANCIAL']['TARGET_NET_MARGIN'] = s['base_margin_percent'] / 100.0
-                    if 'packaging_cost_per_drum' in s:
-                        self.config['PACKAGING']['WOODEN_DRUM_COST'] = s['packaging_cost_per_drum']
-                        self.config['PACKAGING']['STEEL_DRUM_COST'] = s['packaging_cost_per_drum'] * 2.5
-                    if 'logistics_rate_per_km_ton' in s:
-                         # We'll stick to zone master but use this as a base feedback if needed
-                         pass
+            s = load_pricing_settings()
+            if 'base_margin_percent' in s:
+                self.config['FINANCIAL']['TARGET_NET_MARGIN'] = s['base_margin_percent'] / 100.0
+            if 'packaging_cost_per_drum' in s:
+                self.config['PACKAGING']['WOODEN_DRUM_COST'] = s['packaging_cost_per_drum']
+                self.config['PACKAGING']['STEEL_DRUM_COST'] = s['packaging_cost_per_drum'] * 2.5
+            if 'logistics_rate_per_km_ton' in s:
+                 # We'll stick to zone master but use this as a base feedback if needed
+                 pass
         except Exception as e:
             print(f"⚠️ Pricing Engine: Could not load settings: {e}")
 
-    def calculate_micro_bom_cost(self, product_id, total_qty_mtr):
-        """Explodes BOM to calculate exact material cost + risk buffer."""
-        # Normalize product_id for lookup
-        prod = next((p for p in self.db["PRODUCTS"] if str(p.get('product_id')) == str(product_id)), None)
-        
-        # Fallback if product not in master
-        if not prod:
-            return total_qty_mtr * 1500, total_qty_mtr * 2.5, ["Product Master Missing - Using Estimate"], 0, 0
+        # Per-BOM-line rates, promoted out of the nested config
+        self.hedging_pct = self.config["FINANCIAL"]["HEDGING_BUFFER_PCT"]
+        self.overhead_rate = self.config["OPERATIONAL"]["FACTORY_OVERHEAD_RATE"]
+
+        self._build_indexes()
+        self._bom_cache = {}
+        self.refresh_factory_cache()
+
+    def _build_indexes(self):
+        """One-time id lookups over the master data (first record wins, as with the old linear scans)."""
+        self.products_by_id = {}
+        for p in self.db["PRODUCTS"]:
+            self.products_by_id.setdefault(str(p.get('product_id')), p)
+
+        self.materials_by_id = {}
+        for m in self.db["MATERIALS"]:
+            self.materials_by_id.setdefault(m['material_id'], m)
+
+        # Materials as parallel arrays (SoA) indexed via material_idx; the extra last slot is the
+        # unknown-material fallback (₹500/unit, not volatile)
+        mats = list(self.materials_by_id.values())
+        self.material_idx = {m['material_id']: i for i, m in enumerate(mats)}
+        self.material_names = [m.get('material_name') for m in mats]
+        self.material_rate = np.array(
+            [m.get('base_cost_per_unit', 0) * m.get('current_market_factor', 1.0) for m in mats] + [500],
+            dtype=np.float64
+        )
+        self.material_high_vol = np.array(
+            [m.get('volatility_risk_level') == 'High' for m in mats] + [False],
+            dtype=bool
+        )
+
+        self.tests_by_id = {}
+        for t in self.db["TESTS"]:
+            self.tests_by_id.setdefault(t['test_id'], t)
+
+        # Rival scores parsed once: cid -> (aggression, win_rate, tier); None if the record is malformed
+        self.competitors_by_id = {}
+        self._comp_meta = {}
+        for c in self.db["COMPETITORS"]:
+            self.competitors_by_id.setdefault(c['competitor_id'], c)
+            try:
+                meta = (
+                    float(c['pricing_intelligence']['aggression_score']),
+                    float(c['performance_metrics'].get('win_rate_against_us', 0)),
+                    str(c.get('tier') or '')
+                )
+            except (KeyError, TypeError, ValueError, AttributeError):
+                meta = None
+            self._comp_meta.setdefault(c['competitor_id'], meta)
+
+        # Game-theory rule each rival triggers, resolved up front: cid -> (impact, note)
+        self._rival_rule = {}
+        for cid, meta in self._comp_meta.items():
+            if meta is None: continue
+            aggression, win_rate, tier = meta
+            name = self.competitors_by_id[cid]['name']
+            if aggression >= 8:
+                self._rival_rule[cid] = (0.03, f"Price War Alert: {name} (Aggressive) -> -3% Margin")
+            elif win_rate > 0.6:
+                self._rival_rule[cid] = (0.02, f"High Threat: {name} (High Win Rate) -> -2% Margin")
+            elif "Tier-3" in tier:
+                self._rival_rule[cid] = (0.04, f"Low-Cost Rival: {name} -> -4% Margin")
+
+        # Name fallback for free-text rivals: case-folded, longest (most specific) name first
+        self.competitor_names = sorted(
+            ((c['name'].lower(), c) for c in self.db["COMPETITORS"]),
+            key=lambda x: -len(x[0])
+        )
+
+        # Client names are substring-matched, so keep master order with names pre-lowered
+        self.clients_by_name_lower = [(c['client_name'].lower(), c) for c in self.db["CLIENTS"]]
+
+        self.logistics_default = next((z for z in self.db["LOGISTICS"] if z['zone_code'] == "Z-01"), None)
+
+        # Keyword -> resolved zone (first zone whose type matches, else Z-01)
+        def zone_for(zone_type):
+            t = zone_type.lower()
+            return next((z for z in self.db["LOGISTICS"] if t in z.get('zone_type', '').lower()), None) or self.logistics_default
+
+        self.zone_by_keyword = {kw: zone_for(zone_type) for kw, zone_type in ZONE_KEYWORDS.items()}
+        self.default_zone = zone_for("Plains_Highway")
+
+        # All keywords found in one scan of the location; the earliest ZONE_KEYWORDS entry wins
+        self._zone_priority = {kw: i for i, kw in enumerate(self.zone_by_keyword)}
+        self._zone_list = list(self.zone_by_keyword.values())
+        if ahocorasick:
+            self._zone_ac = ahocorasick.Automaton()
+            for kw, i in self._zone_priority.items():
+                self._zone_ac.add_word(kw, i)
+            self._zone_ac.make_automaton()
+        else:
+            self._zone_ac = None
 
-        mat_cost_total = 0
-        risk_buffer_total = 0
-        breakdown = []
+    def _bom_unit_cost(self, product_id):
+        """Per-meter BOM for a product, exploded once per engine: (weight_per_m, bom, base_rate) or None.
+
+        bom holds parallel arrays (SoA): cost_per_m, high_vol mask and the static breakdown text per line.
+        """
+        key = str(product_id)
+        if key in self._bom_cache:
+            return self._bom_cache[key]
+
+        prod = self.products_by_id.get(key)
+        if not prod:
+            self._bom_cache[key] = None
+            return None
 
         # FIX: Prioritize the standard BOM which has quantities, 'enriched' often misses it
         bom = prod.get('bill_of_materials', [])
         if not bom: bom = prod.get('bill_of_materials_enriched', [])
 
+        unknown_idx = len(self.material_names)
+        qtys, mat_idx, texts = [], [], []  # volatile lines get their risk value appended per call
+        for item in bom:
+            mat_id = item.get('material_id')
+            qty_per_meter = float(item.get('quantity', 0))
+
+            # Lookup Material (market-adjusted rate precomputed at load)
+            i = self.material_idx.get(mat_id, unknown_idx)
+            qtys.append(qty_per_meter)
+            mat_idx.append(i)
+            if i == unknown_idx:
+                # Fallback if material not found in DB
+                texts.append(f"   - {item.get('material_id')}: Unknown Material (Used Fallback ₹500/unit)")
+            elif self.material_high_vol[i]:
+                texts.append(f"   - {self.material_names[i]}: {qty_per_meter} units/m")
+            else:
+                texts.append(f"   - {self.material_names[i]}: {qty_per_meter} units/m @ {self.material_rate[i]:.2f}")
+
+        bom_np = {
+            'cost_per_m': np.asarray(qtys, dtype=np.float64) * np.take(self.material_rate, mat_idx),
+            'high_vol': np.take(self.material_high_vol, mat_idx),
+            'any_vol': any(self.material_high_vol[i] for i in mat_idx),
+            'texts': texts
+        } if texts else None
+
+        # Commercial fallback rate (only used when no BOM found)
+        base_rate = None if bom else prod.get('commercial', {}).get('base_manufacturing_cost', 1000)
+
+        weight_per_km = prod.get('performance_data', {}).get('approx_weight_kg_km', 1000)
+
+        unit = (weight_per_km / 1000, bom_np, base_rate)
+        self._bom_cache[key] = unit
+        return unit
+
+    def refresh_factory_cache(self):
+        """Average line utilization per category (HV / LT) from the production schedule; None when no lines."""
+        factory = self.db["FACTORY"]
+        self._fact_util = np.fromiter((b['utilization_percent'] for b in factory), dtype=np.float64, count=len(factory))
+
+        self._avg_util = {}
+        for category in ("HV", "LT"):
+            on_line = np.fromiter((category in b.get('production_line_id', '') for b in factory), dtype=bool, count=len(factory))
+            self._avg_util[category] = self._fact_util[on_line].mean().item() if on_line.any() else None
+
+    def calculate_micro_bom_cost(self, product_id, total_qty_mtr, max_lines=None):
+        """Explodes BOM to calculate exact material cost + risk buffer.
+
+        max_lines caps how many breakdown lines are formatted (None keeps them all).
+        """
+        unit = self._bom_unit_cost(product_id)
+
+        # Fallback if product not in master
+        if not unit:
+            return total_qty_mtr * 1500, total_qty_mtr * 2.5, ["Product Master Missing - Using Estimate"][:max_lines], 0, 0
+
+        weight_per_m, bom, base_rate = unit
+        mat_cost_total = 0
+        risk_buffer_total = 0
+        breakdown = []
+
         if bom:
-            for item in bom:
-                mat_id = item.get('material_id')
-                qty_per_meter = float(item.get('quantity', 0))
-                
-                # Lookup Material
-                mat = next((m for m in self.db["MATERIALS"] if m['material_id'] == mat_id), None)
-                if mat:
-                    base_rate = mat.get('base_cost_per_unit', 0)
-                    mkt_factor = mat.get('current_market_factor', 1.0)
-                    final_rate = base_rate * mkt_factor
-                    
-                    line_cost = qty_per_meter * final_rate * total_qty_mtr
-                    mat_cost_total += line_cost
-                    
-                    # Volatility Check
-                    if mat.get('volatility_risk_level') == 'High':
-                        risk_val = line_cost * self.config["FINANCIAL"]["HEDGING_BUFFER_PCT"]
-                        risk_buffer_total += risk_val
-                        breakdown.append(f"   - {mat.get('material_name')}: {qty_per_meter} units/m (High Volatility Risk +{int(risk_val)})")
-                    else:
-                        breakdown.append(f"   - {mat.get('material_name')}: {qty_per_meter} units/m @ {final_rate:.2f}")
+            if njit is not None:
+                mat_cost_total, risk = _bom_cost_kernel(bom['cost_per_m'], bom['high_vol'], total_qty_mtr, self.hedging_pct)
+                if bom['any_vol']:
+                    risk_buffer_total = risk
+            else:
+                line_cost = bom['cost_per_m'] * total_qty_mtr
+                mat_cost_total = line_cost.sum().item()
+
+                # Volatility Check
+                risk_vals = line_cost[bom['high_vol']] * self.hedging_pct
+                if risk_vals.size:
+                    risk_buffer_total = risk_vals.sum().item()
+
+            for text, cost_per_m, is_volatile in zip(bom['texts'][:max_lines], bom['cost_per_m'].tolist(), bom['high_vol'].tolist()):
+                if is_volatile:
+                    breakdown.append(f"{text} (High Volatility Risk +{int(cost_per_m * total_qty_mtr * self.hedging_pct)})")
                 else:
-                    # Fallback if material not found in DB
-                    fallback_cost = qty_per_meter * 500 * total_qty_mtr
-                    mat_cost_total += fallback_cost
-                    breakdown.append(f"   - {item.get('material_id')}: Unknown Material (Used Fallback ₹500/unit)")
+                    breakdown.append(text)
         else:
              # Commercial fallback (No BOM found)
-             base_rate = prod.get('commercial', {}).get('base_manufacturing_cost', 1000)
              mat_cost_total = base_rate * total_qty_mtr
              breakdown.append(f"  > ⚠️ NO BOM FOUND. Applied Base Rate: {base_rate}/m")
         
@@ -158,28 +366,31 @@ class PricingEngine:
         # SAFETY CHECK: Ultra Low Cost Alert
         if mat_cost_total < 1000:
             breakdown.append("  > ⚠️ CRITICAL: Material Cost is near zero. Bid likely invalid.")
+        if max_lines is not None:
+            del breakdown[max_lines:]
 
         # Factory Overhead
-        mfg_overhead = mat_cost_total * self.config["OPERATIONAL"]["FACTORY_OVERHEAD_RATE"]
+        mfg_overhead = mat_cost_total * self.overhead_rate
         
         # Weight Calculation (Critical for Logistics)
-        weight_per_km = prod.get('performance_data', {}).get('approx_weight_kg_km', 1000)
-        total_weight_kg = (weight_per_km / 1000) * total_qty_mtr
+        total_weight_kg = weight_per_m * total_qty_mtr
 
         total_mfg_cost = mat_cost_total + mfg_overhead + risk_buffer_total
         
         return total_mfg_cost, total_weight_kg, breakdown, risk_buffer_total, mfg_overhead
 
-    def analyze_factory_load(self, product_id):
-        """Determines Scarcity Premium or Idle Discount based on production schedule."""
-        category = "HV" if "33KV" in str(product_id).upper() else "LT"
+    def analyze_factory_load(self, product_id, category=None):
+        """Determines Scarcity Premium or Idle Discount based on production schedule.
+
+        Pass `category` ("HV" / "LT") when the caller has already classified the product id.
+        """
+        if category is None:
+            category = "HV" if "33KV" in str(product_id).upper() else "LT"
         
-        # Filter relevant lines from factory schedule
-        relevant_batches = [b for b in self.db["FACTORY"] if category in b.get('production_line_id', '')]
-        if not relevant_batches: 
+        # Averaged once per category (see refresh_factory_cache)
+        avg_util = self._avg_util.get(category)
+        if avg_util is None: 
             return 0.0, "Standard Capacity Load"
-
-        avg_util = sum(b['utilization_percent'] for b in relevant_batches) / len(relevant_batches)
         
         if avg_util > 90:
             return self.config["OPERATIONAL"]["OVERLOAD_PREMIUM"], f"Factory Overload ({avg_util:.1f}%) - Scarcity Premium (+5%) Generated"
@@ -190,32 +401,15 @@ class PricingEngine:
 
     def determine_logistics_zone(self, location_name):
         """Maps a location string to a specific Logistics Zone from the Master."""
-        loc_lower = str(location_name).lower()
-        best_zone = None
-        
-        keywords = {
-            "hilly": "Hilly", "mountain": "Hilly", "remote": "Hilly",
-            "coastal": "Coastal", "port": "Coastal", "sea": "Coastal",
-            "desert": "Desert", "rajasthan": "Desert", "kutch": "Desert",
-            "island": "Island", "andaman": "Island",
-            "urban": "Urban", "city": "Urban", "metro": "Urban"
-        }
-        
-        detected_type = "Plains_Highway" # Default
-        for k, v in keywords.items():
-            if k in loc_lower:
-                detected_type = v
-                break
-        
-        for zone in self.db["LOGISTICS"]:
-            if detected_type.lower() in zone['zone_type'].lower():
-                best_zone = zone
-                break
-        
-        if not best_zone:
-            best_zone = next((z for z in self.db["LOGISTICS"] if z['zone_code'] == "Z-01"), None)
-            
-        return best_zone
+        if self._zone_ac is not None:
+            hits = [i for _, i in self._zone_ac.iter(str(location_name).lower())]
+        else:
+            hits = [self._zone_priority[m.group(1).lower()] for m in self._ZONE_RE.finditer(str(location_name))]
+
+        if hits:
+            return self._zone_list[min(hits)]
+
+        return self.default_zone # Plains_Highway (or Z-01)
 
     def calculate_logistics(self, weight_kg, distance_km, location_name):
         """Calculates freight using Zone-Specific rates and surcharges."""
@@ -233,9 +427,10 @@ class PricingEngine:
         total_freight = base_freight * surcharge
         
         # Add Surcharges
-        fuel = total_freight * self.config["LOGISTICS"]["FUEL_SURCHARGE_PCT"]
-        insurance = (total_freight * 100) * self.config["LOGISTICS"]["INSURANCE_PCT"] # Estimating value base
-        handling = tons * self.config["LOGISTICS"]["HANDLING_PER_TON"]
+        logistics_cfg = self.config["LOGISTICS"]
+        fuel = total_freight * logistics_cfg["FUEL_SURCHARGE_PCT"]
+        insurance = (total_freight * 100) * logistics_cfg["INSURANCE_PCT"] # Estimating value base
+        handling = tons * logistics_cfg["HANDLING_PER_TON"]
         
         final_logistics = total_freight + fuel + insurance + handling
 
@@ -244,7 +439,8 @@ class PricingEngine:
 
     def analyze_financials(self, client_name, total_value):
         """Calculates Cost of Capital based on Credit Days and Loyalty Status."""
-        client = next((c for c in self.db["CLIENTS"] if c['client_name'].lower() in str(client_name).lower()), None)
+        client_lower = str(client_name).lower()
+        client = next((c for name_lower, c in self.clients_by_name_lower if name_lower in client_lower), None)
         
         credit_days = 30
         loyalty_disc = 0.0
@@ -277,33 +473,18 @@ class PricingEngine:
         max_impact = 0.0
         
         for comp_input in competitor_codes:
-            rival = next((c for c in self.db["COMPETITORS"] if c['name'].lower() in str(comp_input).lower() or c['competitor_id'] == comp_input), None)
+            rival = self.competitors_by_id.get(comp_input) if isinstance(comp_input, str) else None
+            if not rival:
+                comp_lower = str(comp_input).lower()
+                rival = next((c for name_lower, c in self.competitor_names if name_lower in comp_lower), None)
             
-            if rival:
-                try:
-                    aggression = float(rival['pricing_intelligence']['aggression_score'])
-                    win_rate = float(rival['performance_metrics'].get('win_rate_against_us', 0))
-                    
-                    impact = 0.0
-                    note = ""
-                    
-                    if aggression >= 8:
-                        impact = 0.03
-                        note = f"Price War Alert: {rival['name']} (Aggressive) -> -3% Margin"
-                    elif win_rate > 0.6:
-                        impact = 0.02
-                        note = f"High Threat: {rival['name']} (High Win Rate) -> -2% Margin"
-                    elif "Tier-3" in rival.get('tier', ''):
-                        impact = 0.04
-                        note = f"Low-Cost Rival: {rival['name']} -> -4% Margin"
-                        
-                    if impact > 0:
-                        reasons.append(note)
-                        # Keep track of the SINGLE biggest drop needed to survive
-                        if impact > max_impact:
-                            max_impact = impact
-                            
-                except: continue
+            rule = self._rival_rule.get(rival['competitor_id']) if rival else None
+            if rule:
+                impact, note = rule
+                reasons.append(note)
+                # Keep track of the SINGLE biggest drop needed to survive
+                if impact > max_impact:
+                    max_impact = impact
         
         # Apply the worst-case scenario (not the sum)
         # We add a small 'Market Pressure' buffer if multiple rivals exist (0.5% per extra rival)
@@ -423,6 +604,12 @@ class PricingEngine:
 # 4. AUDIT REPORT GENERATOR (PDF)
 # ==============================================================================
 class AdvancedAuditPDF(FPDF):
+    def normalize_text(self, text):
+        """Core fonts only cover latin-1: unencodable characters (e.g. emoji in strategy notes) print as '?' instead of failing the render."""
+        if not self.is_ttf_font and self.core_fonts_encoding:
+            text = text.encode(self.core_fonts_encoding, errors="replace").decode(self.core_fonts_encoding)
+        return super().normalize_text(text)
+
     def header(self):
         self.set_font('Arial', 'B', 16)
         self.set_text_color(0, 51, 102) # Navy Blue
@@ -448,6 +635,12 @@ class AdvancedAuditPDF(FPDF):
         self.cell(140, 6, label, "B", 0)
         self.cell(50, 6, value, "B", 1, 'R')
 
+    def add_rows(self, rows):
+        """Batch of add_row() calls: (label, value) or (label, value, is_bold) tuples."""
+        add_row = self.add_row
+        for row in rows:
+            add_row(*row)
+
     def add_product_block(self, item):
         self.set_font('Arial', 'B', 10)
         self.set_fill_color(245, 245, 245)
@@ -470,10 +663,80 @@ class AdvancedAuditPDF(FPDF):
 # 5. REAL PRICING AGENT (Orchestrator wrapper)
 # ==============================================================================
 class RealPricingAgent:
+    # Shared by every agent instance (one is created per RFP run)
+    _pdf_pool = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="audit-pdf")
+    # Latest render per report file; an older render that finishes late never replaces a newer one
+    _pdf_generation = {}
+    _pdf_lock = threading.Lock()
+
     def __init__(self):
         self.db = Database()
         self.brain = PricingEngine(self.db.data)
-        
+
+    def _render_pdf(self, pdf_path, generation, *, rfp_id, client_name, delivery_loc, zone_name, product_breakdowns,
+                    dist_km, total_weight_all, log_cost, log_formula, credit_days, fin_cost,
+                    full_cost_base, target_margin, strategy_notes, final_margin, bid_value):
+        """Builds the audit PDF (worker thread). Written to a .tmp file and renamed, so readers never see a partial PDF."""
+        tmp_path = pdf_path.with_name(f"{pdf_path.name}.{threading.get_ident()}.tmp")
+        try:
+            pdf = AdvancedAuditPDF()
+            pdf.add_page()
+            
+            pdf.section_header("1. PROJECT & CLIENT IDENTITY")
+            pdf.add_rows([
+                ("RFP Reference", str(rfp_id)),
+                ("Client Name", str(client_name)[:40]),
+                ("Destination", f"{delivery_loc} ({zone_name})")
+            ])
+            pdf.ln(5)
+
+            pdf.section_header("2. PRODUCT-WISE COST BREAKDOWN")
+            for p_item in product_breakdowns:
+                pdf.add_product_block(p_item)
+            
+            pdf.ln(5)
+            pdf.section_header("3. LOGISTICS & FINANCIALS")
+            pdf.add_row(f"Logistics ({dist_km}km, {total_weight_all/1000:.1f}T)", f"INR {log_cost:,.0f}")
+            pdf.set_font('Arial', 'I', 8); pdf.cell(0, 5, f"Formula: {log_formula}", 0, 1)
+            pdf.add_row(f"Cost of Capital ({credit_days} Days)", f"INR {fin_cost:,.0f}")
+            pdf.ln(2)
+            pdf.add_row("FULL COST BASE", f"INR {full_cost_base:,.0f}", is_bold=True)
+            pdf.ln(5)
+
+            pdf.section_header("4. STRATEGIC MARGIN BUILD-UP")
+            pdf.add_row("Base Target Margin", f"{target_margin*100}%")
+            if strategy_notes:
+                pdf.set_font('Arial', 'I', 9)
+                pdf.multi_cell(0, 5, "\n".join(f"  > {note}" for note in strategy_notes), 0, 'L', new_x="LMARGIN", new_y="NEXT")
+            pdf.ln(2)
+            pdf.add_row("FINAL NET MARGIN", f"{final_margin*100:.1f}%", is_bold=True)
+            
+            pdf.ln(10)
+            pdf.set_fill_color(0, 0, 0)
+            pdf.set_text_color(255, 255, 255)
+            pdf.set_font('Arial', 'B', 14)
+            pdf.cell(140, 12, " FINAL BID SUBMISSION VALUE", 1, 0, 'C', 1)
+            pdf.cell(50, 12, f" INR {bid_value:,.0f} ", 1, 1, 'R', 1)
+
+            pdf_path.parent.mkdir(parents=True, exist_ok=True)
+            pdf.output(str(tmp_path))
+            with self._pdf_lock:
+                if self._pdf_generation.get(pdf_path.name) == generation:
+                    os.replace(tmp_path, pdf_path)
+                    return
+            tmp_path.unlink() # superseded by a newer re-price of this RFP
+            
+        except Exception as e:
+            print(f"PDF Gen Error: {e}")
+            # Never leave an older report for this RFP behind the returned URL
+            with self._pdf_lock:
+                current = self._pdf_generation.get(pdf_path.name) == generation
+            for stale in (tmp_path, pdf_path) if current else (tmp_path,):
+                try:
+                    stale.unlink()
+                except FileNotFoundError:
+                    pass
+
     def process_pricing(self, rfp_record):
         # Extract inputs from RFP Record
         rfp_id = rfp_record.get('rfp_unique_id')
@@ -500,19 +763,47 @@ class RealPricingAgent:
         audit_lines = []
         product_breakdowns = []
         
+        # Required tests resolved once per RFP: (base_cost, is_per_drum, label)
+        # Logic:
+        # Routine Tests: Performed on every drum/length -> Multiply by Quantity/KM
+        # Type Tests: Performed once per Lot/Design -> Fixed Cost (breakdown line pre-rendered)
+        required_tests = tech_out.get('required_test_codes', [])
+        resolved_tests = []
+        for t_code in (required_tests or []):
+            test_obj = self.brain.tests_by_id.get(t_code)
+            if test_obj:
+                c = test_obj.get('base_test_cost', 0)
+                cat = test_obj.get('test_category', 'Type Test')
+                if "Routine" in cat or "Acceptance" in cat:
+                    resolved_tests.append((c, True, test_obj['test_name'][:20]))
+                else:
+                    resolved_tests.append((c, False, f"- {test_obj['test_name'][:20]} (Lot): {c:,.0f}"))
+
+        # Loop-invariant config and bound methods, read once per RFP
+        bom_cost = self.brain.calculate_micro_bom_cost
+        steel_drum_cost = self.brain.config["PACKAGING"]["STEEL_DRUM_COST"]
+        wooden_drum_cost = self.brain.config["PACKAGING"]["WOODEN_DRUM_COST"]
+        hv_test_cost = self.brain.config["TESTING"]["HV_BASE_COST"]
+        lv_test_cost = self.brain.config["TESTING"]["LV_BASE_COST"]
+        drum_cost_by_heavy = {True: steel_drum_cost, False: wooden_drum_cost}
+        first_category = None # Factory-load proxy: category of the first item
+
         # --- A. DETAILED COSTING ---
         for item in items:
             pid = item.get('matched_sku_id', 'UNKNOWN')
+            pid_str = str(pid)
+            pid_is_hv = "33KV" in pid_str.upper()
+            if first_category is None:
+                first_category = "HV" if pid_is_hv else "LT"
             # CLEAN QUANTITY (Handle "5000 Meters" etc)
             raw_qty = str(item.get('quantity') or 0)
-            import re
-            qty_clean = re.findall(r"[\d\.]+", raw_qty)
-            qty = float(qty_clean[0]) if qty_clean else 0.0
+            qty_clean = QTY_RE.search(raw_qty)
+            qty = float(qty_clean.group()) if qty_clean else 0.0
             
             if qty == 0: qty = 1000.0 # Safety default only if truly 0
             
             # 1. Material (Micro-BOM)
-            mfg, wt, breakdown, risk, oh = self.brain.calculate_micro_bom_cost(pid, qty)
+            mfg, wt, breakdown, risk, oh = bom_cost(pid, qty, max_lines=2)
             total_mfg += mfg
             total_weight_all += wt
             
@@ -522,63 +813,50 @@ class RealPricingAgent:
             try:
                 # Use Tech Agent's extracted 'cross_section_sqmm' if available in item, else infer from PID
                 sqmm = 0
-                if '400' in str(pid): sqmm = 400
-                elif '300' in str(pid): sqmm = 300
-                elif '185' in str(pid): sqmm = 185
-                elif '95' in str(pid): sqmm = 95
+                if '400' in pid_str: sqmm = 400
+                elif '300' in pid_str: sqmm = 300
+                elif '185' in pid_str: sqmm = 185
+                elif '95' in pid_str: sqmm = 95
                 else: sqmm = 50 # Default small
 
                 # Drum Selection
                 # Standard Drum: 500m of large cable or 1000m of small cable
                 capacity_per_drum = 500 if sqmm > 150 else 1000
-                drums = math.ceil(qty / capacity_per_drum)
+                drums = int(-(-qty // capacity_per_drum)) # ceil division
                 
                 # Steel vs Wooden
                 # HV (33KV) or Heavy cables (>240sqmm) use Steel
-                is_heavy = sqmm >= 240 or "33KV" in str(pid).upper()
-                drum_cost_unit = self.brain.config["PACKAGING"]["STEEL_DRUM_COST"] if is_heavy else self.brain.config["PACKAGING"]["WOODEN_DRUM_COST"]
+                is_heavy = sqmm >= 240 or pid_is_hv
                 
-                p_cost = drums * drum_cost_unit
+                p_cost = drums * drum_cost_by_heavy[is_heavy]
                 total_pkg += p_cost
             except:
                 # Fallback
-                drums = math.ceil(qty / 500)
-                p_cost = drums * self.brain.config["PACKAGING"]["WOODEN_DRUM_COST"]
+                drums = int(-(-qty // 500))
+                p_cost = drums * wooden_drum_cost
                 total_pkg += p_cost
 
             # 3. Testing (Quantity-Based Logic)
             t_cost = 0
             t_breakdown = []
             
-            required_tests = tech_out.get('required_test_codes', [])
-            
             if required_tests:
-                for t_code in required_tests:
-                    test_obj = next((t for t in self.db.data["TESTS"] if t['test_id'] == t_code), None)
-                    if test_obj:
-                        c = test_obj.get('base_test_cost', 0)
-                        cat = test_obj.get('test_category', 'Type Test')
-                        
-                        # Logic:
-                        # Routine Tests: Performed on every drum/length -> Multiply by Quantity/KM
-                        # Type Tests: Performed once per Lot/Design -> Fixed Cost
+                for c, per_drum, label in resolved_tests:
+                    if per_drum:
+                        # Routine tests usually per Drum or per KM.
+                        # Let's assume per Drum for physical tests, per KM for electrical.
+                        # Hybrid approach: Multiply by drums (batch count)
+                        line_t_cost = c * drums
+                        t_breakdown.append(f"- {label} (x{drums}): {line_t_cost:,.0f}")
+                    else:
+                        # Type Test (One-time)
+                        line_t_cost = c
+                        t_breakdown.append(label)
                         
-                        if "Routine" in cat or "Acceptance" in cat:
-                            # Routine tests usually per Drum or per KM.
-                            # Let's assume per Drum for physical tests, per KM for electrical.
-                            # Hybrid approach: Multiply by drums (batch count)
-                            line_t_cost = c * drums
-                            t_breakdown.append(f"- {test_obj['test_name'][:20]} (x{drums}): {line_t_cost:,.0f}")
-                        else:
-                            # Type Test (One-time)
-                            line_t_cost = c
-                            t_breakdown.append(f"- {test_obj['test_name'][:20]} (Lot): {line_t_cost:,.0f}")
-                            
-                        t_cost += line_t_cost
+                    t_cost += line_t_cost
             else:
                 # Fallback Estimate
-                is_hv = "33KV" in str(pid).upper()
-                base_c = self.brain.config["TESTING"]["HV_BASE_COST"] if is_hv else self.brain.config["TESTING"]["LV_BASE_COST"]
+                base_c = hv_test_cost if pid_is_hv else lv_test_cost
                 # Scale routine part by km
                 t_cost = base_c + (500 * (qty/1000)) # Base + 500/km variable
                 t_breakdown.append(f"- Est Standard Tests: {t_cost:,.0f}")
@@ -593,7 +871,7 @@ class RealPricingAgent:
                 "test": t_cost,
                 "test_breakdown": t_breakdown
             })
-            audit_lines.extend(breakdown[:2])
+            audit_lines.extend(breakdown)
 
         # 4. Logistics
         log_cost, log_formula, log_risk_pct, zone_name = self.brain.calculate_logistics(total_weight_all, dist_km, delivery_loc)
@@ -609,7 +887,7 @@ class RealPricingAgent:
         
         # 1. Factory Load (Use first item as proxy)
         first_pid = items[0].get('matched_sku_id') if items else "UNKNOWN"
-        fact_adj_pct, fact_reason = self.brain.analyze_factory_load(first_pid) 
+        fact_adj_pct, fact_reason = self.brain.analyze_factory_load(first_pid, first_category)
         if fact_adj_pct != 0: strategy_notes.append(fact_reason)
         
         # 2. Financials
@@ -634,17 +912,19 @@ class RealPricingAgent:
             strategy_notes.append(f"Zone Risk ({zone_name}): +{log_risk_pct*100}%")
 
         # --- C. FINAL PRICE CALCULATION ---
-        target_margin = self.brain.config["FINANCIAL"]["TARGET_NET_MARGIN"]
+        financial_cfg = self.brain.config["FINANCIAL"]
+        target_margin = financial_cfg["TARGET_NET_MARGIN"]
+        min_margin = financial_cfg["MIN_SURVIVAL_MARGIN"]
         
         # Apply Adjustments
         final_margin = target_margin + fact_adj_pct + loy_disc + comp_adj + log_risk_pct + cont_adj
-        if final_margin < self.brain.config["FINANCIAL"]["MIN_SURVIVAL_MARGIN"]:
-            final_margin = self.brain.config["FINANCIAL"]["MIN_SURVIVAL_MARGIN"]
+        if final_margin < min_margin:
+            final_margin = min_margin
             strategy_notes.append("EMERGENCY: Margin Floor Hit (Survival Mode)")
 
         full_cost_base = base_cost + fin_cost
         bid_value = full_cost_base * (1 + final_margin)
-        gst_val = bid_value * self.brain.config["FINANCIAL"]["GST_RATE"] # GST on top
+        gst_val = bid_value * financial_cfg["GST_RATE"] # GST on top
 
         # --- D. MONTE CARLO SIMULATION (Advanced Tech) ---
         # "100 Steps Ahead" - Simulate 100 Futures
@@ -653,53 +933,27 @@ class RealPricingAgent:
 
 
         # --- D. PDF REPORT ---
-        report_url = "#"
-        try:
-            pdf = AdvancedAuditPDF()
-            pdf.add_page()
-            
-            pdf.section_header("1. PROJECT & CLIENT IDENTITY")
-            pdf.add_row("RFP Reference", str(rfp_id))
-            pdf.add_row("Client Name", str(client_name)[:40])
-            pdf.add_row("Destination", f"{delivery_loc} ({zone_name})")
-            pdf.ln(5)
-
-            pdf.section_header("2. PRODUCT-WISE COST BREAKDOWN")
-            for p_item in product_breakdowns:
-                pdf.add_product_block(p_item)
-            
-            pdf.ln(5)
-            pdf.section_header("3. LOGISTICS & FINANCIALS")
-            pdf.add_row(f"Logistics ({dist_km}km, {total_weight_all/1000:.1f}T)", f"INR {log_cost:,.0f}")
-            pdf.set_font('Arial', 'I', 8); pdf.cell(0, 5, f"Formula: {log_formula}", 0, 1)
-            pdf.add_row(f"Cost of Capital ({credit_days} Days)", f"INR {fin_cost:,.0f}")
-            pdf.ln(2)
-            pdf.add_row("FULL COST BASE", f"INR {full_cost_base:,.0f}", is_bold=True)
-            pdf.ln(5)
-
-            pdf.section_header("4. STRATEGIC MARGIN BUILD-UP")
-            pdf.add_row("Base Target Margin", f"{target_margin*100}%")
-            for note in strategy_notes:
-                pdf.set_font('Arial', 'I', 9)
-                pdf.cell(0, 5, f"  > {note}", 0, 1)
-            pdf.ln(2)
-            pdf.add_row("FINAL NET MARGIN", f"{final_margin*100:.1f}%", is_bold=True)
-            
-            pdf.ln(10)
-            pdf.set_fill_color(0, 0, 0)
-            pdf.set_text_color(255, 255, 255)
-            pdf.set_font('Arial', 'B', 14)
-            pdf.cell(140, 12, " FINAL BID SUBMISSION VALUE", 1, 0, 'C', 1)
-            pdf.cell(50, 12, f" INR {bid_value:,.0f} ", 1, 1, 'R', 1)
-
-            static_dir = BASE_DIR / "static" / "audit_reports"
-            static_dir.mkdir(parents=True, exist_ok=True)
-            pdf_name = f"{rfp_id}_AUDIT.pdf"
-            pdf.output(str(static_dir / pdf_name))
-            report_url = f"/static/audit_reports/{pdf_name}"
-            
-        except Exception as e:
-            print(f"PDF Gen Error: {e}")
+        # Rendered off the request path; the URL is known up front and the file appears once written.
+        # The previous run's report is removed first, so a re-price never links outdated numbers.
+        static_dir = BASE_DIR / "static" / "audit_reports"
+        pdf_name = f"{rfp_id}_AUDIT.pdf"
+        pdf_path = static_dir / pdf_name
+        with self._pdf_lock:
+            generation = self._pdf_generation.get(pdf_name, 0) + 1
+            self._pdf_generation[pdf_name] = generation
+            try:
+                pdf_path.unlink()
+            except FileNotFoundError:
+                pass
+        self._pdf_pool.submit(
+            self._render_pdf, pdf_path, generation,
+            rfp_id=rfp_id, client_name=client_name, delivery_loc=delivery_loc, zone_name=zone_name,
+            product_breakdowns=product_breakdowns, dist_km=dist_km, total_weight_all=total_weight_all,
+            log_cost=log_cost, log_formula=log_formula, credit_days=credit_days, fin_cost=fin_cost,
+            full_cost_base=full_cost_base, target_margin=target_margin, strategy_notes=list(strategy_notes),
+            final_margin=final_margin, bid_value=bid_value
+        )
+        report_url = f"/static/audit_reports/{pdf_name}"
 
         return {
             "status": "Success",
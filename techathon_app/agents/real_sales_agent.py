@@ -5,18 +5,44 @@ import math
 import time
 import uuid
 from pathlib import Path
+from types import MappingProxyType
 from datetime import datetime, timezone
-from PyPDF2 import PdfReader
 from dotenv import load_dotenv
 
+from .json_io import read_json_file
+
+# Optional fast PDF text extraction (falls back to PyPDF2)
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+    from PyPDF2 import PdfReader
+
 # Optional SDK import
 try:
     import google.generativeai as genai
+    from google.api_core import exceptions as google_exceptions
 except ImportError:
     genai = None
+    google_exceptions = None
 
 load_dotenv()
 
+PROMPT_TEXT_LIMIT = 30000   # Only this much PDF text reaches the LLM prompt
+PDF_TIME_BUDGET_S = 30      # Stop extracting pages once this much wall time is spent
+KEY_COOLDOWN_S = 60         # Rest a key this long after a quota / rate-limit error
+
+MISSING_VALUES = (None, "", [])
+EMPTY = MappingProxyType({})
+
+def fill_fields(src, keys):
+    """Template keys in order, taking src values unless missing (-> "NOT SPECIFIED")."""
+    out = {}
+    for k in keys:
+        v = src.get(k)
+        out[k] = v if v not in MISSING_VALUES else "NOT SPECIFIED"
+    return out
+
 class RealSalesAgent:
     def __init__(self, settings_path="settings.json"):
         # 1. Setup Paths
@@ -29,6 +55,8 @@ class RealSalesAgent:
         # 2. Load API Keys
         self.api_keys = self.load_api_keys()
         self.current_key_index = 0
+        # Per-key health: 429 -> cooldown, invalid key -> dead; 'uses' drives least-used selection
+        self._key_state = [{"cooldown_until": 0.0, "dead": False, "uses": 0} for _ in self.api_keys]
 
         if self.api_keys:
             self._configure_genai()
@@ -42,6 +70,21 @@ class RealSalesAgent:
 
         # 4. Load Logistic Zones
         self.zones = self.load_logistic_zones()
+        self._zone_by_code = {}
+        for z in self.zones:
+            self._zone_by_code.setdefault(z['zone_code'], z)
+
+        # 5. Static prompt parts, built once (only the PDF text changes per RFP)
+        self._template = self.build_example_json()
+        self._prompt_prefix = self.build_prompt_prefix()
+
+        # Template field names per section, in output order
+        sales_tmpl = self._template["sales_agent_output"]
+        self._tracker_keys = tuple(self._template["processing_stage_tracker"])
+        self._summary_keys = tuple(sales_tmpl["summary"])
+        self._logistics_keys = tuple(sales_tmpl["logistics_constraints"])
+        self._commercial_keys = tuple(sales_tmpl["commercial_terms"])
+        self._ta_keys = tuple(sales_tmpl["line_items_extracted"][0]["technical_attributes"])
 
     def load_api_keys(self):
         keys = []
@@ -60,27 +103,54 @@ class RealSalesAgent:
             except Exception as e:
                 print(f"⚠️ genai.configure() failed: {e}")
 
+    def live_key_count(self):
+        return sum(1 for st in self._key_state if not st["dead"])
+
     def rotate_api_key(self):
+        """Switch to the least-used healthy key; if all are cooling down, the one that frees up first."""
         if not self.api_keys: return
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
+        now = time.time()
+        n = len(self.api_keys)
+        # Scan starting after the current key so ties keep round-robin order
+        order = [(self.current_key_index + step) % n for step in range(1, n + 1)]
+        alive = [i for i in order if not self._key_state[i]["dead"]]
+        if not alive: return
+        ready = [i for i in alive if self._key_state[i]["cooldown_until"] <= now]
+        if ready:
+            self.current_key_index = min(ready, key=lambda i: self._key_state[i]["uses"])
+        else:
+            self.current_key_index = min(alive, key=lambda i: self._key_state[i]["cooldown_until"])
         print(f"🔑 Rotating to API Key #{self.current_key_index + 1}")
         self._configure_genai()
 
+    def _mark_key(self, index, *, cooldown=False, dead=False):
+        st = self._key_state[index]
+        if cooldown: st["cooldown_until"] = time.time() + KEY_COOLDOWN_S
+        if dead: st["dead"] = True
+
+    def _is_invalid_key_error(self, e, err_str):
+        """Only a rejected credential (401 Unauthenticated / API_KEY_INVALID) disables a key for good."""
+        if google_exceptions is not None and isinstance(e, google_exceptions.Unauthenticated):
+            return True
+        return "api_key_invalid" in err_str or "api key not valid" in err_str
+
+    def _key_is_ready(self, index):
+        st = self._key_state[index]
+        return not st["dead"] and st["cooldown_until"] <= time.time()
+
     def load_settings(self):
         if self.settings_path.exists():
             try:
-                with open(self.settings_path, 'r') as f:
-                    data = json.load(f)
-                    log_conf = data.get("logistics_config", {})
-                    self.factory_lat = float(log_conf.get("factory_lat", 21.1702))
-                    self.factory_lon = float(log_conf.get("factory_lon", 72.8311))
+                data = read_json_file(self.settings_path)
+                log_conf = data.get("logistics_config", {})
+                self.factory_lat = float(log_conf.get("factory_lat", 21.1702))
+                self.factory_lon = float(log_conf.get("factory_lon", 72.8311))
             except Exception: pass
 
     def load_logistic_zones(self):
         try:
             if self.logistic_master_path.exists():
-                with open(self.logistic_master_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                return read_json_file(self.logistic_master_path)
         except Exception:
             return []
         return []
@@ -97,16 +167,48 @@ class RealSalesAgent:
         except Exception:
             return 0
 
+    def _iter_page_texts(self, file_path):
+        if pdfium is not None:
+            pdf = pdfium.PdfDocument(file_path)
+            try:
+                for i in range(len(pdf)):
+                    page = pdf[i]
+                    try:
+                        textpage = page.get_textpage()
+                        try:
+                            # extract_pdf_text may close the generator here; finally still releases the page
+                            yield textpage.get_text_range()
+                        finally:
+                            textpage.close()
+                    finally:
+                        page.close()
+            finally:
+                pdf.close()
+        else:
+            for page in PdfReader(file_path).pages:
+                yield page.extract_text()
+
     def extract_pdf_text(self, file_path):
+        # Stops early once the prompt limit is filled or the time budget runs out
+        pages = None
         try:
-            reader = PdfReader(file_path)
+            pages = self._iter_page_texts(file_path)
             texts = []
-            for page in reader.pages:
-                t = page.extract_text() or ""
-                if t: texts.append(t)
+            size = 0
+            deadline = time.perf_counter() + PDF_TIME_BUDGET_S
+            for n, t in enumerate(pages, 1):
+                if t:
+                    texts.append(t)
+                    size += len(t) + 2
+                if size >= PROMPT_TEXT_LIMIT: break
+                if time.perf_counter() > deadline:
+                    print(f"⚠️ PDF time budget ({PDF_TIME_BUDGET_S}s) spent after {n} pages of {os.path.basename(file_path)}; remaining pages skipped.")
+                    break
             return "\n\n".join(texts)
         except Exception as e:
             return ""
+        finally:
+            if pages is not None: pages.close()
 
     def build_example_json(self):
         return {
@@ -165,9 +267,8 @@ class RealSalesAgent:
             }
         }
 
-    def prepare_prompt(self, pdf_text):
-        example = self.build_example_json()
-        example_str = json.dumps(example, indent=2)
+    def build_prompt_prefix(self):
+        example_str = json.dumps(self._template, indent=2)
         
         if self.zones:
             zone_desc = "\n".join([f"- {z['zone_code']}: {z['zone_type']} (Keywords: {z['zone_type'].replace('_', ' ')})" for z in self.zones])
@@ -201,10 +302,12 @@ Rules:
 2. Output JSON only — no markdown formatting, no comments.
 
 PDF Text:
-{pdf_text[:30000]}
 """
         return prompt
 
+    def prepare_prompt(self, pdf_text):
+        return f"{self._prompt_prefix}{pdf_text[:PROMPT_TEXT_LIMIT]}\n"
+
     def try_generate_with_models(self, prompt):
         if genai is None: raise RuntimeError("google.generativeai SDK not installed")
 
@@ -231,7 +334,9 @@ PDF Text:
             max_attempts = len(self.api_keys)
             
             while attempts < max_attempts:
+                key_index = self.current_key_index
                 try:
+                    self._key_state[key_index]["uses"] += 1
                     self._configure_genai() # Ensure current key is active
                     model = genai.GenerativeModel(model_name)
                     
@@ -250,10 +355,22 @@ PDF Text:
                     # CHECK FOR QUOTA / RATE LIMITS
                     if "429" in err_str or "quota" in err_str or "resourceexhausted" in err_str:
                         print(f"⏳ Quota Hit. Rotating key and retrying same model...")
+                        self._mark_key(key_index, cooldown=True)
                         self.rotate_api_key()
                         attempts += 1
-                        time.sleep(1) # Backoff
+                        if not self._key_is_ready(self.current_key_index):
+                            time.sleep(1) # Backoff only when no fresh key is left
                         continue # Retry same model with new key
+
+                    # INVALID / REVOKED KEY: never use it again, retry same model with another key
+                    if self._is_invalid_key_error(e, err_str):
+                        print(f"🚫 Key #{key_index + 1} rejected. Disabling it...")
+                        self._mark_key(key_index, dead=True)
+                        if not self.live_key_count():
+                            break
+                        self.rotate_api_key()
+                        attempts += 1
+                        continue
                     
                     # If it's NOT a quota error (e.g. Model Not Found, Internal Error), 
                     # break inner loop to try NEXT MODEL
@@ -291,13 +408,13 @@ PDF Text:
         return {}
 
     def sanitize_and_fill(self, parsed):
-        template = self.build_example_json()
+        template = self._template
 
         # 1. Processing Tracker
         processing = template["processing_stage_tracker"].copy()
-        parsed_proc = parsed.get("processing_stage_tracker") or {}
+        parsed_proc = parsed.get("processing_stage_tracker") or EMPTY
         if isinstance(parsed_proc, dict):
-            for k in processing.keys():
+            for k in self._tracker_keys:
                 v = parsed_proc.get(k)
                 if v: processing[k] = v
 
@@ -310,21 +427,14 @@ PDF Text:
         }
 
         # 2. Extract Sales Output Sections
-        p_sales = parsed.get("sales_agent_output") or {}
+        p_sales = parsed.get("sales_agent_output") or EMPTY
 
         # -- Summary --
-        summary = {}
-        for k in template["sales_agent_output"]["summary"].keys():
-            val = (p_sales.get("summary") or {}).get(k)
-            summary[k] = val if val not in (None, "", []) else "NOT SPECIFIED"
+        summary = fill_fields(p_sales.get("summary") or EMPTY, self._summary_keys)
 
         # -- Logistics (With Distance Calc) --
-        logistics = {}
-        p_log = p_sales.get("logistics_constraints") or {}
-        
-        for k in template["sales_agent_output"]["logistics_constraints"].keys():
-            val = p_log.get(k)
-            logistics[k] = val if val not in (None, "", []) else "NOT SPECIFIED"
+        p_log = p_sales.get("logistics_constraints") or EMPTY
+        logistics = fill_fields(p_log, self._logistics_keys)
 
         dest_coords = p_log.get("delivery_coordinates")
         distance = 0
@@ -340,7 +450,7 @@ PDF Text:
         logistics["factory_coordinates"] = {"lat": self.factory_lat, "lon": self.factory_lon}
 
         detected_code = logistics.get("zone_code", "Z-01")
-        valid_zone = next((z for z in self.zones if z['zone_code'] == detected_code), None)
+        valid_zone = self._zone_by_code.get(detected_code) if isinstance(detected_code, str) else None
         if valid_zone:
             logistics['zone_type'] = valid_zone['zone_type']
         else:
@@ -348,10 +458,7 @@ PDF Text:
             logistics['zone_type'] = "Plains_Highway"
 
         # -- Commercial --
-        commercial = {}
-        for k in template["sales_agent_output"]["commercial_terms"].keys():
-            val = (p_sales.get("commercial_terms") or {}).get(k)
-            commercial[k] = val if val not in (None, "", []) else "NOT SPECIFIED"
+        commercial = fill_fields(p_sales.get("commercial_terms") or EMPTY, self._commercial_keys)
 
         # -- Line Items (Deep Fill) --
         final_items = []
@@ -360,12 +467,7 @@ PDF Text:
             for i, item in enumerate(raw_items, 1):
                 if not isinstance(item, dict): continue
                 
-                ta = item.get("technical_attributes") or {}
-                filled_ta = {}
-                template_ta = template["sales_agent_output"]["line_items_extracted"][0]["technical_attributes"]
-                for tk in template_ta.keys():
-                    tv = ta.get(tk)
-                    filled_ta[tk] = tv if tv not in (None, "", []) else "NOT SPECIFIED"
+                filled_ta = fill_fields(item.get("technical_attributes") or EMPTY, self._ta_keys)
 
                 lot = {
                     "lot_id": item.get("lot_id") or f"L{i:03d}",
@@ -400,4 +502,4 @@ PDF Text:
             return final_data
         except Exception as e:
             print(f"❌ Sales Agent Error: {e}")
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
@@ -1,9 +1,18 @@
-import json
 import os
 import re
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from .json_io import read_json_file
+
+# Optional JIT for the inventory scoring kernel (falls back to NumPy gathers)
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
 # ================= CONFIGURATION =================
 # Navigate up from 'agents' to 'final'
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -13,6 +22,53 @@ PRODUCT_MASTER_FILE = DB_DIR / "product_master_enriched.json"
 COMPETITORS_FILE = DB_DIR / "competitors.json"
 TEST_MASTER_FILE = DB_DIR / "test_master.json"
 
+# Normalization patterns, compiled once
+PAREN_RE = re.compile(r"\(.*?\)")         # "(Part-2)", "(Flexible)"
+COLON_YEAR_RE = re.compile(r":\d{4}")      # ":2011" edition suffix
+NUMBER_RE = re.compile(r"[\d\.]+")
+
+# Weights Configuration (Total 100), in scoring order
+SCORE_WEIGHTS = {
+    "voltage_grade": 20,
+    "core_count": 15,
+    "cross_section_sqmm": 15,
+    "conductor_material": 15,
+    "standards": 15, # Added Standards
+    "insulation": 10,
+    "sheath": 5,
+    "armour_type": 5
+}
+# (field, default when the SKU spec lacks it)
+SCORE_FIELDS = tuple((f, 0 if f == "core_count" else None) for f in SCORE_WEIGHTS)
+MAX_SCORE = float(sum(SCORE_WEIGHTS.values()))
+
+# Test applicability tags ("mandatory_for" criteria vs. item category)
+TAG_ALL, TAG_HT, TAG_LT, TAG_ARMOURED, TAG_FRLS = 1, 2, 4, 8, 16
+
+def score_kernel(pts, codes):
+    """score[j] = sum of pts[f, codes[f, j]] over fields f, added in SCORE_FIELDS order (exact, no fastmath)."""
+    n_fields, n_skus = codes.shape
+    score = np.zeros(n_skus)
+    for j in prange(n_skus):
+        s = 0.0
+        for f in range(n_fields):
+            s += pts[f, codes[f, j]]
+        score[j] = s
+    return score
+
+if njit is not None:
+    score_kernel = njit(cache=True, parallel=True)(score_kernel)
+
+def try_float(v):
+    try: return float(v)
+    except: return None
+
+def spec_key(v):
+    """Hashable, type-exact key for a raw spec value, so equal values are scored once."""
+    if isinstance(v, list): return (list, tuple(spec_key(x) for x in v))
+    if isinstance(v, dict): return (dict, tuple((k, spec_key(x)) for k, x in v.items()))
+    return (type(v), v)
+
 class RealTechAgent:
     def __init__(self):
         self.inventory = self.load_json(PRODUCT_MASTER_FILE)
@@ -34,18 +90,38 @@ class RealTechAgent:
             if isinstance(sku, dict)
         }
         
+        # Inverted index: SKU id -> competitors listing it as colliding (master order, once each)
+        self._sku_to_competitors = {}
+        if isinstance(self.competitors, list):
+            for comp in self.competitors:
+                for sku in dict.fromkeys(comp.get("colliding_internal_skus", [])):
+                    self._sku_to_competitors.setdefault(sku, []).append(comp)
+
+        # Test applicability tags, resolved once: (tag bits, test_id, base cost, is_routine)
+        self._test_tags = []
+        for test in (self.tests if isinstance(self.tests, list) else []):
+            criteria = test.get("mandatory_for", [])
+            criteria_str = str(criteria)
+            tags = TAG_ALL if "All Cables" in criteria else 0
+            if "HT Cables" in criteria_str: tags |= TAG_HT
+            if "LT Cables" in criteria_str: tags |= TAG_LT
+            if "Armoured Cables" in criteria_str: tags |= TAG_ARMOURED
+            if "FRLS" in criteria_str or "LSZH" in criteria_str: tags |= TAG_FRLS
+            self._test_tags.append((tags, test.get("test_id"), test.get("base_test_cost", 0), "Routine" in test.get("test_category", "")))
+
+        # Per-field SKU value codes: each distinct raw value is scored once per RFP item
+        self._build_score_table()
+
         # Load Settings
         try:
-            with open(BASE_DIR / "settings.json", "r") as f:
-                self.config = json.load(f).get("tech_config", {})
+            self.config = read_json_file(BASE_DIR / "settings.json").get("tech_config", {})
         except:
             self.config = {}
 
     def load_json(self, path):
         try:
             if path.exists():
-                with open(path, "r", encoding="utf-8") as f:
-                    return json.load(f)
+                return read_json_file(path)
         except Exception as e:
             print(f"⚠️ Tech Agent: Could not load {path.name}: {e}")
         return []
@@ -59,7 +135,7 @@ class RealTechAgent:
         # Remove qualifications like (Flexible), (Solid)
         n = self.normalize(v)
         if not n: return None
-        n = re.sub(r"\(.*?\)", "", n).strip()
+        n = PAREN_RE.sub("", n).strip()
         
         # 1. Exact Map
         mat_map = {"aluminum": "aluminium", "al": "aluminium", "alu": "aluminium", "cu": "copper", "copper": "copper", "aluminium": "aluminium"}
@@ -86,55 +162,58 @@ class RealTechAgent:
             return stripped.upper() == "NOT SPECIFIED" or stripped == ""
         return False
 
-    def normalize_standard(self, s):
-        if not s: return None
-        s = self.normalize(s)
-        s = re.sub(r"\(.*?\)", "", s)
-        s = re.sub(r":\d{4}", "", s)
-        return s.replace("part-", "part ").strip()
-
     # ================= MATCHING LOGIC (From main_code.py) =================
     # ================= SMART NORMALIZATION & MATCHING =================
     def normalize_standard(self, s):
         if not s: return None
         s = self.normalize(s)
-        s = re.sub(r"\(.*?\)", "", s)
-        s = re.sub(r":\d{4}", "", s)
+        s = PAREN_RE.sub("", s)
+        s = COLON_YEAR_RE.sub("", s)
         return s.replace("part-", "part ").strip()
 
     # ================= MATCHING LOGIC (Using Advanced Legacy Algorithms) =================
     
-    def match_cross_section(self, rfp_val, inv_val):
-        if self.is_not_specified(rfp_val): return 1.0 # Loose match
-        try:
-            r = float(rfp_val)
-            i = float(inv_val)
-        except: return 0.0
-        
+    def rfp_size(self, rfp_val):
+        """(loose, size) for the RFP side: loose when unspecified, size None when unparseable."""
+        if self.is_not_specified(rfp_val): return True, None
+        return False, try_float(rfp_val)
+
+    def size_score(self, rfp_size, inv_size):
+        loose, r = rfp_size
+        if loose: return 1.0 # Loose match
+        if r is None or inv_size is None: return 0.0
+
         # Percentage difference score: 1.0 - error
-        score = 1.0 - abs(i - r) / r
+        score = 1.0 - abs(inv_size - r) / r
         return max(0.0, round(score, 3))
 
-    def match_standards(self, rfp_list, inv_list):
+    def match_cross_section(self, rfp_val, inv_val):
+        return self.size_score(self.rfp_size(rfp_val), try_float(inv_val))
+
+    def rfp_standards(self, rfp_list):
+        """Normalized RFP standards, or None when nothing is required."""
+        if not rfp_list: return None
+        if isinstance(rfp_list, str): rfp_list = [rfp_list]
+        return [self.normalize_standard(s) for s in rfp_list]
+
+    def inv_standards(self, inv_list):
+        """Normalized SKU standards as a set (None if the value is not a list of standards)."""
+        if isinstance(inv_list, str): inv_list = [inv_list]
+        try:
+            return set(self.normalize_standard(s) for s in (inv_list or []))
+        except TypeError:
+            return None
+
+    def standards_score(self, rfp_norm, inv_norm):
         """
         - Total standards weight = 1.0
         - Divided equally among all RFP standards
         - Each standard checked independently
         """
-        if not rfp_list: return 1.0 # No requirement = Perfect match
-        
-        # Ensure lists
-        if isinstance(rfp_list, str): rfp_list = [rfp_list]
-        if isinstance(inv_list, str): inv_list = [inv_list]
-        
-        rfp_norm = [self.normalize_standard(s) for s in rfp_list]
-        inv_norm = set(self.normalize_standard(s) for s in (inv_list or []))
-        
-        total = len(rfp_norm)
-        if total == 0: return 1.0
+        if not rfp_norm: return 1.0 # No requirement = Perfect match
         
         score = 0.0
-        per_std_weight = 1.0 / total
+        per_std_weight = 1.0 / len(rfp_norm)
         
         for std in rfp_norm:
             if std == "isi marked": score += per_std_weight
@@ -142,80 +221,122 @@ class RealTechAgent:
             
         return round(score, 3)
 
+    def match_standards(self, rfp_list, inv_list):
+        return self.standards_score(self.rfp_standards(rfp_list), self.inv_standards(inv_list))
+
     def normalize_voltage(self, v):
         """Converts 1.1kV -> 1100, 1100V -> 1100"""
         if not v: return 0
         s = str(v).upper().replace("VOLTS", "").replace("V", "").strip()
         try:
-            val = float(re.findall(r"[\d\.]+", s)[0])
+            val = float(NUMBER_RE.findall(s)[0])
             if "K" in str(v).upper() or val < 50: # Assume < 50 means kV (e.g. 11kV)
                 return val * 1000
             return val
         except:
             return 0
 
-    def calculate_weighted_score(self, rfp, inv):
-        """
-        Calculates a 'Smart Score' using 7-Factor Legacy Logic.
-        """
-        score = 0.0
-        max_score = 0.0
-        
-        # Weights Configuration (Total 100)
-        weights = {
-            "voltage_grade": 20,       
-            "core_count": 15,          
-            "cross_section_sqmm": 15,  
-            "conductor_material": 15,  
-            "insulation": 10,
-            "sheath": 5,
-            "armour_type": 5,
-            "standards": 15 # Added Standards
-        }
-        
+    def rfp_field(self, field, rfp):
+        """RFP-side normalized value of one scoring field (computed once per line item)."""
+        v = rfp.get(field, 0 if field == "core_count" else None)
+        if field == "voltage_grade": return self.normalize_voltage(v)
+        if field == "core_count": return try_float(v)
+        if field == "cross_section_sqmm": return self.rfp_size(v)
+        if field == "conductor_material": return self.normalize_material(v)
+        if field == "standards": return self.rfp_standards(v)
+        return self.normalize(v)
+
+    def inv_field(self, field, v):
+        """SKU-side normalized value of one scoring field (precomputed per inventory value)."""
+        if field == "voltage_grade": return self.normalize_voltage(v)
+        if field in ("core_count", "cross_section_sqmm"): return try_float(v)
+        if field == "conductor_material": return self.normalize_material(v)
+        if field == "standards": return self.inv_standards(v)
+        return self.normalize(v)
+
+    def field_points(self, field, r, i):
+        """Points one spec field contributes to the weighted score, from normalized RFP / SKU values."""
+        w = SCORE_WEIGHTS[field]
+
         # 1. Voltage (Strict)
-        rfp_v = self.normalize_voltage(rfp.get("voltage_grade"))
-        inv_v = self.normalize_voltage(inv.get("voltage_grade"))
-        if rfp_v == inv_v: score += weights["voltage_grade"]
-        elif rfp_v and inv_v and abs(rfp_v - inv_v) / rfp_v < 0.1: score += weights["voltage_grade"] * 0.5 
-        max_score += weights["voltage_grade"]
-        
+        if field == "voltage_grade":
+            if r == i: return w
+            elif r and i and abs(r - i) / r < 0.1: return w * 0.5
+            return 0
+
         # 2. Core Count (Exact)
-        try:
-            if float(rfp.get("core_count", 0)) == float(inv.get("core_count", 0)):
-                score += weights["core_count"]
-        except: pass
-        max_score += weights["core_count"]
+        if field == "core_count":
+            return w if r is not None and i is not None and r == i else 0
 
         # 3. Size (Fuzzy Percentage Score)
-        sz_score = self.match_cross_section(rfp.get("cross_section_sqmm"), inv.get("cross_section_sqmm"))
-        score += weights["cross_section_sqmm"] * sz_score
-        max_score += weights["cross_section_sqmm"]
+        if field == "cross_section_sqmm":
+            return w * self.size_score(r, i)
 
         # 4. Material (Synonyms)
-        r_mat = self.normalize_material(rfp.get("conductor_material"))
-        i_mat = self.normalize_material(inv.get("conductor_material"))
-        if r_mat == i_mat: score += weights["conductor_material"]
-        max_score += weights["conductor_material"]
+        if field == "conductor_material":
+            return w if r == i else 0
 
         # 5. Standards (New)
-        std_score = self.match_standards(rfp.get("standards"), inv.get("standards"))
-        score += weights["standards"] * std_score
-        max_score += weights["standards"]
+        if field == "standards":
+            return w * self.standards_score(r, i)
 
         # 6. Rest (Normal string match)
-        for field in ["insulation", "sheath", "armour_type"]:
-            r_val = self.normalize(rfp.get(field))
-            i_val = self.normalize(inv.get(field))
-            if r_val and i_val and (r_val in i_val or i_val in r_val): 
-                score += weights[field]
-            max_score += weights[field]
+        if r and i and (r in i or i in r):
+            return w
+        return 0
+
+    def calculate_weighted_score(self, rfp, inv):
+        """
+        Calculates a 'Smart Score' using 7-Factor Legacy Logic.
+        """
+        score = 0.0
+        for field, default in SCORE_FIELDS:
+            score += self.field_points(field, self.rfp_field(field, rfp), self.inv_field(field, inv.get(field, default)))
 
-        return round((score / max_score) * 100, 1)
+        return round((score / MAX_SCORE) * 100, 1)
 
     def compute_match_score(self, rfp_attrs, inv_specs):
         return self.calculate_weighted_score(rfp_attrs, inv_specs)
 
+    def _build_score_table(self):
+        """Factorizes every scoring field over the inventory (SoA): codes[field] is an int32 per SKU,
+        norms[field] the normalized value of each distinct raw value."""
+        specs = [sku.get("technical_specs", {}) for sku in self.inventory]
+        self._score_codes = {}
+        self._score_norms = {}
+        for field, default in SCORE_FIELDS:
+            index, reps = {}, []
+            codes = np.empty(len(specs), dtype=np.int32)
+            for j, spec in enumerate(specs):
+                v = spec.get(field, default)
+                k = spec_key(v)
+                if k not in index:
+                    index[k] = len(reps)
+                    reps.append(v)
+                codes[j] = index[k]
+            self._score_codes[field] = codes
+            self._score_norms[field] = [self.inv_field(field, v) for v in reps]
+
+        # Field x SKU code matrix for the scoring kernel; points tables are padded to the widest field
+        self._score_code_matrix = np.stack([self._score_codes[field] for field, _ in SCORE_FIELDS])
+        self._score_width = max(len(norms) for norms in self._score_norms.values())
+
+    def score_inventory(self, rfp_attrs):
+        """Unrounded weighted score (%) of rfp_attrs against every SKU, as one float64 array."""
+        pts = np.zeros((len(SCORE_FIELDS), self._score_width), dtype=np.float64)
+        for f, (field, _) in enumerate(SCORE_FIELDS):
+            r = self.rfp_field(field, rfp_attrs)
+            norms = self._score_norms[field]
+            pts[f, :len(norms)] = [self.field_points(field, r, i) for i in norms]
+
+        if njit is not None:
+            score = score_kernel(pts, self._score_code_matrix)
+        else:
+            score = np.zeros(len(self.inventory), dtype=np.float64)
+            for f in range(len(SCORE_FIELDS)):
+                score += pts[f, self._score_code_matrix[f]]
+        return (score / MAX_SCORE) * 100
+
     # ================= MAIN PIPELINE STEPS =================
     def find_best_matches(self, line_items):
         results = []
@@ -223,12 +344,15 @@ class RealTechAgent:
             best_match = None
             highest_score = -1
             
-            # Compare against every product in inventory
-            for sku in self.inventory:
-                score = self.compute_match_score(item.get("technical_attributes", {}), sku.get("technical_specs", {}))
-                if score > highest_score:
-                    highest_score = score
-                    best_match = sku
+            # Compare against every product in inventory (first SKU with the best rounded score wins)
+            if self.inventory:
+                pct = self.score_inventory(item.get("technical_attributes", {}))
+                top = pct.max()
+                highest_score = round(top.item(), 1)
+                for j in np.flatnonzero(pct >= top - 0.2).tolist():
+                    if round(pct[j].item(), 1) == highest_score:
+                        best_match = self.inventory[j]
+                        break
             
             # Detailed Breakdown for the best match
             breakdown = self.generate_breakdown(item.get("technical_attributes", {}), best_match)
@@ -281,14 +405,13 @@ class RealTechAgent:
         comp_report = []
         for item in matched_items:
             sku_id = item["matched_sku_id"]
-            for comp in self.competitors:
-                if sku_id in comp.get("colliding_internal_skus", []):
-                    comp_report.append({
-                        "lot_id": item["lot_id"],
-                        "competitor": comp.get("name"),
-                        "risk": "High",
-                        "comment": f"Direct competitor for {sku_id}"
-                    })
+            for comp in self._sku_to_competitors.get(sku_id, ()):
+                comp_report.append({
+                    "lot_id": item["lot_id"],
+                    "competitor": comp.get("name"),
+                    "risk": "High",
+                    "comment": f"Direct competitor for {sku_id}"
+                })
         return comp_report
 
     def calculate_testing_costs(self, matched_items):
@@ -296,40 +419,27 @@ class RealTechAgent:
         total_cost = 0.0
         details = []
         all_test_codes = set()
-        
-        # Ensure tests is a list
-        test_list = self.tests if isinstance(self.tests, list) else []
 
         for item in matched_items:
             sku_name = item.get("matched_sku_name", "").upper()
-            desc = item.get("rfp_description", "").upper()
             qty = float(item.get("quantity") or 0)
             drums = max(1, qty / 500) # Estimate drums
 
-            # Determine Category
+            # Determine Category (one bitmask per item)
             is_ht = "11KV" in sku_name or "33KV" in sku_name or "HT" in sku_name
-            is_lt = not is_ht
-            is_armoured = "ARMOURED" in sku_name or "ARMORED" in sku_name
-            is_frls = "FRLS" in sku_name
+            item_tags = TAG_ALL | (TAG_HT if is_ht else TAG_LT)
+            if "ARMOURED" in sku_name or "ARMORED" in sku_name: item_tags |= TAG_ARMOURED
+            if "FRLS" in sku_name: item_tags |= TAG_FRLS
             
             item_cost = 0
             
-            for test in test_list:
-                applies = False
-                criteria = test.get("mandatory_for", [])
-                
-                if "All Cables" in criteria: applies = True
-                if is_ht and "HT Cables" in str(criteria): applies = True
-                if is_lt and "LT Cables" in str(criteria): applies = True
-                if is_armoured and "Armoured Cables" in str(criteria): applies = True
-                if is_frls and ("FRLS" in str(criteria) or "LSZH" in str(criteria)): applies = True
-                
-                if applies:
-                    all_test_codes.add(test.get("test_id"))
+            for tags, test_id, base_cost, is_routine in self._test_tags:
+                if tags & item_tags:
+                    all_test_codes.add(test_id)
                     
                     # Estimate cost (Pricing Agent handles this precisely, but we give an estimate)
-                    c = test.get("base_test_cost", 0)
-                    if "Routine" in test.get("test_category", ""):
+                    c = base_cost
+                    if is_routine:
                         c *= drums 
                     item_cost += c
 
@@ -340,17 +450,21 @@ class RealTechAgent:
 
     def generate_html_report(self, matches):
         """Generates a simple HTML table of compliance"""
-        html = "<h3>Technical Compliance Matrix</h3><table border='1' style='border-collapse: collapse; width: 100%;'>"
-        html += "<tr style='background-color: #f2f2f2;'><th>Lot ID</th><th>Requested</th><th>Matched Product</th><th>Score</th><th>Status</th></tr>"
+        parts = [
+            "<h3>Technical Compliance Matrix</h3><table border='1' style='border-collapse: collapse; width: 100%;'>",
+            "<tr style='background-color: #f2f2f2;'><th>Lot ID</th><th>Requested</th><th>Matched Product</th><th>Score</th><th>Status</th></tr>"
+        ]
         
         for m in matches:
             color = "green" if m["match_score"] >= 80 else "orange" if m["match_score"] >= 50 else "red"
-            html += f"<tr><td>{m['lot_id']}</td><td>{m['rfp_description']}</td><td>{m['matched_sku_name']}</td>"
-            html += f"<td style='color:{color}; font-weight:bold;'>{m['match_score']}%</td>"
-            html += f"<td>{'Compliant' if m['match_score'] == 100 else 'Deviation'}</td></tr>"
+            parts.append(
+                f"<tr><td>{m['lot_id']}</td><td>{m['rfp_description']}</td><td>{m['matched_sku_name']}</td>"
+                f"<td style='color:{color}; font-weight:bold;'>{m['match_score']}%</td>"
+                f"<td>{'Compliant' if m['match_score'] == 100 else 'Deviation'}</td></tr>"
+            )
         
-        html += "</table>"
-        return html
+        parts.append("</table>")
+        return "".join(parts)
 
     # ================= PUBLIC API =================
     def process_rfp_data(self, sales_output):